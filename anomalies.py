@@ -0,0 +1,130 @@
+"""Anomalous SKUs, flagged by an isolation forest fitted once per dataset version.
+
+After ingestion the stock, sales and price columns go through a batch stage:
+an ``IsolationForest`` is fitted on at most ``FIT_ROWS`` rows (a uniform
+sample of larger datasets; each tree only ever looks at 256 of them anyway)
+and then scores every row, in chunks spread over ``n_jobs`` processes.
+The ``ANOMALY_SHARE`` most unusual rows of the sample set the threshold.
+
+Scores are saved next to the dataset as ``cleaned_<name>.anomalies.npz``
+together with the dataset version they describe. Only background jobs fit
+and score (ingest, compaction and ``tasks.score_anomalies``); the report and
+layout pages read the saved scores with ``saved_anomalies``. Rows changed by
+deltas are rescored when the dataset's files are compacted (see deltas.py),
+which is a new version.
+"""
+import json
+import os
+
+import numpy as np
+
+from storage import anomalies_path, dataset_version, read_dataset
+
+ANOMALY_COLUMNS = ['Quantity Available', 'Total Sales Volume', 'Purchase_Price', 'Selling_Price',
+                   'Stock Turnover Rate']
+# Identify flagged rows on the report page
+LABEL_COLUMNS = ['Product_ID', 'Product Name']
+ANOMALY_SHARE = 0.01  # Expected share of anomalous rows
+FIT_ROWS = 100000  # Rows the forest is fitted on; larger datasets are sampled
+SCORE_CHUNK_ROWS = 100000  # Rows per scoring task
+TREES = 100
+MAX_LISTED = 20  # Most anomalous rows kept with their values for the report
+
+
+class AnomalyScores:
+    def __init__(self, scores, threshold, columns, listed, version=None):
+        self.scores = scores  # Per row, higher is more unusual
+        self.threshold = threshold
+        self.columns = columns
+        self.listed = listed
+        self.version = version
+
+    @property
+    def nbytes(self):
+        return self.scores.nbytes
+
+    @property
+    def flagged(self):
+        """Positions of the anomalous rows, most unusual first."""
+        rows = np.flatnonzero(self.scores > self.threshold)
+        return rows[np.argsort(-self.scores[rows], kind='stable')]
+
+    def save(self, path, version):
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, version=np.array(version), scores=self.scores, threshold=np.array(self.threshold),
+                 columns=np.array(self.columns), listed=np.array(json.dumps(self.listed)))
+        os.replace(tmp_path, path)
+        self.version = version
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['scores'], float(data['threshold']), data['columns'].tolist(),
+                       json.loads(str(data['listed'])), version=str(data['version']))
+
+
+def _score(model, chunk):
+    # IsolationForest's own scores are lower for anomalies
+    return -model.score_samples(chunk)
+
+
+def fit_forest(values, fit_rows=FIT_ROWS, random_state=0):
+    """A forest fitted on ``values``, or on a uniform sample of ``fit_rows`` of them."""
+    if len(values) > fit_rows:
+        values = values[np.random.default_rng(random_state).choice(len(values), fit_rows, replace=False)]
+    from sklearn.ensemble import IsolationForest  # Imported here, it's only needed while fitting
+    return IsolationForest(n_estimators=TREES, contamination=ANOMALY_SHARE, random_state=random_state).fit(values)
+
+
+def score_rows(model, values, n_jobs=None, chunk_rows=SCORE_CHUNK_ROWS):
+    from joblib import Parallel, delayed
+    chunks = [values[start:start + chunk_rows] for start in range(0, len(values), chunk_rows)]
+    return np.concatenate(Parallel(n_jobs=n_jobs)(delayed(_score)(model, chunk) for chunk in chunks)).astype(np.float32)
+
+
+def detect_anomalies(df, n_jobs=None, fit_rows=FIT_ROWS, chunk_rows=SCORE_CHUNK_ROWS, random_state=0):
+    """Fit a forest on ``df`` (or a sample of it) and score every row.
+
+    Returns None when ``df`` has none of ``ANOMALY_COLUMNS``. Missing values
+    are fine, the trees route them like any other value.
+    """
+    columns = [column for column in ANOMALY_COLUMNS if column in df.columns]
+    if not columns or df.empty:
+        return None
+    values = df[columns].to_numpy(dtype=np.float32)  # The trees work in float32 anyway
+    model = fit_forest(values, fit_rows, random_state)
+    scores = score_rows(model, values, n_jobs, chunk_rows)
+
+    threshold = float(-model.offset_)
+    rows = np.flatnonzero(scores > threshold)
+    rows = rows[np.argsort(-scores[rows], kind='stable')][:MAX_LISTED]
+    labels = [column for column in LABEL_COLUMNS if column in df.columns]
+    top = df.iloc[rows][labels + columns]
+    listed = [dict(record, row=int(row), score=float(scores[row]))
+              for row, record in zip(rows, top.astype(object).where(top.notna(), None).to_dict('records'))]
+    return AnomalyScores(scores, threshold, columns, listed)
+
+
+def saved_anomalies(csv_path):
+    """Saved scores of the current dataset version, None if it hasn't been scored yet."""
+    try:
+        stored = AnomalyScores.load(anomalies_path(csv_path))
+    except (OSError, ValueError, KeyError):
+        return None
+    return stored if stored.version == dataset_version(csv_path) else None
+
+
+def load_anomalies(csv_path, n_jobs=None):
+    """Saved scores of the current dataset version, computed (and saved) on first use."""
+    stored = saved_anomalies(csv_path)
+    if stored is not None:
+        return stored
+    # Datasets ingested before this stage existed are scored on first use
+    version = dataset_version(csv_path)
+    result = detect_anomalies(read_dataset(csv_path, LABEL_COLUMNS + ANOMALY_COLUMNS), n_jobs=n_jobs)
+    if result is not None:
+        try:
+            result.save(anomalies_path(csv_path), version)
+        except OSError:
+            pass  # Read-only storage: serve the scores computed for this request
+    return result
@@ -0,0 +1,55 @@
+"""Anomaly scoring: forest fitted on a sample and chunked parallel scoring vs. one fit and predict on all rows.
+
+"full s" fits the forest on every row and scores them in one call, as a
+plain ``IsolationForest().fit_predict`` would; "fit s" is the sampled fit
+and the "score s" columns score every row in chunks at each ``--jobs``.
+"overlap" is the share of rows flagged by the full fit that the sampled
+one flags too.
+
+    python -m benchmarks.bench_anomalies --rows 100000 1000000 5000000 --jobs 1 2 4
+"""
+import argparse
+import time
+
+import numpy as np
+
+from anomalies import ANOMALY_COLUMNS, fit_forest, score_rows
+from benchmarks.datagen import generate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, -1])
+    parser.add_argument('--full-max', type=int, default=1000000, help="skip the full fit above this many rows")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'full s':>8} {'fit s':>7} " + ' '.join(f"{f'score s j={j}':>12}" for j in args.jobs)
+          + f" {'flagged':>8} {'overlap':>8}")
+    for rows in args.rows:
+        values = generate(rows, skus=max(rows // 10, 1))[ANOMALY_COLUMNS].to_numpy(dtype=np.float32)
+
+        full = overlap = np.nan
+        if rows <= args.full_max:
+            start = time.perf_counter()
+            reference = fit_forest(values, fit_rows=rows)
+            expected = -reference.score_samples(values) > -reference.offset_
+            full = time.perf_counter() - start
+
+        start = time.perf_counter()
+        model = fit_forest(values)
+        fit = time.perf_counter() - start
+        timings = []
+        for jobs in args.jobs:
+            start = time.perf_counter()
+            scores = score_rows(model, values, n_jobs=jobs)
+            timings.append(time.perf_counter() - start)
+        flagged = scores > -model.offset_
+        if rows <= args.full_max:
+            overlap = (flagged & expected).sum() / max(expected.sum(), 1)
+        print(f"{rows:>10} {full:>8.2f} {fit:>7.2f} " + ' '.join(f"{t:>12.2f}" for t in timings)
+              + f" {flagged.sum():>8} {overlap:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
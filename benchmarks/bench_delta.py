@@ -0,0 +1,108 @@
+"""Cost of row-level deltas vs. dataset size.
+
+Loads synthetic datasets (unique Product_IDs, about ten rows per product)
+into the inventory table and forecast registry of a scratch SQLite database,
+then applies deltas of growing size through deltas.py: half updates of
+existing rows, a quarter new rows, a quarter deletes. "apply ms" is the
+delta request itself; "report ms" and "search ms" are the report KPIs and a
+search right after it, which need no recomputation. "compact s" is the
+background rewrite of the cleaned files, once per delta size, and "load s"
+what re-uploading the whole dataset costs in the database alone.
+
+    python -m benchmarks.bench_delta --rows 100000 1000000 --delta 1 100 10000
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import sqlalchemy as sa
+
+from benchmarks.datagen import generate
+
+
+def _delta(df, size, start_id, rng):
+    # Updates and deletes of random existing rows, inserts of new products
+    picked = df.iloc[rng.choice(len(df), size=size, replace=False)]
+    n_update, n_insert = (size + 1) // 2, size // 4
+    upserts = [{'Product_ID': row['Product_ID'], 'Quantity Available': float(rng.integers(0, 100)),
+                'Total Sales Volume': float(rng.integers(1, 500)), 'Last_Stock_Update': '2/1/2026'}
+               for row in picked.iloc[:n_update].to_dict('records')]
+    for i, row in enumerate(picked.iloc[n_update:n_update + n_insert].to_dict('records')):
+        upserts.append(dict(row, Product_ID=float(start_id + i)))
+    deletes = picked.iloc[n_update + n_insert:]['Product_ID'].tolist()
+    return upserts, deletes
+
+
+def main():
+    from app import Dataset, db
+    from deltas import apply_delta, compact, parse_delta
+    from catalog import schema_of
+    from forecast_registry import ForecastRegistry, ForecastStats
+    from inventory_db import InventoryLoader, InventoryQueries
+    from storage import dataset_version, write_columnar
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--delta', type=int, nargs='+', default=[1, 100, 10000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = sa.create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        db.metadata.create_all(engine)
+
+        print(f"{'rows':>10} {'load s':>7} {'delta':>6} {'apply ms':>9} {'report ms':>10} {'search ms':>10} "
+              f"{'compact s':>10}")
+        for dataset_id, rows in enumerate(args.rows, start=1):
+            df = generate(rows, skus=max(rows // 10, 1))
+            df['Product_ID'] = np.arange(1001, 1001 + rows, dtype=float)
+            cleaned_path = os.path.join(tmp, f'cleaned_{dataset_id}.csv')
+            df.to_csv(cleaned_path, index=False)
+            write_columnar(df, cleaned_path)
+            with engine.begin() as conn:
+                conn.execute(sa.insert(Dataset.__table__).values(
+                    id=dataset_id, owner_id=1, name=f'bench_{rows}.csv', version=1, status='ready',
+                    checksum='0' * 64, schema=schema_of(df), row_count=rows, source_path='',
+                    cleaned_path=cleaned_path, sql_loaded=True, created_at=datetime.now()))
+
+            start = time.perf_counter()
+            loader = InventoryLoader(engine, dataset_id)
+            for offset in range(0, rows, 50000):
+                loader.add(df.iloc[offset:offset + 50000])
+            forecast_key = os.path.basename(cleaned_path)
+            ForecastRegistry(engine).save(forecast_key, dataset_version(cleaned_path), ForecastStats.from_frame(df))
+            load = time.perf_counter() - start
+
+            schema = [{'name': column, 'dtype': str(dtype)} for column, dtype in df.dtypes.items()]
+            queries = InventoryQueries(engine, dataset_id, df.columns)
+            next_id = 1001 + rows
+            for i, size in enumerate(args.delta):
+                applied, reports, searches = [], [], []
+                for _ in range(args.repeat):
+                    upserts, deletes = parse_delta(schema, *_delta(df, size, next_id, rng))
+                    next_id += size
+                    start = time.perf_counter()
+                    apply_delta(engine, dataset_id, forecast_key, list(df.columns), upserts, deletes)
+                    applied.append(time.perf_counter() - start)
+                    start = time.perf_counter()
+                    queries.report_kpis()
+                    reports.append(time.perf_counter() - start)
+                    start = time.perf_counter()
+                    queries.search(query='lamp', limit=100)
+                    searches.append(time.perf_counter() - start)
+                    # Deleted rows can't be picked again
+                    df = df[~df['Product_ID'].astype(str).isin(deletes)]
+                start = time.perf_counter()
+                compact(engine, dataset_id, cleaned_path)
+                compacted = time.perf_counter() - start
+                print(f"{rows if i == 0 else '':>10} {f'{load:.1f}' if i == 0 else '':>7} {size:>6} "
+                      f"{np.median(applied) * 1000:>9.1f} {np.median(reports) * 1000:>10.1f} "
+                      f"{np.median(searches) * 1000:>10.1f} {compacted:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
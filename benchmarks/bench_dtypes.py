@@ -0,0 +1,65 @@
+"""Memory and groupby/filter speed of cached datasets, with default and compact dtypes.
+
+For each ``--rows`` a synthetic inventory is loaded the two ways the app can
+read it: from the CSV (float64 numbers, Python strings) and from the Parquet
+copy (dictionary columns come back categorical, see storage.py). Each frame
+is then converted by ``ingest.compact_frame`` as the dataset cache does.
+"MiB" is the frame's deep memory usage, "compact s" the conversion time;
+"groupby" sums stock per category and averages sales per product, "filter"
+selects the SKUs at or below their reorder level.
+
+    python -m benchmarks.bench_dtypes --rows 100000 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.datagen import generate
+from ingest import compact_frame
+from storage import read_dataset, write_columnar
+
+
+def _timed(run, repeat):
+    run()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        run()
+    return (time.perf_counter() - start) / repeat
+
+
+def _groupby(df):
+    df.groupby('Category', observed=True)['Quantity Available'].sum()
+    df.groupby('Product Name', observed=True)['Total Sales Volume'].mean()
+
+
+def _filter(df):
+    return df[df['Quantity Available'] <= df['Reorder_Level']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='bench_dtypes_')
+    print(f"{'rows':>10} {'source':>8} {'MiB':>7} {'compact':>8} {'compact s':>10} {'groupby ms':>11} "
+          f"{'compact':>8} {'filter ms':>10} {'compact':>8}")
+    for rows in args.rows:
+        df = generate(rows, skus=max(rows // 10, 1))
+        csv_path = os.path.join(tmp, f'warehouse_{rows}.csv')
+        write_columnar(df, csv_path)  # The Parquet copy only, read_dataset trusts it without the CSV
+        for source, frame in [('csv', df), ('parquet', read_dataset(csv_path))]:
+            start = time.perf_counter()
+            compact = compact_frame(frame)
+            seconds = time.perf_counter() - start
+            before, after = (f.memory_usage(deep=True).sum() / 2 ** 20 for f in (frame, compact))
+            grouped = [_timed(lambda: _groupby(f), args.repeat) * 1000 for f in (frame, compact)]
+            filtered = [_timed(lambda: _filter(f), args.repeat) * 1000 for f in (frame, compact)]
+            print(f"{rows:>10} {source:>8} {before:>7.1f} {after:>8.1f} {seconds:>10.3f} {grouped[0]:>11.1f} "
+                  f"{grouped[1]:>8.1f} {filtered[0]:>10.1f} {filtered[1]:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""Per-product demand forecasts: vectorized fit vs. one LinearRegression per product.
+
+The per-product loop is timed on a sample of products and extrapolated to
+all of them, since at tens of thousands of SKUs it would run for minutes.
+
+    python -m benchmarks.bench_forecast --rows 100000 1000000 5000000 --skus 1000 10000 50000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.datagen import generate
+from forecasting import fit_grouped_trends
+
+
+def per_product_loop(df, products):
+    from sklearn.linear_model import LinearRegression
+
+    predictions = {}
+    for product in products:
+        product_df = df[df['Product Name'] == product]
+        if len(product_df) < 2:
+            continue
+        X = np.arange(len(product_df)).reshape(-1, 1)
+        model = LinearRegression()
+        model.fit(X, product_df['Total Sales Volume'].values)
+        predictions[product] = model.predict(np.array([[len(product_df)]]))[0]  # One step past the last x
+    return predictions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--skus', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--loop-sample', type=int, default=200, help="products timed in the per-product loop")
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'skus':>7} {'vectorized s':>13} {'loop s (est.)':>14} {'speedup':>8} {'max |diff|':>11}")
+    for rows in args.rows:
+        for skus in args.skus:
+            df = generate(rows, skus=skus)
+
+            start = time.perf_counter()
+            trends = fit_grouped_trends(df['Product Name'], df['Total Sales Volume'])
+            vectorized = time.perf_counter() - start
+
+            products = df['Product Name'].unique()
+            sample = products[:args.loop_sample]
+            start = time.perf_counter()
+            reference = per_product_loop(df, sample)
+            loop = (time.perf_counter() - start) * len(products) / len(sample)
+
+            diff = max((abs(trends.at[p, 'prediction'] - v) for p, v in reference.items()), default=0.0)
+            print(f"{rows:>10} {skus:>7} {vectorized:>13.3f} {loop:>14.1f} {loop / vectorized:>7.0f}x {diff:>11.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Appending snapshots to the inventory history, and range queries over it.
+
+A synthetic warehouse of ``--skus`` SKUs is snapshotted ``--snapshots``
+times, a week apart; each SKU moved on some day in the week before each
+snapshot. "append ms" is the time ``HistoryBuilder`` takes to add a snapshot
+(first, median and last); every query then sums sales per day or week over
+the last month, quarter or whole history, from the rollups ("history ms")
+and, for comparison, by re-reading every snapshot's CSV ("CSV ms").
+
+    python -m benchmarks.bench_history --skus 10000 --snapshots 52
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.datagen import generate
+from history import History, HistoryBuilder, ROLLUPS, period_start
+
+FIRST_SNAPSHOT = pd.Timestamp('2025-01-06')
+RANGES = {'month': 30, 'quarter': 91, 'all': None}
+
+
+def _snapshot(df, day):
+    dates = day - pd.to_timedelta(np.arange(len(df)) % 7, unit='D')
+    snapshot = df.copy()
+    snapshot['Last_Stock_Update'] = dates.strftime('%m/%d/%Y')
+    snapshot['Total Sales Volume'] = (df['Total Sales Volume'] * (1 + day.dayofyear / 365)).round()
+    return snapshot
+
+
+def _from_csvs(paths, freq, start):
+    # What a query costs without the history: read every snapshot and aggregate
+    frames = [pd.read_csv(path, usecols=['Last_Stock_Update', 'Total Sales Volume']) for path in paths]
+    df = pd.concat(frames)
+    times = pd.to_datetime(df['Last_Stock_Update'], format='%m/%d/%Y').to_numpy()
+    periods = period_start(times, ROLLUPS[freq])
+    keep = periods >= start if start is not None else np.ones(len(df), dtype=bool)
+    return df['Total Sales Volume'][keep].groupby(periods[keep]).sum()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--skus', type=int, default=10000)
+    parser.add_argument('--snapshots', type=int, default=52)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='bench_history_')
+    folder = os.path.join(tmp, 'history')
+    base = generate(args.skus, skus=args.skus)
+    paths, appends = [], []
+    for i in range(args.snapshots):
+        day = FIRST_SNAPSHOT + pd.Timedelta(weeks=i)
+        snapshot = _snapshot(base, day)
+        paths.append(os.path.join(tmp, f'snapshot_{i}.csv'))
+        snapshot.to_csv(paths[-1], index=False)
+        start = time.perf_counter()
+        builder = HistoryBuilder(day)
+        builder.add(snapshot)
+        builder.save(folder)
+        appends.append((time.perf_counter() - start) * 1000)
+
+    history = History(folder)
+    last = np.datetime64(FIRST_SNAPSHOT + pd.Timedelta(weeks=args.snapshots - 1), 'D')
+    print(f"{history.meta()['observations']} observations; append ms: first {appends[0]:.1f}, "
+          f"median {np.median(appends):.1f}, last {appends[-1]:.1f}")
+    print(f"{'freq':>7} {'range':>8} {'periods':>8} {'history ms':>11} {'CSV ms':>9}")
+    for freq in ROLLUPS:
+        for name, days in RANGES.items():
+            start = last - days if days is not None else None
+            periods = len(history.rollup(freq, start=start))
+            begin = time.perf_counter()
+            for _ in range(args.repeat):
+                history.rollup(freq, start=start)
+            rollup = (time.perf_counter() - begin) / args.repeat * 1000
+            begin = time.perf_counter()
+            _from_csvs(paths, freq, period_start(start, ROLLUPS[freq]) if start is not None else None)
+            csvs = (time.perf_counter() - begin) * 1000
+            print(f"{freq:>7} {name:>8} {periods:>8} {rollup:>11.1f} {csvs:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Memory and time of upload cleaning against input size.
+
+Compares the streaming pipeline in ingest.py with the previous whole-file
+read_csv/dropna/to_csv approach. Each run happens in a fresh process so peak
+RSS is not polluted by earlier runs.
+
+    python -m benchmarks.bench_ingest --rows 10000 100000 1000000
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: timings only
+    resource = None
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return float('nan')
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def _run(mode, source, target, chunk_rows, queue):
+    import pandas as pd
+    from ingest import ingest_csv
+
+    start = time.perf_counter()
+    if mode == 'streaming':
+        ingest_csv(source, target, chunk_rows=chunk_rows)
+    else:
+        pd.read_csv(source).dropna().to_csv(target, index=False)
+    queue.put((time.perf_counter() - start, _peak_rss_mb()))
+
+
+def measure(mode, source, target, chunk_rows):
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run, args=(mode, source, target, chunk_rows, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    from benchmarks.datagen import write_csv
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--chunk-rows', type=int, default=50000)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'MB':>8} {'mode':>10} {'seconds':>9} {'peak RSS MB':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            source = write_csv(os.path.join(tmp, f'warehouse_{rows}.csv'), rows)
+            size_mb = os.path.getsize(source) / 1e6
+            for mode in ('streaming', 'whole-file'):
+                target = os.path.join(tmp, f'cleaned_{mode}_{rows}.csv')
+                seconds, peak = measure(mode, source, target, args.chunk_rows)
+                print(f"{rows:>10} {size_mb:>8.1f} {mode:>10} {seconds:>9.2f} {peak:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
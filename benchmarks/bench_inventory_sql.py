@@ -0,0 +1,100 @@
+"""Report, shelf-page and search latency: SQL inventory table vs. in-process data.
+
+Loads synthetic datasets into the inventory table of a scratch SQLite
+database (pass --db for another one, e.g. PostgreSQL) and times each query
+through inventory_db.py next to its file-based counterpart, run on a frame
+already in memory. The "frame MiB" column is what the file-based path holds
+in each web process. The "same" column checks that both paths return
+identical results.
+
+    python -m benchmarks.bench_inventory_sql --rows 100000 1000000 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import sqlalchemy as sa
+
+from benchmarks.datagen import generate
+
+SEARCHES = [
+    {'query': 'lamp'},
+    {'exact': {'section': ['b', 'D']}, 'ranges': {'quantity': (None, 10)}},
+    {'text': {'product': 'chair 4'}, 'exact': {'status': ['low stock']}},
+]
+
+
+def _p50_ms(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000, result
+
+
+def main():
+    from app import db
+    from inventory_db import InventoryLoader, InventoryQueries
+    from kpis import ReportKPIs
+    from layout import shelf_page
+    from search_index import SearchIndex
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--db', help="database URL, defaults to a scratch SQLite file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = sa.create_engine(args.db or f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        db.metadata.create_all(engine)
+
+        print(f"{'rows':>10} {'load s':>7} {'frame MiB':>10} {'query':>8} {'sql ms':>8} {'frame ms':>9} {'same':>5}")
+        for dataset_id, rows in enumerate(args.rows, start=1):
+            df = generate(rows)
+            start = time.perf_counter()
+            loader = InventoryLoader(engine, dataset_id)
+            for offset in range(0, rows, 50000):
+                loader.add(df.iloc[offset:offset + 50000])
+            load = time.perf_counter() - start
+            queries = InventoryQueries(engine, dataset_id, df.columns)
+            index = SearchIndex.from_frame(df)
+
+            def frame_kpis():
+                accumulator = ReportKPIs()
+                accumulator.add(df)
+                return accumulator.result()
+
+            def frame_search():
+                matches = [index.search(**search) for search in SEARCHES]
+                return [len(m) for m in matches], [m[:100].tolist() for m in matches]
+
+            def sql_search():
+                results = [queries.search(**search, limit=100) for search in SEARCHES]
+                return [total for total, _, _ in results], [positions for _, positions, _ in results]
+
+            cases = [
+                ('report', queries.report_kpis, frame_kpis),
+                ('page', lambda: queries.shelf_page(rows // 2, 500), lambda: shelf_page(df, rows // 2, 500)),
+                ('search', sql_search, frame_search),
+            ]
+            frame_mib = df.memory_usage(deep=True).sum() / 2 ** 20
+            for i, (name, sql, frame) in enumerate(cases):
+                sql_ms, sql_result = _p50_ms(sql, args.repeat)
+                frame_ms, frame_result = _p50_ms(frame, args.repeat)
+                if name == 'report':
+                    # Float sums may differ in the last bits between summation orders
+                    same = all(sql_result[key] == frame_result[key] for key in sql_result
+                               if key not in ('total_stock', 'used_space'))
+                else:
+                    same = sql_result == frame_result
+                print(f"{rows if i == 0 else '':>10} {f'{load:.1f}' if i == 0 else '':>7} "
+                      f"{f'{frame_mib:.0f}' if i == 0 else '':>10} {name:>8} {sql_ms:>8.1f} {frame_ms:>9.1f} "
+                      f"{'yes' if same else 'NO':>5}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""Load test of the live 2D layout stream with a simulated stock feed.
+
+Serves the app from a gevent server on a scratch SQLite database, as the
+stream server of gunicorn.live.conf.py does (with its default stream cap),
+opens ``--viewers`` streams of one dataset's layout (a ``--slow`` share of
+them read with a delay and a small socket buffer) and applies ``--rate``
+deltas per second of ``--batch`` quantity changes each, straight to the
+database as a writer in another process would. Every row is one viewer
+count:
+
+* "events" is the median number of events a fast viewer got and
+  "shelves/event" how many changed shelves each carried, i.e. how well
+  bursts were coalesced;
+* "p50/p95/p99 ms" is the delay from a delta's commit to a fast viewer
+  receiving it, which includes up to one poll interval plus one batch
+  interval;
+* "slow events" is the median a slow viewer got, fewer and larger ones, and
+  "resyncs" how many times slow viewers were told to refetch instead of
+  being sent everything (see ``--max-pending``);
+* "db reads" counts the statements the shared feed ran per delta, which
+  should not grow with the number of viewers.
+
+    python -m benchmarks.bench_live --viewers 10 100 300 --rate 20 --seconds 10
+    python -m benchmarks.bench_live --viewers 50 --batch 200 --max-pending 1000  # slow viewers resync
+"""
+from gevent import monkey
+
+monkey.patch_all()  # Before anything imports socket or threading, like gunicorn's gevent workers
+
+import argparse
+import http.client
+import http.cookiejar
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+import numpy as np
+
+
+def _login(base_url):
+    # A user of the scratch database, and the session cookie the streams send
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    form = {'name': 'bench', 'email': 'bench@example.com', 'company_name': 'bench', 'warehouse_type': 'bench',
+            'password': 'bench', 'workspace_name': 'bench'}
+    opener.open(f'{base_url}/signup', urllib.parse.urlencode(form).encode())
+    opener.open(f'{base_url}/login', urllib.parse.urlencode({'email': form['email'], 'password': 'bench'}).encode())
+    return '; '.join(f'{cookie.name}={cookie.value}' for cookie in jar)
+
+
+class _Viewer(threading.Thread):
+    """Reads one event stream, recording when each event arrived."""
+
+    def __init__(self, port, path, cookie, delay=0.0):
+        super().__init__(daemon=True)
+        self.port, self.path, self.cookie, self.delay = port, path, cookie, delay
+        self.events = []  # (arrival, name, revision, shelves)
+        self.socket = socket.socket()  # Kept: the connection lets go of it once the response is read
+        if delay:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)  # Before connecting, to cap the window
+        self.socket.connect(('127.0.0.1', port))
+        self.connection = http.client.HTTPConnection('127.0.0.1', port)
+        self.connection.sock = self.socket
+
+    def run(self):
+        try:
+            self.connection.request('GET', self.path, headers={'Cookie': self.cookie})
+            response = self.connection.getresponse()
+            name = None
+            while True:
+                line = response.readline()
+                if not line:
+                    return
+                line = line.decode().rstrip('\n')
+                if line.startswith('event: '):
+                    name = line[7:]
+                elif line.startswith('data: '):
+                    payload = json.loads(line[6:])
+                    self.events.append((time.perf_counter(), name, payload['revision'],
+                                        len(payload.get('positions', []))))
+                    if self.delay:
+                        time.sleep(self.delay)
+        except (OSError, http.client.HTTPException, ValueError):
+            return  # Closed at the end of the run
+
+    def close(self):
+        self.socket.shutdown(socket.SHUT_RDWR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--viewers', type=int, nargs='+', default=[10, 100, 300])
+    parser.add_argument('--slow', type=float, default=0.1, help="share of viewers that read slowly")
+    parser.add_argument('--rate', type=float, default=20, help="deltas per second")
+    parser.add_argument('--batch', type=int, default=5, help="shelves changed per delta")
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--max-pending', type=int, help="shelves a viewer may have waiting, default LIVE_MAX_PENDING")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ.setdefault('LIVE_MAX_STREAMS', '1950')  # gunicorn.live.conf.py's default
+    from gevent.pywsgi import WSGIServer
+    import sqlalchemy as sa
+    from app import Dataset, app, db, live_shelves
+    from benchmarks.datagen import generate
+    from catalog import schema_of
+    from deltas import apply_delta, parse_delta
+    from inventory_db import InventoryLoader
+
+    with app.app_context():
+        db.create_all()
+        engine = db.engine
+    if args.max_pending:
+        live_shelves.max_pending = args.max_pending
+    server = WSGIServer(('127.0.0.1', 0), app, log=None)
+    server.start()
+    cookie = _login(f'http://127.0.0.1:{server.server_port}')
+
+    df = generate(args.rows, skus=max(args.rows // 10, 1))
+    df['Product_ID'] = np.arange(1001, 1001 + args.rows, dtype=float)
+    with engine.begin() as conn:
+        owner_id = conn.execute(sa.text("SELECT id FROM user")).scalar_one()
+        dataset_id = conn.execute(sa.insert(Dataset.__table__).values(
+            owner_id=owner_id, name='bench.csv', version=1, status='ready', checksum='0' * 64,
+            schema=schema_of(df), row_count=args.rows, source_path='', cleaned_path=os.path.join(tmp, 'bench.csv'),
+            sql_loaded=True, created_at=datetime.now())).inserted_primary_key[0]
+    loader = InventoryLoader(engine, dataset_id)
+    for offset in range(0, args.rows, 50000):
+        loader.add(df.iloc[offset:offset + 50000])
+    schema = [{'name': column, 'dtype': str(dtype)} for column, dtype in df.dtypes.items()]
+    columns = list(df.columns)
+
+    # Statements the feed threads run, to show they don't grow with viewers
+    feed_statements = [0]
+
+    @sa.event.listens_for(engine, 'before_cursor_execute')
+    def _count(*_):
+        if threading.current_thread().name.startswith('shelf-feed'):
+            feed_statements[0] += 1
+
+    rng = np.random.default_rng(0)
+    print(f"{'viewers':>8} {'slow':>5} {'deltas':>7} {'events':>7} {'shelves/event':>14} {'p50 ms':>7} "
+          f"{'p95 ms':>7} {'p99 ms':>7} {'slow events':>12} {'resyncs':>8} {'db reads':>9}")
+    for count in args.viewers:
+        with engine.connect() as conn:
+            revision = conn.execute(sa.select(Dataset.__table__.c.revision)
+                                    .where(Dataset.__table__.c.id == dataset_id)).scalar_one()
+        path = f'/api/shelves/{dataset_id}/live?since={revision}'
+        slow = int(count * args.slow)
+        viewers = [_Viewer(server.server_port, path, cookie, delay=1.0 if i < slow else 0.0) for i in range(count)]
+        for viewer in viewers:
+            viewer.start()
+        while sum(live_shelves.stats().values()) < count:
+            time.sleep(0.05)
+
+        # The simulated stock feed
+        committed = {}
+        feed_statements[0] = 0
+        deltas = int(args.seconds * args.rate)
+        start = time.perf_counter()
+        for i in range(deltas):
+            time.sleep(max(0.0, start + i / args.rate - time.perf_counter()))
+            keys = rng.choice(df['Product_ID'].to_numpy(), size=args.batch, replace=False)
+            upserts, deletes = parse_delta(schema, [{'Product_ID': key, 'Quantity Available': float(rng.integers(0, 40))}
+                                                    for key in keys])
+            result = apply_delta(engine, dataset_id, 'bench.csv', columns, upserts, deletes)
+            committed[result['revision']] = time.perf_counter()
+        time.sleep(2 * app.config['LIVE_POLL_INTERVAL'] + 1.5)
+        reads = feed_statements[0]
+
+        for viewer in viewers:
+            viewer.close()
+        fast = viewers[slow:]
+        latencies = []
+        for viewer in fast:
+            # Each delta is seen with the first event at or past its revision
+            arrivals = [(revision, arrival) for arrival, name, revision, _ in viewer.events if name == 'shelves']
+            revisions = np.array([revision for revision, _ in arrivals])
+            for revision, commit in committed.items():
+                seen = np.searchsorted(revisions, revision)
+                if seen < len(arrivals):
+                    latencies.append(arrivals[seen][1] - commit)
+        sizes = [shelves for viewer in fast for _, name, _, shelves in viewer.events if name == 'shelves']
+        resyncs = sum(name == 'resync' for viewer in viewers[:slow] for _, name, _, _ in viewer.events)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000 if latencies else (np.nan,) * 3
+        print(f"{count:>8} {slow:>5} {deltas:>7} {np.median([len(v.events) for v in fast]):>7.0f} "
+              f"{np.mean(sizes) if sizes else 0:>14.1f} {p50:>7.0f} {p95:>7.0f} {p99:>7.0f} "
+              f"{np.median([len(v.events) for v in viewers[:slow]]) if slow else 0:>12.0f} {resyncs:>8} "
+              f"{reads / deltas:>9.1f}")
+
+        # Streams notice closed connections at their next keepalive; wait for the feed to stop
+        while live_shelves.stats():
+            time.sleep(0.5)
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""Concurrent load test of the main routes: latency percentiles, throughput and server memory.
+
+By default the app is served from its own process (the threaded development
+server on a scratch database) with one uploaded synthetic dataset of
+``--rows`` rows; pass ``--url`` and ``--dataset-id`` to load an already
+running server instead, e.g. one started under gunicorn, signed in as the
+benchmark user of harness.py. Each ``--concurrency`` level runs that many
+client threads for ``--seconds``, every thread requesting the routes of
+harness.ROUTES in turn without following redirects. Failed requests (4xx,
+5xx, redirects to an error page) count as errors and are left out of the
+percentiles. "peak RSS" is the server process's (or the ``--pid``\\s'
+largest), read from /proc on Linux.
+
+    python -m benchmarks.bench_load --rows 100000 --concurrency 1 8 32 --seconds 20 --json load.json
+    python -m benchmarks.bench_load --url http://127.0.0.1:8000 --dataset-id 1 --pid 4242 --concurrency 16
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import numpy as np
+
+from benchmarks.harness import ROUTES, http_sign_in, peak_rss_mb, succeeded, write_json
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args):
+        return None  # Redirects come back as HTTPError, with their status and Location
+
+
+def _serve(rows, skus, shelves, eager, ready, stop):
+    # The server process: a scratch app with one uploaded dataset
+    import logging
+    from werkzeug.serving import make_server
+    from benchmarks.datagen import write_csv
+    from benchmarks.harness import scratch_app, sign_in, upload
+
+    tmp = tempfile.mkdtemp(prefix='bench_load_')
+    app_module = scratch_app(tmp, eager=eager)
+    client = app_module.app.test_client()
+    sign_in(client)
+    dataset_id = upload(client, write_csv(os.path.join(tmp, 'warehouse.csv'), rows, skus=skus, shelves=shelves))
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # No line per request
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    ready.put((server.server_port, dataset_id))
+    stop.wait()
+    server.shutdown()
+    if hasattr(app_module.job_queue.backend, 'shutdown'):
+        app_module.job_queue.backend.shutdown(wait=True)  # Or the job workers outlive the server
+
+
+def _request(opener, base_url, cookie, route, timeout=60):
+    name, method, path, data = route
+    request = urllib.request.Request(base_url + path, method=method, headers={'Cookie': cookie},
+                                     data=urllib.parse.urlencode(data).encode() if data else None)
+    start = time.perf_counter()
+    try:
+        with opener.open(request, timeout=timeout) as response:
+            response.read()
+            ok = succeeded(response.status)
+    except urllib.error.HTTPError as e:
+        e.read()
+        ok = succeeded(e.code, e.headers.get('Location'))
+    except OSError:  # Refused, reset or timed out
+        ok = False
+    return name, time.perf_counter() - start, ok
+
+
+def _client(base_url, cookie, routes, offset, stop, samples):
+    opener = urllib.request.build_opener(_NoRedirect)
+    i = offset
+    while not stop.is_set():
+        samples.append(_request(opener, base_url, cookie, routes[i % len(routes)]))
+        i += 1
+
+
+def run_level(base_url, cookie, routes, concurrency, seconds):
+    """Samples ``(route, seconds, ok)`` of ``concurrency`` threads over ``seconds``, and the wall time."""
+    stop, samples = threading.Event(), []
+    threads = [threading.Thread(target=_client, args=(base_url, cookie, routes, i, stop, samples), daemon=True)
+               for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def _summary(samples, wall):
+    latencies = np.array([seconds for _, seconds, ok in samples if ok]) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (np.nan,) * 3
+    return {'requests': len(samples), 'errors': sum(not ok for *_, ok in samples),
+            'throughput_rps': len(samples) / wall, 'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--skus', type=int, help="distinct products, default a tenth of the rows")
+    parser.add_argument('--shelves', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--routes', nargs='+', choices=[name for name, *_ in ROUTES])
+    parser.add_argument('--eager', action='store_true', help="run background jobs in the request")
+    parser.add_argument('--url', help="load this running server instead of starting one")
+    parser.add_argument('--dataset-id', type=int, help="dataset of the benchmark user on --url")
+    parser.add_argument('--pid', type=int, nargs='+', help="server processes of --url, for their peak RSS")
+    parser.add_argument('--json', help="also write the results to this file, '-' for stdout")
+    args = parser.parse_args()
+    if args.url and args.dataset_id is None:
+        parser.error("--url needs --dataset-id")
+
+    server = None
+    if args.url:
+        base_url, dataset_id, pids = args.url.rstrip('/'), args.dataset_id, args.pid or []
+    else:
+        ready, stop = multiprocessing.Queue(), multiprocessing.Event()
+        server = multiprocessing.Process(target=_serve, args=(
+            args.rows, args.skus or max(args.rows // 10, 1), args.shelves, args.eager, ready, stop))
+        server.start()
+        port, dataset_id = ready.get()
+        base_url, pids = f'http://127.0.0.1:{port}', [server.pid]
+
+    try:
+        cookie = http_sign_in(base_url)
+        routes = [(name, method, path.format(id=dataset_id), data) for name, method, path, data in ROUTES
+                  if args.routes is None or name in args.routes]
+        opener = urllib.request.build_opener(_NoRedirect)
+        for route in routes:  # Parsing the dataset and first renders are not part of the load
+            _request(opener, base_url, cookie, route)
+
+        results = []
+        print(f"{'threads':>8} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'p99 ms':>8} {'peak RSS MiB':>13}")
+        for concurrency in args.concurrency:
+            samples, wall = run_level(base_url, cookie, routes, concurrency, args.seconds)
+            level = {'concurrency': concurrency, 'seconds': wall, **_summary(samples, wall),
+                     'peak_rss_mb': max((peak_rss_mb(pid) for pid in pids), default=float('nan')),
+                     'routes': {name: _summary([s for s in samples if s[0] == name], wall) for name, *_ in routes}}
+            results.append(level)
+            print(f"{concurrency:>8} {level['requests']:>9} {level['errors']:>7} {level['throughput_rps']:>8.1f} "
+                  f"{level['p50_ms']:>8.1f} {level['p95_ms']:>8.1f} {level['p99_ms']:>8.1f} "
+                  f"{level['peak_rss_mb']:>13.0f}")
+        if args.json:
+            write_json(args.json, 'load', args, results)
+    finally:
+        if server is not None:
+            stop.set()
+            server.join(30)
+            if server.is_alive():
+                server.terminate()
+
+
+if __name__ == '__main__':
+    main()
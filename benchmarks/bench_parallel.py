@@ -0,0 +1,63 @@
+"""Whole-dataset analytics on one process vs. partitioned over worker processes.
+
+Times the per-product trend fit (partitioned by product), the report KPIs
+and the correlation heatmap's matrix (both by row ranges) at every
+``--workers`` count, after a warm-up call that starts the pool. "same" says
+whether the partitioned result matches the single-process one, "speedup"
+is the first ``--workers`` column over the fastest. Speedups need as many
+free cores as workers.
+
+    python -m benchmarks.bench_parallel --rows 1000000 5000000 --workers 1 2 4 8
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.datagen import generate
+from chart_data import correlation
+from forecasting import grouped_stats
+from kpis import compute_kpis
+from reports import SOURCE_COLUMNS
+
+ANALYTICS = {
+    'trends': lambda df, workers: grouped_stats(df, 'Product Name', 'Total Sales Volume', workers),
+    'kpis': lambda df, workers: compute_kpis(df[[c for c in SOURCE_COLUMNS if c in df.columns]], workers),
+    'corr': lambda df, workers: correlation(df, workers),
+}
+
+
+def _same(result, reference):
+    if isinstance(result, dict):
+        return result == reference
+    return bool(np.allclose(result.to_numpy(dtype=np.float64), reference.to_numpy(dtype=np.float64),
+                            equal_nan=True, atol=1e-9))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000000])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'analytics':>10} " + ' '.join(f"{f'w={w} s':>9}" for w in args.workers)
+          + f" {'speedup':>8} {'same':>5}")
+    for rows in args.rows:
+        df = generate(rows, skus=max(rows // 100, 1))
+        for name, run in ANALYTICS.items():
+            reference = run(df, 1)
+            timings, same = [], True
+            for workers in args.workers:
+                result = run(df, workers)  # Starts the pool
+                same = same and _same(result, reference)
+                start = time.perf_counter()
+                for _ in range(args.repeat):
+                    run(df, workers)
+                timings.append((time.perf_counter() - start) / args.repeat)
+            print(f"{rows:>10} {name:>10} " + ' '.join(f"{t:>9.3f}" for t in timings)
+                  + f" {timings[0] / min(timings):>7.1f}x {str(same):>5}")
+
+
+if __name__ == '__main__':
+    main()
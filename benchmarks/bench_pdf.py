@@ -0,0 +1,61 @@
+"""Per-report latency of the in-process PDF renderer.
+
+For each dataset size the KPIs are computed once (as at upload time), then
+the report is rendered from them repeatedly: "cold" renders the PDF from the
+KPIs and the cached trend chart, "cached" is the lookup that serves an
+already-rendered version. The pdfkit path it replaced needed a wkhtmltopdf
+process plus a full report request against the server per PDF.
+
+    python -m benchmarks.bench_pdf --rows 10000 100000 1000000 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.datagen import generate
+
+
+def main():
+    from charts import render_trend
+    from kpis import ReportKPIs
+    from pdf_report import cached_report_pdf, render_report_pdf
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'slow movers':>12} {'kpis s':>8} {'cold p50 ms':>12} {'cold max ms':>12} "
+          f"{'cached ms':>10} {'pdf KiB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            df = generate(rows)
+            start = time.perf_counter()
+            accumulator = ReportKPIs()
+            accumulator.add(df)
+            kpis = accumulator.result()
+            kpi_seconds = time.perf_counter() - start
+
+            chart_path = render_trend(df, os.path.join(tmp, f'trend_{rows}.png'))
+            cold = []
+            for i in range(args.repeat):
+                out = os.path.join(tmp, f'report_{rows}_{i}.pdf')
+                start = time.perf_counter()
+                render_report_pdf(kpis, out, 'Benchmark report', chart_path)
+                cold.append(time.perf_counter() - start)
+
+            version = f'bench-{rows}'
+            cached_report_pdf(tmp, f'{rows}.csv', version, lambda: kpis, lambda: chart_path)
+            start = time.perf_counter()
+            path = cached_report_pdf(tmp, f'{rows}.csv', version, lambda: kpis, lambda: chart_path)
+            cached = time.perf_counter() - start
+
+            print(f"{rows:>10} {len(kpis['slow_moving_products']):>12} {kpi_seconds:>8.3f} "
+                  f"{statistics.median(cold) * 1000:>12.1f} {max(cold) * 1000:>12.1f} "
+                  f"{cached * 1000:>10.3f} {os.path.getsize(path) / 1024:>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
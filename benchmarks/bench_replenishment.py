@@ -0,0 +1,50 @@
+"""Purchase plan for every SKU of a dataset, with and without a capacity limit.
+
+Generates one row per SKU (``--skus-per-product`` SKUs share a product name
+and its forecast), fits the per-product trends once as the app's forecast
+registry would, then times ``plan_replenishment`` without a warehouse
+capacity and with one that defers part of the orders.
+
+    python -m benchmarks.bench_replenishment --rows 100000 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.datagen import generate
+from forecasting import fit_grouped_trends
+from replenishment import plan_replenishment
+
+
+def _timed(run, repeat):
+    result = run()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        run()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--skus-per-product', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'lines':>9} {'suppliers':>9} {'plan s':>8} {'capped s':>9} {'deferred':>10}")
+    for rows in args.rows:
+        df = generate(rows, skus=max(rows // args.skus_per_product, 1))
+        df['Product_ID'] = np.arange(1001, 1001 + rows, dtype=np.float64)  # One row per SKU
+        trends = fit_grouped_trends(df['Product Name'], df['Total Sales Volume'])
+
+        (lines, orders), plain = _timed(lambda: plan_replenishment(df, trends), args.repeat)
+        # Room for the stock on hand and half of the orders
+        capacity = df['Storage Space (cubic ft)'].sum() + lines['Order Volume (cubic ft)'].sum() / 2
+        (capped, _), limited = _timed(lambda: plan_replenishment(df, trends, capacity), args.repeat)
+        print(f"{rows:>10} {len(lines):>9} {len(orders):>9} {plain:>8.3f} {limited:>9.3f} "
+              f"{int(capped['Deferred Quantity'].sum()):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Latency of the main routes against dataset size, through the Flask test client.
+
+For each ``--rows`` a synthetic inventory (see datagen.py) is uploaded into a
+scratch app instance; "upload s" covers the request and the cleaning job. Then
+every route of harness.ROUTES is requested once cold, right after the upload
+(nothing parsed or cached yet), and ``--repeat`` times warm. Chart requests
+time the render job on the cold call and the cached redirect after it. Jobs
+run in the request with ``--eager``, on the job pool otherwise. "peak RSS"
+is this process's and, for the pool, its largest job worker's.
+
+    python -m benchmarks.bench_routes --rows 1000 100000 1000000 --json routes.json
+    python -m benchmarks.bench_routes --rows 10000000 --skus 500000 --shelves 5000 --repeat 3
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.datagen import write_csv
+from benchmarks.harness import (ROUTES, children_peak_rss_mb, peak_rss_mb, scratch_app, sign_in, succeeded, upload,
+                                wait_for_job, write_json)
+
+
+def _request(client, method, path, data):
+    start = time.perf_counter()
+    response = client.open(path, method=method, data=data)
+    response = wait_for_job(client, response)
+    response.get_data()
+    return time.perf_counter() - start, succeeded(response.status_code, response.headers.get('Location'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000])
+    parser.add_argument('--skus', type=int, help="distinct products, default a tenth of the rows")
+    parser.add_argument('--shelves', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--routes', nargs='+', choices=[name for name, *_ in ROUTES])
+    parser.add_argument('--eager', action='store_true', help="run background jobs in the request")
+    parser.add_argument('--json', help="also write the results to this file, '-' for stdout")
+    args = parser.parse_args()
+    json_path = os.path.abspath(args.json) if args.json and args.json != '-' else args.json
+
+    tmp = tempfile.mkdtemp(prefix='bench_routes_')
+    app_module = scratch_app(tmp, eager=args.eager)
+    client = app_module.app.test_client()
+    sign_in(client)
+    routes = [route for route in ROUTES if args.routes is None or route[0] in args.routes]
+
+    results = []
+    print(f"{'rows':>10} {'route':>16} {'cold ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'ok':>4}")
+    for rows in args.rows:
+        source = write_csv(os.path.join(tmp, f'warehouse_{rows}.csv'), rows,
+                           skus=args.skus or max(rows // 10, 1), shelves=args.shelves)
+        start = time.perf_counter()
+        dataset_id = upload(client, source)
+        seconds = time.perf_counter() - start
+        print(f"{rows:>10} {'upload_csv':>16} {seconds * 1000:>9.0f} {'':>8} {'':>8} {'True':>4}")
+        results.append({'rows': rows, 'route': 'upload_csv', 'cold_ms': seconds * 1000, 'ok': True})
+
+        for name, method, path, data in routes:
+            path = path.format(id=dataset_id)
+            cold, ok = _request(client, method, path, data)
+            timings = []
+            for _ in range(args.repeat):
+                seconds, repeat_ok = _request(client, method, path, data)
+                timings.append(seconds)
+                ok = ok and repeat_ok
+            p50, p95 = np.percentile(timings, [50, 95]) * 1000 if timings else (np.nan,) * 2
+            print(f"{rows:>10} {name:>16} {cold * 1000:>9.1f} {p50:>8.1f} {p95:>8.1f} {str(ok):>4}")
+            results.append({'rows': rows, 'route': name, 'method': method, 'cold_ms': cold * 1000,
+                            'p50_ms': float(p50), 'p95_ms': float(p95), 'repeat': args.repeat, 'ok': ok})
+
+    rss = {'peak_rss_mb': peak_rss_mb(), 'peak_job_rss_mb': children_peak_rss_mb()}
+    print(f"peak RSS {rss['peak_rss_mb']:.0f} MiB, job workers {rss['peak_job_rss_mb']:.0f} MiB")
+    if json_path:
+        write_json(json_path, 'routes', args, {'routes': results, **rss})
+
+
+if __name__ == '__main__':
+    main()
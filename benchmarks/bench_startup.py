@@ -0,0 +1,136 @@
+"""Cold start and per-worker memory of the app served by preforked workers.
+
+Every mode runs in a fresh interpreter on a scratch database, set up like a
+preforking server (gunicorn and its ``preload_app``, see gunicorn.conf.py):
+
+* ``lazy``: the master imports app.py, which leaves plotting, PDF and
+  model-fitting modules to be imported on first use, then forks;
+* ``prewarm``: the master imports wsgi.py, which also imports those modules
+  (the production setup), then forks;
+* ``no-preload``: workers are forked from a bare master and each imports
+  wsgi.py itself, as gunicorn does without ``preload_app``.
+
+"import s" is the master's import (tables created), "start s" a worker's own
+import. Each worker then serves its first login page and renders its first
+trend chart, as on its first requests. Memory is read from /proc/<pid>/smaps_rollup
+(Linux only) once every worker is up: "PSS" counts pages shared with the master
+and siblings proportionally, "private" is what only that worker holds (USS),
+and "total" is the PSS of the master plus all workers, i.e. the memory the
+whole server takes.
+
+    python -m benchmarks.bench_startup --workers 4 --json startup.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.harness import write_json
+
+MODES = ['lazy', 'prewarm', 'no-preload']
+
+
+def memory_mb(pid):
+    """RSS, PSS and private memory (USS) of process ``pid`` in MiB."""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if value.strip().endswith('kB'):
+                fields[name] = int(value.split()[0]) / 1024
+    return fields['Rss'], fields['Pss'], fields['Private_Clean'] + fields['Private_Dirty']
+
+
+def _import(entry):
+    start = time.perf_counter()
+    module = __import__(entry)
+    if entry == 'app':
+        module.init_db()  # wsgi.py does this on import
+    return module, time.perf_counter() - start
+
+
+def _worker(mode, directory, ready, done):
+    start = 0.0
+    if mode == 'no-preload':
+        _, start = _import('wsgi')
+    import app as app_module
+    from charts import render_trend
+
+    begin = time.perf_counter()
+    app_module.app.test_client().get('/login')
+    login = time.perf_counter() - begin
+    begin = time.perf_counter()
+    render_trend(pd.DataFrame({'Total Sales Volume': np.arange(1000)}),
+                 os.path.join(directory, f'trend_{os.getpid()}.png'))
+    chart = time.perf_counter() - begin
+    ready.put({'start_s': start, 'login_ms': login * 1000, 'chart_ms': chart * 1000})
+    done.wait()
+
+
+def measure(mode, workers):
+    """One mode, run in this (fresh) process; returns its results."""
+    directory = tempfile.mkdtemp(prefix='bench_startup_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    sys.path.insert(0, os.getcwd())
+    os.chdir(directory)
+
+    imported = 0.0
+    if mode != 'no-preload':
+        _, imported = _import('app' if mode == 'lazy' else 'wsgi')
+    context = multiprocessing.get_context('fork')
+    ready, done = context.Queue(), context.Event()
+    processes, timings = [], []
+    for _ in range(workers):  # One at a time, like workers coming up; no two create the tables at once
+        process = context.Process(target=_worker, args=(mode, directory, ready, done))
+        process.start()
+        processes.append(process)
+        timings.append(ready.get())
+
+    master = memory_mb(os.getpid())
+    per_worker = [memory_mb(process.pid) for process in processes]
+    done.set()
+    for process in processes:
+        process.join()
+
+    rss, pss, private = np.mean(per_worker, axis=0)
+    return {'mode': mode, 'workers': workers, 'import_s': imported, 'master_rss_mb': master[0],
+            **{key: float(np.mean([t[key] for t in timings])) for key in timings[0]},
+            'worker_rss_mb': rss, 'worker_pss_mb': pss, 'worker_private_mb': private,
+            'total_pss_mb': master[1] + sum(p for _, p, _ in per_worker)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--json', help="also write the results to this file, '-' for stdout")
+    parser.add_argument('--measure', choices=MODES, help=argparse.SUPPRESS)  # Child process of one mode
+    args = parser.parse_args()
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.workers)))
+        return
+
+    results = []
+    print(f"{'mode':>10} {'import s':>9} {'start s':>8} {'login ms':>9} {'chart ms':>9} {'RSS MiB':>8} "
+          f"{'PSS MiB':>8} {'private':>8} {'total MiB':>10}")
+    for mode in args.modes:
+        child = subprocess.run([sys.executable, '-m', 'benchmarks.bench_startup', '--measure', mode,
+                                '--workers', str(args.workers)], capture_output=True, text=True, check=True)
+        row = json.loads(child.stdout.splitlines()[-1])
+        results.append(row)
+        print(f"{mode:>10} {row['import_s']:>9.2f} {row['start_s']:>8.2f} {row['login_ms']:>9.1f} "
+              f"{row['chart_ms']:>9.1f} {row['worker_rss_mb']:>8.0f} {row['worker_pss_mb']:>8.0f} "
+              f"{row['worker_private_mb']:>8.0f} {row['total_pss_mb']:>10.0f}")
+    if args.json:
+        write_json(args.json, 'startup', args, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Compare two JSON results of bench_routes or bench_load and flag regressions.
+
+Rows are matched on dataset size and route (bench_routes) or concurrency
+level (bench_load); "change" is new over old, and rows slower by more than
+``--threshold`` are marked. Exits with status 1 if any are, for use in CI.
+
+    python -m benchmarks.compare baseline.json routes.json --threshold 0.2
+"""
+import argparse
+import json
+import sys
+
+METRICS = {'routes': ['cold_ms', 'p50_ms', 'p95_ms'], 'load': ['p50_ms', 'p95_ms', 'p99_ms']}
+
+
+def _rows(document):
+    if document['benchmark'] == 'routes':
+        return {(row['rows'], row['route']): row for row in document['results']['routes']}
+    return {(level['concurrency'], 'all'): level for level in document['results']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=0.1, help="slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    if old['benchmark'] != new['benchmark']:
+        parser.error(f"{args.old} is a {old['benchmark']} run, {args.new} a {new['benchmark']} run")
+
+    old_rows, regressions = _rows(old), 0
+    print(f"{'key':>10} {'route':>16} {'metric':>8} {'old':>9} {'new':>9} {'change':>7}")
+    for key, row in _rows(new).items():
+        if key not in old_rows:
+            continue
+        for metric in METRICS[new['benchmark']]:
+            before, after = old_rows[key].get(metric), row.get(metric)
+            if not before or after is None:
+                continue
+            change = after / before
+            regressed = change > 1 + args.threshold
+            regressions += regressed
+            print(f"{key[0]:>10} {key[1]:>16} {metric:>8} {before:>9.1f} {after:>9.1f} {change:>6.2f}x"
+                  + (' slower' if regressed else ''))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
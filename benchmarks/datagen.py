@@ -0,0 +1,82 @@
+"""Synthetic warehouse inventory following the amazon_warehouse.csv schema.
+
+    python -m benchmarks.datagen warehouse_10m.csv --rows 10000000 --skus 500000 --shelves 5000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+PRODUCTS = [
+    'Cushion Set', 'Hand Mixer', 'Desk Lamp', 'Storage Box', 'Office Chair',
+    'Water Bottle', 'Blender', 'Bookshelf', 'Curtains', 'Wall Clock',
+]
+CATEGORIES = ['Lighting', 'Appliances', 'Furniture', 'Decor', 'Kitchen', 'Storage']
+SUPPLIERS = ['IKEA Supplies', 'Storage Solutions', 'HomeCo', 'Kitchen Pro', 'BrightLights']
+ORDER_STATUSES = ['Low Stock', 'Reorder Needed', 'In Stock', 'Overstocked']
+SECTIONS = ['A', 'B', 'C', 'D', 'E']
+
+
+def generate_chunk(rows, start=0, skus=1000, shelves=500, seed=0):
+    """One chunk of rows; ``start`` keeps Product_IDs and dates continuous across chunks."""
+    rng = np.random.default_rng(seed + start)
+    sku = rng.integers(0, skus, rows)
+    purchase = np.round(rng.uniform(5, 500, rows), 2)
+    selling = np.round(purchase * rng.uniform(1.1, 2.0, rows), 2)
+    quantity = rng.integers(1, 100, rows).astype(float)
+    sales = rng.integers(1, 500, rows).astype(float)
+    shelf = rng.integers(0, shelves, rows)
+    dates = pd.Timestamp('2025-01-01') + pd.to_timedelta(np.arange(start, start + rows) % 365, unit='D')
+
+    return pd.DataFrame({
+        'Product_ID': (1001 + sku).astype(float),
+        'Product Name': np.array(PRODUCTS)[sku % len(PRODUCTS)] + ' ' + (sku // len(PRODUCTS)).astype(str),
+        'Category': np.array(CATEGORIES)[sku % len(CATEGORIES)],
+        'Shelf Number': np.char.add(np.array(list('ABCDEFGHIJKLMNOPQRST'))[shelf % 20], (shelf // 20 + 1).astype(str)),
+        'Quantity Available': quantity,
+        'Reorder_Level': rng.integers(1, 20, rows).astype(float),
+        'Supplier_Name': np.array(SUPPLIERS)[sku % len(SUPPLIERS)],
+        'Purchase_Price': purchase,
+        'Selling_Price': selling,
+        'Last_Stock_Update': dates.month.astype(str) + '/' + dates.day.astype(str) + '/' + dates.year.astype(str),
+        'Order_Status': np.array(ORDER_STATUSES)[rng.integers(0, len(ORDER_STATUSES), rows)],
+        'Total Sales Volume': sales,
+        'Total Revenue': np.round(sales * selling, 2),
+        'Profit per Unit': np.round(selling - purchase, 2),
+        'Profit Margin (%)': np.round((selling - purchase) / selling * 100, 2),
+        'Stock Turnover Rate': sales / quantity,
+        'Storage Space (cubic ft)': rng.integers(5, 50, rows).astype(float),
+        'Warehouse Section': np.array(SECTIONS)[shelf % len(SECTIONS)],
+        'Profit_Margin (%)': np.round(rng.uniform(5, 60, rows), 2),
+    })
+
+
+def generate(rows, skus=1000, shelves=500, seed=0):
+    return generate_chunk(rows, skus=skus, shelves=shelves, seed=seed)
+
+
+def write_csv(path, rows, skus=1000, shelves=500, seed=0, chunk_rows=100000):
+    """Write ``rows`` synthetic rows to ``path`` without holding them all in memory."""
+    for start in range(0, rows, chunk_rows):
+        chunk = generate_chunk(min(chunk_rows, rows - start), start, skus, shelves, seed)
+        chunk.to_csv(path, index=False, mode='w' if start == 0 else 'a', header=start == 0)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--skus', type=int, help="distinct products, default a tenth of the rows")
+    parser.add_argument('--shelves', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    write_csv(args.path, args.rows, skus=args.skus or max(args.rows // 10, 1), shelves=args.shelves, seed=args.seed)
+    print(f"{args.rows} rows written to {args.path} in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
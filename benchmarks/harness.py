@@ -0,0 +1,135 @@
+"""Shared setup of the route benchmarks: a scratch app instance, a signed-in user and uploaded datasets."""
+import http.cookiejar
+import json
+import multiprocessing
+import os
+import platform
+import re
+import sys
+import time
+import urllib.parse
+import urllib.request
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows: no peak RSS
+    resource = None
+
+# name, method, path (formatted with the dataset id), form data
+ROUTES = [
+    ('report', 'GET', '/generate_report/{id}', None),
+    ('report_capacity', 'POST', '/generate_report/{id}', {'total_capacity': '100000'}),
+    ('visualization', 'GET', '/visualization/{id}', None),
+    ('chart_bar', 'POST', '/visualization/{id}',
+     {'chart_type': 'bar', 'x_column': 'Category', 'y_column': 'Quantity Available'}),
+    ('recommend_stock', 'GET', '/recommend_stock/{id}', None),
+    ('warehouse_2d', 'GET', '/warehouse_2d_model/{id}', None),
+    ('shelves_api', 'GET', '/api/shelves/{id}', None),
+]
+USER = {'name': 'bench', 'email': 'bench@example.com', 'company_name': 'bench', 'warehouse_type': 'bench',
+        'password': 'bench', 'workspace_name': 'bench'}
+
+
+def scratch_app(directory, eager=False):
+    """Import the app with its database and folders in ``directory``; returns the app module.
+
+    The app creates its upload and cache folders relative to the working
+    directory on import, so the benchmark runs from ``directory``.
+    """
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    sys.path.insert(0, os.getcwd())
+    os.chdir(directory)
+    import app as app_module
+
+    if eager:
+        from jobs import InlineBackend
+        app_module.job_queue.backend = InlineBackend()
+    app_module.init_db()
+    return app_module
+
+
+def sign_in(client):
+    client.post('/signup', data=USER)
+    client.post('/login', data={'email': USER['email'], 'password': USER['password']})
+
+
+def http_sign_in(base_url):
+    """Sign in to a running server; returns the Cookie header to send."""
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    opener.open(f'{base_url}/signup', urllib.parse.urlencode(USER).encode())
+    opener.open(f'{base_url}/login',
+                urllib.parse.urlencode({'email': USER['email'], 'password': USER['password']}).encode())
+    return '; '.join(f'{cookie.name}={cookie.value}' for cookie in jar)
+
+
+def succeeded(status, location=''):
+    """2xx, or a redirect anywhere but the error pages (home and login)."""
+    if status < 300:
+        return True
+    return 300 <= status < 400 and urllib.parse.urlparse(location or '').path not in ('', '/', '/login')
+
+
+def wait_for_job(client, response, timeout=3600):
+    """Follow a redirect to a background job's page until the job is done; returns its result response."""
+    match = re.search(r'/jobs/(\w+)/wait', response.headers.get('Location', ''))
+    if match is None:
+        return response
+    deadline = time.monotonic() + timeout
+    while client.get(f'/jobs/{match.group(1)}').get_json()['status'] not in ('finished', 'failed'):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"job {match.group(1)} still running after {timeout} s")
+        time.sleep(0.05)
+    return client.get(f'/jobs/{match.group(1)}/result')
+
+
+def upload(client, path):
+    """Upload ``path`` and wait for it to be cleaned; returns the dataset id."""
+    with open(path, 'rb') as f:
+        response = client.post('/upload_csv', data={'csvFile': (f, os.path.basename(path))},
+                               content_type='multipart/form-data')
+    response = wait_for_job(client, response)
+    match = re.search(r'/insights/(\d+)', response.headers.get('Location', ''))
+    if match is None:
+        raise RuntimeError(f"upload of {path} failed with {response.status_code}")
+    return int(match.group(1))
+
+
+def peak_rss_mb(pid=None):
+    """Peak RSS of this process, or of process ``pid`` (Linux only, NaN elsewhere)."""
+    if pid is None and resource is not None:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)  # Bytes on macOS, KiB on Linux
+    try:
+        with open(f"/proc/{pid or os.getpid()}/status") as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float('nan')
+
+
+def children_peak_rss_mb():
+    """Largest peak RSS among the running child processes (job and analytics workers)."""
+    return max((peak_rss_mb(child.pid) for child in multiprocessing.active_children()), default=float('nan'))
+
+
+def write_json(path, benchmark, args, results):
+    """Write results with the run's parameters and environment, for comparing runs; '-' prints them."""
+    document = {
+        'benchmark': benchmark,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'args': vars(args),
+        'results': results,
+    }
+    if path == '-':
+        json.dump(document, sys.stdout, indent=2)
+        print()
+        return
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
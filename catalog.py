@@ -0,0 +1,197 @@
+"""Dataset catalog: every uploaded file is one version of a named dataset.
+
+A ``dataset`` row (the ``Dataset`` model in app.py) records who owns the
+upload, its name and version number, the checksum of the uploaded bytes,
+where its files live, and what ingestion found: row count, column schema,
+encodings and column statistics. Routes address datasets by row id,
+which names one version. A version's rows only change through deltas (see
+deltas.py), which bump its ``revision``, so every cache keyed by id,
+checksum and revision is invalidated exactly when the data changes.
+
+Files of a version live in per-owner folders and carry the row id, so uploads
+from different users (or repeated uploads of one file) never overwrite each
+other.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+PROCESSING = 'processing'
+READY = 'ready'
+FAILED = 'failed'
+
+# Mirrors the Dataset model in app.py for worker processes
+dataset_table = sa.table(
+    'dataset',
+    sa.column('id'), sa.column('status'), sa.column('row_count'), sa.column('schema'),
+    sa.column('encoding'), sa.column('source_encoding'), sa.column('stats'), sa.column('error'),
+    sa.column('sql_loaded'), sa.column('revision'), sa.column('files_revision'),
+)
+
+_HASH_BLOCK_BYTES = 1024 * 1024
+
+
+def save_upload(stream, path):
+    """Copy an uploaded file stream to ``path``, returning the SHA-256 of its bytes."""
+    digest = hashlib.sha256()
+    with open(path, 'wb') as out:
+        for block in iter(lambda: stream.read(_HASH_BLOCK_BYTES), b''):
+            digest.update(block)
+            out.write(block)
+    return digest.hexdigest()
+
+
+def owner_folder(root, owner_id):
+    path = os.path.join(root, str(owner_id))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def storage_paths(upload_folder, cleaned_folder, owner_id, dataset_id, name):
+    """``(source_path, cleaned_path)`` of one dataset version."""
+    return (os.path.join(owner_folder(upload_folder, owner_id), f'{dataset_id}_{name}'),
+            os.path.join(owner_folder(cleaned_folder, owner_id), f'cleaned_{dataset_id}_{name}'))
+
+
+STATS_INDEX = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+QUARTILES = [0.25, 0.5, 0.75]
+EXACT_QUANTILE_VALUES = 100000  # Values per column kept as they are; quartiles are exact up to this many
+
+
+class QuantileSketch:
+    """Values of one column in levels, for quantiles without keeping every value.
+
+    A level holding more than ``capacity`` values is sorted and every other
+    one is moved up a level, where each stands for twice as many values (as
+    in the KLL sketch). Until that first happens the quantiles are exact and
+    interpolated like ``DataFrame.describe()``; after it their rank is off by
+    about ``count / capacity`` per level.
+    """
+
+    def __init__(self, capacity=EXACT_QUANTILE_VALUES):
+        self.capacity = capacity
+        self.levels = [[]]  # Per level, arrays of values each weighing 2 ** level
+        self._sizes = [0]
+        self._offset = 0  # Which half of a compacted level moves up, alternating so neither end is favoured
+
+    def add(self, values):
+        self.levels[0].append(values)
+        self._sizes[0] += len(values)
+        level = 0
+        while self._sizes[level] > self.capacity:
+            values = np.sort(np.concatenate(self.levels[level]))
+            self.levels[level], self._sizes[level] = [], 0
+            if level + 1 == len(self.levels):
+                self.levels.append([])
+                self._sizes.append(0)
+            kept = values[self._offset::2]
+            self._offset ^= 1
+            self.levels[level + 1].append(kept)
+            self._sizes[level + 1] += len(kept)
+            level += 1
+        return self
+
+    def quantiles(self, qs):
+        if len(self.levels) == 1:
+            return np.quantile(np.concatenate(self.levels[0]), qs)
+        values = np.concatenate([np.concatenate(arrays) for arrays in self.levels if arrays])
+        weights = np.concatenate([np.full(size, 2.0 ** level) for level, size in enumerate(self._sizes) if size])
+        order = np.argsort(values, kind='stable')
+        values, ranks = values[order], np.cumsum(weights[order])
+        return values[np.minimum(np.searchsorted(ranks, np.asarray(qs) * ranks[-1]), len(values) - 1)]
+
+
+class ColumnStats:
+    """Schema and ``describe()``-style statistics of a dataset, accumulated chunk by chunk.
+
+    Means and variances are merged per chunk (Chan et al.), so the whole
+    dataset is never in memory; quartiles come from a ``QuantileSketch`` per
+    column, exact for datasets up to ``EXACT_QUANTILE_VALUES`` rows.
+    """
+
+    def __init__(self):
+        self.dtypes = None  # Column -> dtype, from the first chunk
+        self._moments = {}  # Numeric column -> [count, mean, M2, min, max]
+        self._sketches = {}  # Numeric column -> QuantileSketch
+
+    def add(self, chunk):
+        if self.dtypes is None:
+            self.dtypes = {column: str(dtype) for column, dtype in chunk.dtypes.items()}
+            self._moments = {column: [0, 0.0, 0.0, np.inf, -np.inf] for column, dtype in chunk.dtypes.items()
+                             if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)}
+            self._sketches = {column: QuantileSketch() for column in self._moments}
+        for column, moments in self._moments.items():
+            values = chunk[column].to_numpy(dtype=np.float64)
+            values = values[~np.isnan(values)]
+            if not len(values):
+                continue
+            self._sketches[column].add(values)
+            count, mean = len(values), float(values.mean())
+            m2 = float(((values - mean) ** 2).sum())
+            total = moments[0] + count
+            delta = mean - moments[1]
+            moments[2] += m2 + delta ** 2 * moments[0] * count / total
+            moments[1] += delta * count / total
+            moments[0] = total
+            moments[3] = min(moments[3], float(values.min()))
+            moments[4] = max(moments[4], float(values.max()))
+        return self
+
+    def schema(self):
+        return json.dumps([{'name': column, 'dtype': dtype} for column, dtype in (self.dtypes or {}).items()])
+
+    def result(self):
+        """The statistics as JSON, in the layout ``stats_frame`` reads."""
+        data = [[] for _ in STATS_INDEX]
+        for column, (count, mean, m2, low, high) in self._moments.items():
+            if count:
+                std = np.sqrt(m2 / (count - 1)) if count > 1 else np.nan
+                values = [count, mean, std, low, *self._sketches[column].quantiles(QUARTILES), high]
+            else:
+                values = [0] + [np.nan] * (len(STATS_INDEX) - 1)
+            for row, value in zip(data, values):
+                row.append(float(value))
+        return json.dumps({'index': STATS_INDEX, 'columns': list(self._moments), 'data': data})
+
+
+def column_stats(df):
+    """Statistics of a whole frame as JSON, see ``ColumnStats``."""
+    return ColumnStats().add(df).result()
+
+
+def stats_frame(stats):
+    stats = json.loads(stats)
+    return pd.DataFrame(stats['data'], index=stats['index'], columns=stats['columns'], dtype=np.float64)
+
+
+def schema_of(df):
+    return json.dumps([{'name': column, 'dtype': str(dtype)} for column, dtype in df.dtypes.items()])
+
+
+def mark_ready(engine, dataset_id, summary, stats, sql_loaded=False):
+    """Record what ingestion found about a dataset version and make it available.
+
+    ``stats`` is the ``ColumnStats`` of the cleaned chunks; ``sql_loaded``
+    says the rows are also in the inventory table (see inventory_db.py).
+    """
+    with engine.begin() as conn:
+        conn.execute(sa.update(dataset_table).where(dataset_table.c.id == dataset_id).values(
+            status=READY, row_count=summary['rows'], schema=stats.schema(), encoding=summary['encoding'],
+            source_encoding=summary['source_encoding'], stats=stats.result(), sql_loaded=sql_loaded,
+        ))
+
+
+def mark_loaded(engine, dataset_id):
+    """Record that a dataset's rows were loaded into the inventory table after ingestion."""
+    with engine.begin() as conn:
+        conn.execute(sa.update(dataset_table).where(dataset_table.c.id == dataset_id).values(sql_loaded=True))
+
+
+def mark_failed(engine, dataset_id, error):
+    with engine.begin() as conn:
+        conn.execute(sa.update(dataset_table).where(dataset_table.c.id == dataset_id).values(
+            status=FAILED, error=error))
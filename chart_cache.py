@@ -0,0 +1,80 @@
+"""Content-addressed cache of rendered chart PNGs.
+
+A chart's file name is a hash of everything that determines its pixels: the
+dataset version, chart type, columns and render options. Identical requests
+therefore map to the same file and are served from disk without touching
+matplotlib, and because a name never changes meaning it can be sent with a
+strong ETag and long-lived Cache-Control headers.
+
+Renders are written to a unique temporary file and atomically moved into
+place, so concurrent requests for the same chart never see a half-written
+PNG (at worst both render it and one copy wins). The cache directory is kept
+under ``max_bytes`` by deleting the least recently used files.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+# Bump when chart rendering changes so old PNGs are not served for new code
+RENDER_REVISION = 2
+
+
+def chart_key(dataset_version, chart_type, x_column=None, y_column=None, options=None):
+    payload = json.dumps([RENDER_REVISION, dataset_version, chart_type, x_column, y_column, options or {}],
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+class ChartCache:
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.png')
+
+    def get(self, key):
+        """Path of the cached chart, or None. Marks the chart as recently used."""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def render(self, key, render):
+        """Return the cached chart, calling ``render(path)`` to produce it if missing."""
+        path = self.get(key)
+        if path is not None:
+            return path
+        fd, tmp_path = tempfile.mkstemp(suffix='.png.tmp', dir=self.directory)
+        os.close(fd)
+        try:
+            render(tmp_path)
+            os.replace(tmp_path, self.path(key))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict()
+        return self.path(key)
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.png'):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:  # Evicted by another process meanwhile
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,174 @@
+"""Aggregation and downsampling applied before plotting.
+
+Seaborn plots every row it is given and bootstraps confidence intervals for
+bar and line charts, which makes rendering time grow with the dataset and
+produces unreadable charts past ~100k rows. The helpers here reduce the data
+to what actually ends up on screen — per-category statistics, a bounded
+number of line points — with vectorized pandas/NumPy operations, so render
+time is bounded regardless of row count.
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from parallel import Columns, map_partitions
+
+# 1.96 standard errors: normal-approximation 95% interval, in place of seaborn's bootstrap
+CI_Z = 1.96
+
+
+def top_categories(values, max_categories):
+    """The ``max_categories`` most frequent values, or None if there are no more than that."""
+    counts = values.value_counts()
+    if len(counts) <= max_categories:
+        return None
+    return counts.index[:max_categories]
+
+
+def _limit_categories(df, x_column, max_categories):
+    keep = top_categories(df[x_column], max_categories)
+    if keep is None:
+        return df, False
+    return df[df[x_column].isin(keep)], True
+
+
+def category_means(df, x_column, y_column, max_categories):
+    """Mean of ``y`` per ``x`` category with a 95% confidence half-width.
+
+    Returns ``(stats, truncated)`` where ``stats`` has ``mean``, ``ci`` and
+    ``count`` columns indexed by category in sorted order, and ``truncated``
+    says whether rarer categories were left out.
+    """
+    df, truncated = _limit_categories(df[[x_column, y_column]].dropna(), x_column, max_categories)
+    grouped = df.groupby(x_column, observed=True, sort=True)[y_column]
+    stats = grouped.agg(['mean', 'std', 'count'])
+    stats['ci'] = CI_Z * stats['std'].fillna(0) / np.sqrt(stats['count'])
+    return stats, truncated
+
+
+def category_counts(df, x_column, y_column, max_categories):
+    """Rows with a ``y`` value per ``x`` category, for a ``y`` that can't be averaged.
+
+    Returns ``(counts, truncated)`` like ``category_means``.
+    """
+    df, truncated = _limit_categories(df[[x_column, y_column]].dropna(), x_column, max_categories)
+    return df.groupby(x_column, observed=True, sort=True).size(), truncated
+
+
+def box_stats(df, x_column, y_column, max_categories):
+    """Box-plot statistics per category, in the format ``Axes.bxp`` expects.
+
+    Quartiles come from one grouped quantile call; whiskers extend to the most
+    extreme values within 1.5 IQR of the box, as in ``Axes.boxplot``.
+    """
+    df, truncated = _limit_categories(df[[x_column, y_column]].dropna(), x_column, max_categories)
+    grouped = df.groupby(x_column, observed=True, sort=True)[y_column]
+    quartiles = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    quartiles.columns = ['q1', 'med', 'q3']
+    iqr = quartiles['q3'] - quartiles['q1']
+    low_fence = (quartiles['q1'] - 1.5 * iqr).rename('low')
+    high_fence = (quartiles['q3'] + 1.5 * iqr).rename('high')
+
+    fences = df[[x_column]].join(low_fence, on=x_column).join(high_fence, on=x_column)
+    values = df[y_column]
+    inside = (values >= fences['low']) & (values <= fences['high'])
+    whiskers = df[inside].groupby(x_column, observed=True, sort=True)[y_column].agg(['min', 'max'])
+    quartiles = quartiles.join(whiskers)
+
+    stats = [
+        {'label': str(category), 'q1': row.q1, 'med': row.med, 'q3': row.q3,
+         'whislo': row['min'], 'whishi': row['max']}
+        for category, row in quartiles.iterrows()
+    ]
+    return stats, truncated
+
+
+def lttb(x, y, max_points):
+    """Largest-Triangle-Three-Buckets downsampling of a line to ``max_points`` points.
+
+    ``x`` must be sorted. Keeps the first and last point and, from every
+    bucket in between, the point forming the largest triangle with the
+    previously kept point and the next bucket's mean, which preserves the
+    visual shape (peaks and troughs) of the line. Returns the kept indices.
+    """
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    kept = np.empty(max_points, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[next_start:next_end].mean()
+        next_y = y[next_start:next_end].mean()
+        # Twice the triangle area for every candidate in the bucket at once
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        kept[bucket + 1] = previous
+    return kept
+
+
+def line_points(df, x_column, y_column, max_points, max_categories):
+    """Points of a line chart: mean ``y`` per distinct ``x``, downsampled with LTTB.
+
+    Averaging repeated ``x`` values matches what seaborn's lineplot draws.
+    Returns ``(points, downsampled)`` with ``points`` a Series indexed by x.
+    """
+    data = df[[x_column, y_column]].dropna()
+    x_values = data[x_column]
+    if not (pd.api.types.is_numeric_dtype(x_values) or pd.api.types.is_datetime64_any_dtype(x_values)):
+        stats, truncated = category_means(data, x_column, y_column, max_categories)
+        return stats['mean'], truncated
+
+    points = data.groupby(x_column, sort=True)[y_column].mean()
+    if len(points) <= max_points:
+        return points, False
+    index = points.index
+    numeric_x = index.asi8 if isinstance(index, pd.DatetimeIndex) else index.to_numpy()
+    kept = lttb(numeric_x, points.to_numpy(), max_points)
+    return points.iloc[kept], True
+
+
+def sample_rows(df, max_rows, seed=0):
+    """A reproducible random sample of at most ``max_rows`` rows."""
+    if len(df) <= max_rows:
+        return df
+    return df.sample(n=max_rows, random_state=seed)
+
+
+def _partition_moments(columns, partition, names, shift):
+    rows = columns.rows_of(partition)
+    values = np.column_stack([columns.arrays[name][rows] for name in names]) - shift
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    counts = valid.astype(np.float64)
+    # Pairwise-complete sums: [i, j] only counts rows where columns i and j are both present
+    return np.stack([counts.T @ counts, filled.T @ counts, filled.T @ filled, (filled * filled).T @ counts])
+
+
+def correlation(df, workers=None):
+    """Pearson correlation of the numeric columns, like ``df.corr(numeric_only=True)``.
+
+    Row ranges are reduced to pairwise sums on ``workers`` processes (see
+    parallel.py) and merged. Columns are shifted by a rough mean first so
+    the one-pass sums don't lose precision.
+    """
+    names = [column for column in df.columns if pd.api.types.is_numeric_dtype(df[column])]
+    if not names:
+        return pd.DataFrame()
+    columns = Columns.from_frame(df, names)
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # All-NaN columns
+        shift = np.nan_to_num(np.nanmean(np.column_stack([columns.arrays[n][:10000] for n in names]), axis=0))
+        n, sum_x, sum_xy, sum_xx = sum(map_partitions(_partition_moments, columns, (names, shift), workers=workers))
+        cov = sum_xy - sum_x * sum_x.T / n
+        var = sum_xx - sum_x * sum_x / n
+        corr = np.clip(cov / np.sqrt(var * var.T), -1, 1)
+    return pd.DataFrame(corr, index=names, columns=names)
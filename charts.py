@@ -0,0 +1,132 @@
+"""Matplotlib/seaborn chart rendering used by the visualization pages."""
+import numpy as np
+import pandas as pd
+
+from chart_data import box_stats, category_counts, category_means, correlation, line_points, sample_rows
+
+CHART_COLUMNS_ALL = ('heatmap',)  # Chart types that need every column of the dataset
+NUMERIC_Y_CHARTS = ('box', 'line')  # Chart types whose Y column must be numeric; bars count rows of other ones
+
+# Part of every chart's cache key (see chart_cache.py). The limits bound render
+# time: data beyond them is aggregated, downsampled or binned (see chart_data.py)
+CHART_OPTIONS = {
+    'figsize': (12, 8),
+    'dpi': 100,
+    'max_categories': 50,  # Bars/boxes/pie slices, the most frequent categories are kept
+    'line_max_points': 2000,  # Line charts are downsampled with LTTB beyond this
+    'scatter_max_points': 20000,  # Larger scatter plots become hexbin density plots
+    'hexbin_gridsize': 60,
+}
+TREND_OPTIONS = {'figsize': (12, 8)}
+
+
+def chart_columns(chart_type, x_column, y_column):
+    """Columns to load for a chart, or None for the whole dataset."""
+    if chart_type in CHART_COLUMNS_ALL:
+        return None
+    return list(dict.fromkeys([x_column, y_column]))
+
+
+def plotting():
+    """pyplot and seaborn, imported on first use.
+
+    Together they take about a second to import (seaborn pulls in scipy), which
+    processes that never draw a chart shouldn't pay; wsgi.py imports them up front.
+    """
+    import matplotlib
+    matplotlib.use('Agg')  # No GUI backend, charts are only ever saved to files
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    return plt, sns
+
+
+def _truncation_note(plt, truncated, options):
+    if truncated:
+        plt.title(f"Top {options['max_categories']} categories by row count")
+
+
+def render_chart(df, chart_type, x_column, y_column, chart_path, options=None, workers=None):
+    options = dict(CHART_OPTIONS, **(options or {}))
+    plt, sns = plotting()
+    plt.figure(figsize=options['figsize'], dpi=options['dpi'])  # High-resolution
+
+    if chart_type == "bar" and not pd.api.types.is_numeric_dtype(df[y_column]):
+        # Text and categorical values have no mean
+        counts, truncated = category_counts(df, x_column, y_column, options['max_categories'])
+        plt.bar(counts.index.astype(str), counts.to_numpy(), color=sns.color_palette(n_colors=len(counts)))
+        plt.xlabel(x_column)
+        plt.ylabel(f"Rows with a {y_column}")
+        _truncation_note(plt, truncated, options)
+    elif chart_type == "bar":
+        stats, truncated = category_means(df, x_column, y_column, options['max_categories'])
+        plt.bar(stats.index.astype(str), stats['mean'], yerr=stats['ci'], capsize=3,
+                color=sns.color_palette(n_colors=len(stats)))
+        plt.xlabel(x_column)
+        plt.ylabel(y_column)
+        _truncation_note(plt, truncated, options)
+    elif chart_type == "line":
+        points, _ = line_points(df, x_column, y_column, options['line_max_points'], options['max_categories'])
+        index = points.index.astype(str) if points.index.dtype == object else points.index
+        plt.plot(index, points.to_numpy())
+        plt.xlabel(x_column)
+        plt.ylabel(y_column)
+    elif chart_type == "pie":
+        counts = df[y_column].value_counts()
+        if len(counts) > options['max_categories']:  # Fold the tail into one slice
+            tail = counts.iloc[options['max_categories']:].sum()
+            counts = pd.concat([counts.iloc[:options['max_categories']], pd.Series({'Other': tail})])
+        counts.plot.pie(autopct='%1.1f%%')
+    elif chart_type == "heatmap":
+        sns.heatmap(correlation(df, workers), annot=True, cmap='coolwarm')
+    elif chart_type == "histogram":
+        sns.histplot(df[x_column])
+    elif chart_type == "scatter":
+        data = df[[x_column, y_column]].dropna()
+        numeric = all(pd.api.types.is_numeric_dtype(data[c]) for c in data.columns)
+        if len(data) > options['scatter_max_points'] and numeric:
+            plt.hexbin(data[x_column], data[y_column], gridsize=options['hexbin_gridsize'], mincnt=1, cmap='viridis')
+            plt.colorbar(label='Rows')
+            plt.xlabel(x_column)
+            plt.ylabel(y_column)
+        else:
+            # Categorical axes can't be binned, a sample shows the same spread
+            data = sample_rows(data, options['scatter_max_points'])
+            sns.scatterplot(x=data[x_column], y=data[y_column])
+    elif chart_type == "box":
+        stats, truncated = box_stats(df, x_column, y_column, options['max_categories'])
+        plt.gca().bxp(stats, showfliers=False)
+        plt.xlabel(x_column)
+        plt.ylabel(y_column)
+        _truncation_note(plt, truncated, options)
+
+    plt.xticks(rotation=45)
+    plt.tight_layout()  # Adjust layout to prevent overlap
+    plt.savefig(chart_path, dpi=options['dpi'], format='png')
+    plt.close()
+    return chart_path
+
+
+def render_trend(df, chart_path):
+    plt, sns = plotting()
+    plt.figure(figsize=TREND_OPTIONS['figsize'])
+    sns.lineplot(data=df, x=np.arange(len(df)), y='Total Sales Volume')
+    plt.title('Sales Trend')
+    plt.xlabel('Time')
+    plt.ylabel('Total Sales Volume')
+    plt.savefig(chart_path, format='png')
+    plt.close()
+    return chart_path
+
+
+def render_history(series, chart_path, period='Day'):
+    # Sales per period from the dataset's history (see history.py), on a date axis
+    plt, sns = plotting()
+    plt.figure(figsize=TREND_OPTIONS['figsize'])
+    sns.lineplot(x=series.index, y=series['sales'].to_numpy())
+    plt.title('Sales Trend')
+    plt.xlabel(period)
+    plt.ylabel('Total Sales Volume')
+    plt.gcf().autofmt_xdate()
+    plt.savefig(chart_path, format='png')
+    plt.close()
+    return chart_path
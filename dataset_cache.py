@@ -0,0 +1,95 @@
+"""Process-wide cache of parsed DataFrames shared by the analysis routes.
+
+Entries are keyed by file path plus the file's mtime and size, so a file that
+is overwritten on disk is never served stale. Eviction is least-recently-used,
+bounded by the total in-memory size of the cached frames.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+
+def _nbytes(value):
+    # DataFrames, or derived objects (e.g. search indexes) that report their own size
+    if hasattr(value, 'memory_usage'):
+        return int(value.memory_usage(deep=True).sum())
+    return int(value.nbytes)
+
+
+class DatasetCache:
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (DataFrame, nbytes)
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(path, variant=None):
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        return (path, st.st_mtime_ns, st.st_size, variant)
+
+    def get(self, path, loader, variant=None):
+        """Return the cached frame for ``path`` or parse it with ``loader(path)``.
+
+        The returned DataFrame is shared between requests and must be treated
+        as read-only; callers that add columns should work on a copy.
+        """
+        key = self._key(path, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Parse outside the lock so one slow file doesn't block other readers
+        df = loader(path)
+        nbytes = _nbytes(df)
+
+        with self._lock:
+            if key not in self._entries and nbytes <= self.max_bytes:
+                self._drop_stale(key)
+                self._entries[key] = (df, nbytes)
+                self.total_bytes += nbytes
+                self._evict()
+        return df
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'total_bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    # Callers below must hold self._lock
+
+    def _drop_stale(self, key):
+        # Older mtime/size versions of the same file can never be hit again
+        for old in [k for k in self._entries if k[0] == key[0] and k[1:3] != key[1:3]]:
+            self._remove(old)
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key):
+        _, nbytes = self._entries.pop(key)
+        self.total_bytes -= nbytes
@@ -0,0 +1,391 @@
+"""Row-level changes to a stored dataset, keyed by ``Product_ID``.
+
+A delta upserts and deletes rows of one dataset version without re-uploading
+it. It is applied in one transaction to the dataset's rows in the inventory
+table (see inventory_db.py), whose indexes keep searches and report KPIs
+current, and to the running totals and the forecast models of the products
+it touches. The work grows with the number of changed rows, not with the
+size of the dataset:
+
+* every row with a given ``Product_ID`` is updated (only the columns the
+  delta gives) or deleted; an unknown ``Product_ID`` adds a row, which then
+  needs every column of the dataset;
+* deletes are applied before upserts, so deleting and upserting one product
+  in the same delta replaces its rows with a new one;
+* each delta bumps the dataset's ``revision`` and is logged in
+  ``dataset_delta`` with the row positions it touched (live views follow
+  them, see live.py). The cleaned files are brought up to date in the
+  background by ``compact``, which applies the logged deltas to them in one
+  pass; file-based views (charts, exports, column statistics) show the data
+  as of ``files_revision`` until then;
+* a delta for a dataset that isn't in the inventory table yet is queued in
+  ``pending_delta``, and the job loading the dataset applies the queued
+  deltas in the order they arrived (``apply_pending``).
+
+The whole-series forecast keeps each row's position in the inventory table
+as ``x``, which never changes while the row exists (deleted rows leave a gap,
+like a missing observation, and new rows are added past the last one), so it
+is updated from the changed rows alone and predicts one step past the last
+position. Per-product forecasts of the touched products are refitted from
+their rows in the inventory table.
+"""
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import sqlalchemy as sa
+
+from catalog import column_stats, dataset_table, schema_of
+from forecast_registry import ForecastRegistry, PRODUCT_COLUMN, SALES_COLUMN, forecast_table
+from forecasting import STAT_COLUMNS, sufficient_stats
+from ingest import NUMERIC, TEXT, TEXT_DTYPES
+from inventory_db import (COLUMNS, column_total, insert_records, inventory_records, inventory_table,
+                          summary_table, update_summary)
+from storage import ColumnarWriter, dataset_version, read_dataset, read_metadata, write_metadata
+
+KEY_COLUMN = 'Product_ID'
+MAX_DELTA_ROWS = 10000  # Upserts plus deletes per request
+LOG_RETENTION = timedelta(minutes=5)  # Compacted deltas stay logged this long, for live views catching up
+_IN_BATCH = 500  # Keys per IN (...) list, well below SQLite's parameter limit
+
+# Mirrors the DatasetDelta model in app.py for worker processes
+delta_table = sa.table(
+    'dataset_delta',
+    sa.column('id'), sa.column('dataset_id'), sa.column('revision'), sa.column('upserts'),
+    sa.column('deletes'), sa.column('positions'), sa.column('created_at'),
+)
+
+# Mirrors the PendingDelta model in app.py
+pending_delta_table = sa.table(
+    'pending_delta',
+    sa.column('id'), sa.column('dataset_id'), sa.column('upserts'), sa.column('deletes'), sa.column('created_at'),
+)
+
+
+class DeltaError(ValueError):
+    pass
+
+
+def _kinds(schema):
+    # Column kinds of the cleaned dataset, as ingest.clean_chunk coerced them
+    kinds = {}
+    for column in schema:
+        if column['dtype'] == 'bool':
+            kinds[column['name']] = 'bool'
+        elif column['dtype'].startswith(('float', 'int')):
+            kinds[column['name']] = NUMERIC
+        else:
+            kinds[column['name']] = TEXT
+    return kinds
+
+
+def _coerce(value, kind):
+    if value is None or value != value:
+        return None
+    if kind == NUMERIC:
+        if isinstance(value, bool):
+            return None
+        value = pd.to_numeric(value, errors='coerce')
+        return None if pd.isna(value) else float(value)
+    if kind == 'bool':
+        return value if isinstance(value, bool) else None
+    return str(value)
+
+
+def parse_delta(schema, upserts=None, deletes=None):
+    """Validate a delta against a dataset's catalog schema.
+
+    ``upserts`` is a list of ``{column: value}`` rows and ``deletes`` a list
+    of product ids. Values are coerced like uploads are cleaned; anything
+    that can't be coerced is an error rather than a dropped row. Returns
+    ``(upserts, deletes)`` with upserts merged per key, in order, as
+    ``{key: {column: value}}``.
+    """
+    upserts = upserts or []
+    deletes = deletes or []
+    if not isinstance(upserts, list) or not isinstance(deletes, list):
+        raise DeltaError("'upsert' and 'delete' must be lists.")
+    if not upserts and not deletes:
+        raise DeltaError("The delta has no rows to upsert or delete.")
+    if len(upserts) + len(deletes) > MAX_DELTA_ROWS:
+        raise DeltaError(f"A delta can change at most {MAX_DELTA_ROWS} rows.")
+    kinds = _kinds(schema)
+    if KEY_COLUMN not in kinds:
+        raise DeltaError(f"This dataset has no {KEY_COLUMN} column to match rows on.")
+
+    merged = {}
+    for i, row in enumerate(upserts, start=1):
+        if not isinstance(row, dict):
+            raise DeltaError(f"Upsert {i} is not an object of column values.")
+        unknown = [column for column in row if column not in kinds]
+        if unknown:
+            raise DeltaError(f"Upsert {i} has columns this dataset doesn't have: {', '.join(map(str, unknown))}")
+        if KEY_COLUMN not in row:
+            raise DeltaError(f"Upsert {i} has no {KEY_COLUMN}.")
+        fields = {}
+        for column, value in row.items():
+            fields[column] = _coerce(value, kinds[column])
+            if fields[column] is None:
+                raise DeltaError(f"Upsert {i} has a missing or invalid value for {column}.")
+        merged.setdefault(str(fields[KEY_COLUMN]), {}).update(fields)
+
+    keys = []
+    for i, value in enumerate(deletes, start=1):
+        key = _coerce(value, kinds[KEY_COLUMN])
+        if key is None:
+            raise DeltaError(f"Delete {i} is not a valid {KEY_COLUMN}.")
+        keys.append(str(key))
+    return merged, list(dict.fromkeys(keys))
+
+
+def read_delta_csv(stream):
+    """Upsert rows of a delta uploaded as CSV: the columns it has are the ones updated."""
+    df = pd.read_csv(stream, dtype=TEXT_DTYPES)
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def _in_batches(values):
+    values = list(values)
+    for start in range(0, len(values), _IN_BATCH):
+        yield values[start:start + _IN_BATCH]
+
+
+def _rows_with_keys(conn, dataset_id, keys):
+    # Positions from the product id index first: asked for whole rows, SQLite would scan the dataset instead
+    t = inventory_table
+    positions = []
+    for batch in _in_batches(keys):
+        positions += conn.execute(sa.select(t.c.row).where(t.c.dataset_id == dataset_id,
+                                                           t.c.product_id.in_(batch))).scalars().all()
+    rows = []
+    for batch in _in_batches(sorted(positions)):
+        rows += conn.execute(sa.select(t).where(t.c.dataset_id == dataset_id, t.c.row.in_(batch))
+                             .order_by(t.c.row)).mappings().all()
+    return rows
+
+
+def _forecast_change(removed, added):
+    # Whole-series sums with each row's position as x, see the module docstring
+    change = dict.fromkeys(STAT_COLUMNS, 0.0)
+    for rows, sign in ((removed, -1), (added, 1)):
+        for x, y in rows:
+            if y is None:
+                continue
+            change['n'] += sign
+            change['sum_x'] += sign * x
+            change['sum_y'] += sign * y
+            change['sum_xy'] += sign * x * y
+            change['sum_xx'] += sign * x * x
+    change['n'] = int(change['n'])
+    return change
+
+
+def _product_stats(conn, dataset_id, products):
+    # Refit of the touched products from their current rows, in row order
+    t = inventory_table
+    products = list(products)
+    rows = []
+    for batch in _in_batches(products):
+        rows += [tuple(row) for row in conn.execute(sa.select(t.c.row, t.c.product_name, t.c.sales_volume).where(
+            t.c.dataset_id == dataset_id, t.c.product_name.in_(batch)))]
+    rows.sort()
+    stats = sufficient_stats([row[1] for row in rows], [row[2] for row in rows])
+    return stats.reindex(stats.index.append(pd.Index([p for p in products if p not in stats.index])), fill_value=0)
+
+
+def apply_delta(engine, dataset_id, forecast_dataset, columns, upserts, deletes, pending_id=None):
+    """Apply a delta from ``parse_delta`` to a dataset loaded into the inventory table.
+
+    ``forecast_dataset`` is the dataset's key in the forecast registry and
+    ``columns`` its column names. Returns the new revision and how many rows
+    were updated, inserted and deleted. A queued delta (``pending_id``) is
+    removed from the queue with it; it returns None if it was already taken.
+    """
+    t = inventory_table
+    table_columns = [column for column in columns if column in COLUMNS]
+    with engine.begin() as conn:
+        if pending_id is not None:
+            # Claimed before anything else: whoever else applies the queue waits for this, then skips it
+            claimed = conn.execute(sa.delete(pending_delta_table).where(pending_delta_table.c.id == pending_id))
+            if not claimed.rowcount:
+                return None
+        # Taking the dataset row's write lock first serialises deltas to the same dataset
+        conn.execute(sa.update(dataset_table).where(dataset_table.c.id == dataset_id)
+                     .values(revision=dataset_table.c.revision + 1))
+        revision = conn.execute(sa.select(dataset_table.c.revision).where(dataset_table.c.id == dataset_id)).scalar_one()
+        slots = conn.execute(sa.select(summary_table.c.slots).where(summary_table.c.dataset_id == dataset_id)).scalar_one()
+
+        old = _rows_with_keys(conn, dataset_id, set(upserts) | set(deletes))
+        deleted = [row for row in old if row['product_id'] in deletes]
+        replaced = [row for row in old if row['product_id'] not in deletes and row['product_id'] in upserts]
+        existing = {row['product_id'] for row in replaced}
+        inserted = [key for key in upserts if key not in existing]
+        for key in inserted:
+            missing = [column for column in columns if column not in upserts[key]]
+            if missing:
+                raise DeltaError(f"New {KEY_COLUMN} {key} needs every column, missing: {', '.join(missing)}")
+
+        # New versions of the changed rows, through the same conversion as a load
+        records = [dict({column: row[COLUMNS[column]] for column in table_columns}, **upserts[row['product_id']])
+                   for row in replaced]
+        records += [upserts[key] for key in inserted]
+        positions = [row['row'] for row in replaced] + list(range(slots, slots + len(inserted)))
+        removed = deleted + replaced
+        if records:
+            new_columns, new_rows = inventory_records(pd.DataFrame(records, columns=table_columns), dataset_id,
+                                                      positions)
+        else:
+            new_columns, new_rows = [], []
+
+        for batch in _in_batches(row['row'] for row in removed):
+            conn.execute(sa.delete(t).where(t.c.dataset_id == dataset_id, t.c.row.in_(batch)))
+        if new_rows:
+            insert_records(conn, new_columns, new_rows)
+        update_summary(conn, dataset_id, rows=len(inserted) - len(deleted), slots=len(inserted),
+                       total_stock=column_total(new_columns, new_rows, 'quantity')
+                       - sum(row['quantity'] or 0.0 for row in removed),
+                       used_space=column_total(new_columns, new_rows, 'storage_space')
+                       - sum(row['storage_space'] or 0.0 for row in removed))
+
+        if SALES_COLUMN in columns and (removed or new_rows):
+            added = [dict(zip(new_columns, row)) for row in new_rows]
+            products = pd.DataFrame(columns=STAT_COLUMNS)
+            if PRODUCT_COLUMN in columns:
+                touched = dict.fromkeys([row['product_name'] for row in removed]
+                                        + [row['product_name'] for row in added])
+                products = _product_stats(conn, dataset_id, touched)
+            change = _forecast_change([(row['row'], row['sales_volume']) for row in removed],
+                                      [(row['row'], row['sales_volume']) for row in added])
+            change['last_x'] = conn.execute(sa.select(sa.func.max(t.c.row)).where(
+                t.c.dataset_id == dataset_id, t.c.sales_volume.is_not(None))).scalar()
+            ForecastRegistry(engine).update(forecast_dataset, change, products, conn=conn)
+
+        changed = sorted({row['row'] for row in removed} | set(positions))
+        conn.execute(sa.insert(delta_table).values(
+            dataset_id=dataset_id, revision=revision, upserts=json.dumps(list(upserts.values())),
+            deletes=json.dumps(deletes), positions=json.dumps(changed),
+            created_at=datetime.now(timezone.utc).replace(tzinfo=None)))
+
+    return {'revision': revision, 'updated': len(replaced), 'inserted': len(inserted), 'deleted': len(deleted)}
+
+
+def apply_pending(engine, dataset_id, forecast_dataset):
+    """Apply the deltas queued for a dataset, oldest first, once it is in the inventory table.
+
+    Returns the results of the deltas applied and the errors of the ones
+    rejected, which are dropped from the queue. Overlapping runs apply each
+    delta once, in order.
+    """
+    p = pending_delta_table
+    with engine.connect() as conn:
+        schema = conn.execute(sa.select(dataset_table.c.schema).where(dataset_table.c.id == dataset_id)).scalar_one()
+        queued = conn.execute(sa.select(p.c.id, p.c.upserts, p.c.deletes)
+                              .where(p.c.dataset_id == dataset_id).order_by(p.c.id)).all()
+    columns = [column['name'] for column in json.loads(schema)]
+    applied, errors = [], []
+    for pending_id, upserts, deletes in queued:
+        try:
+            result = apply_delta(engine, dataset_id, forecast_dataset, columns, json.loads(upserts),
+                                 json.loads(deletes), pending_id=pending_id)
+        except DeltaError as e:
+            with engine.begin() as conn:
+                conn.execute(sa.delete(p).where(p.c.id == pending_id))
+            errors.append(str(e))
+            continue
+        if result is not None:
+            applied.append(result)
+    return applied, errors
+
+
+def apply_to_frame(df, deltas):
+    """Apply logged deltas (``(upserts, deletes)`` pairs, in order) to a cleaned frame.
+
+    The deltas are folded into one set of changes first, so the frame is
+    rewritten once however many deltas there are. Rows end up in the same
+    order as their positions in the inventory table.
+    """
+    # Dictionary-encoded text columns come back as categoricals, which can't take new values
+    categorical = [column for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)]
+    df = df.astype({column: object for column in categorical})
+    keys = df[KEY_COLUMN].astype(str)
+    base = set(keys)
+    deleted, updates, appended = set(), {}, {}
+    for upserts, deletes in deltas:
+        for key in deletes:
+            appended.pop(key, None)
+            if key in base:
+                deleted.add(key)
+                updates.pop(key, None)
+        for fields in upserts:
+            key = str(fields[KEY_COLUMN])
+            if key in appended:
+                appended[key].update(fields)
+            elif key in base and key not in deleted:
+                updates.setdefault(key, {}).update(fields)
+            else:
+                appended[key] = dict(fields)
+
+    kept = ~keys.isin(deleted)
+    df, keys = df[kept].copy(), keys[kept]
+    for column in dict.fromkeys(column for fields in updates.values() for column in fields):
+        values = {key: fields[column] for key, fields in updates.items() if column in fields}
+        hit = keys.isin(values.keys()).to_numpy()
+        df.loc[hit, column] = keys[hit].map(values).to_numpy()
+    if appended:
+        new = pd.DataFrame(list(appended.values()), columns=df.columns).astype(df.dtypes.to_dict())
+        df = pd.concat([df, new], ignore_index=True)
+    return df.reset_index(drop=True).astype({column: 'category' for column in categorical})
+
+
+def compact(engine, dataset_id, cleaned_path):
+    """Bring a dataset's cleaned files up to its latest revision.
+
+    Applies the logged deltas since ``files_revision``, rewrites the CSV and
+    its Parquet copy, and updates the catalog's row count and statistics.
+    Runs of this function may overlap: files are only replaced while holding
+    the dataset row's lock, and never by an older revision. Returns the
+    revision the files now have.
+    """
+    with engine.connect() as conn:
+        files_revision, revision = conn.execute(
+            sa.select(dataset_table.c.files_revision, dataset_table.c.revision)
+            .where(dataset_table.c.id == dataset_id)).one()
+        if files_revision >= revision:
+            return files_revision
+        logged = conn.execute(
+            sa.select(delta_table.c.upserts, delta_table.c.deletes)
+            .where(delta_table.c.dataset_id == dataset_id, delta_table.c.revision > files_revision,
+                   delta_table.c.revision <= revision)
+            .order_by(delta_table.c.revision)).all()
+
+    df = apply_to_frame(read_dataset(cleaned_path), [(json.loads(u), json.loads(d)) for u, d in logged])
+    # Temporary files per revision, runs may overlap
+    tmp_csv_path = cleaned_path + f'.r{revision}.tmp'
+    df.to_csv(tmp_csv_path, index=False, encoding='utf-8')
+    columnar = ColumnarWriter(cleaned_path, tmp_suffix=f'.r{revision}.tmp')
+    columnar.write(df)
+    try:
+        with engine.begin() as conn:
+            claimed = conn.execute(
+                sa.update(dataset_table)
+                .where(dataset_table.c.id == dataset_id, dataset_table.c.files_revision < revision)
+                .values(files_revision=revision, row_count=len(df), schema=schema_of(df), stats=column_stats(df)))
+            if claimed.rowcount:
+                # The Parquet copy must not be older than the CSV (see storage.has_columnar)
+                os.replace(tmp_csv_path, cleaned_path)
+                columnar.close()
+                write_metadata(cleaned_path, **dict(read_metadata(cleaned_path), rows=len(df)))
+                cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - LOG_RETENTION
+                conn.execute(sa.delete(delta_table).where(delta_table.c.dataset_id == dataset_id,
+                                                          delta_table.c.revision <= revision,
+                                                          delta_table.c.created_at < cutoff))
+                # The stored forecasts already include these changes, only the file they belong to changed
+                conn.execute(sa.update(forecast_table)
+                             .where(forecast_table.c.dataset == os.path.basename(cleaned_path))
+                             .values(version=dataset_version(cleaned_path)))
+    finally:
+        columnar.abort()
+        if os.path.exists(tmp_csv_path):
+            os.remove(tmp_csv_path)
+    return revision
@@ -0,0 +1,165 @@
+"""Persisted demand-forecast models.
+
+For every dataset the registry stores one trend model for the whole sales
+series (``product`` is NULL) and one per product, each with its sufficient
+statistics (n, Σx, Σy, Σxy, Σx²), the last ``x`` it was fitted on and the
+fitted slope, intercept and next-step prediction. Models are fitted while a dataset is ingested;
+row-level changes (see deltas.py) update the stored statistics instead of
+refitting the full history, and page views only read the stored predictions.
+
+Rows carry the dataset version they were fitted on (see
+``storage.dataset_version``), so a dataset replaced on disk is never served
+stale forecasts.
+"""
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+from forecasting import STAT_COLUMNS, grouped_stats, merge_stats, solve_trends, sufficient_stats
+
+PRODUCT_COLUMN = 'Product Name'
+SALES_COLUMN = 'Total Sales Volume'
+
+# Mirrors the ForecastModel model in app.py for worker processes
+forecast_table = sa.table(
+    'forecast_model',
+    sa.column('id'), sa.column('dataset'), sa.column('version'), sa.column('product'),
+    sa.column('position'), sa.column('n'), sa.column('sum_x'), sa.column('sum_y'),
+    sa.column('sum_xy'), sa.column('sum_xx'), sa.column('last_x'), sa.column('slope'), sa.column('intercept'),
+    sa.column('prediction'), sa.column('updated_at'),
+)
+
+_TOTAL = '__total__'  # In-memory key of the whole-series model
+
+
+def has_forecast_columns(columns):
+    return SALES_COLUMN in columns
+
+
+class ForecastStats:
+    """Whole-series and per-product statistics, accumulated chunk by chunk."""
+
+    def __init__(self):
+        self.total = None
+        self.products = None
+
+    def add(self, df):
+        sales = df[SALES_COLUMN].to_numpy(dtype=np.float64)
+        total_keys = np.full(len(df), _TOTAL, dtype=object)
+        self.total = merge_stats(self.total, sufficient_stats(total_keys, sales, _counts(self.total)))
+        if PRODUCT_COLUMN in df.columns:
+            self.products = merge_stats(self.products,
+                                        sufficient_stats(df[PRODUCT_COLUMN], sales, _counts(self.products)))
+
+    @classmethod
+    def from_frame(cls, df, workers=None):
+        """Statistics of a whole dataset, products fitted on ``workers`` processes (see parallel.py)."""
+        stats = cls()
+        sales = df[SALES_COLUMN].to_numpy(dtype=np.float64)
+        stats.total = sufficient_stats(np.full(len(df), _TOTAL, dtype=object), sales)
+        if PRODUCT_COLUMN in df.columns:
+            stats.products = grouped_stats(df, PRODUCT_COLUMN, SALES_COLUMN, workers)
+        return stats
+
+
+def _counts(stats):
+    return stats['n'] if stats is not None else None
+
+
+class ForecastRegistry:
+    def __init__(self, engine):
+        self.engine = engine
+
+    def save(self, dataset, version, stats):
+        """Replace every stored model of ``dataset`` with fits from ``stats``."""
+        with self.engine.begin() as conn:
+            conn.execute(sa.delete(forecast_table).where(forecast_table.c.dataset == dataset))
+            self._insert(conn, dataset, version, stats.total, positions=[-1])
+            if stats.products is not None:
+                self._insert(conn, dataset, version, stats.products, positions=range(len(stats.products)))
+
+    def update(self, dataset, total_change, products, conn=None):
+        """Apply row changes of ``dataset`` to its stored models, keeping their version.
+
+        ``total_change`` (n, Σx, Σy, Σxy, Σx² as a dict) is added to the
+        whole-series model, whose last ``x`` becomes ``total_change['last_x']``; ``products`` holds refitted statistics of the
+        products the changes touched, and products with ``n == 0`` are
+        dropped. Returns False when ``dataset`` has no stored models.
+        ``conn`` runs the update in a transaction the caller already holds.
+        """
+        if conn is None:
+            with self.engine.begin() as conn:
+                return self.update(dataset, total_change, products, conn)
+
+        t = forecast_table
+        total = conn.execute(sa.select(t).where(t.c.dataset == dataset, t.c.product.is_(None))).mappings().first()
+        if total is None:
+            return False
+        names = [str(product) for product in products.index]
+        stored = dict(conn.execute(sa.select(t.c.product, t.c.position)
+                                   .where(t.c.dataset == dataset, t.c.product.in_(names))).all())
+        next_position = conn.execute(sa.select(sa.func.max(t.c.position)).where(t.c.dataset == dataset)).scalar()
+        products = products[products['n'] > 0]
+        positions = []
+        for product in products.index:
+            # Known products keep their display position, new ones go to the end
+            if str(product) not in stored:
+                next_position += 1
+            positions.append(stored.get(str(product), next_position))
+
+        totals = pd.DataFrame([dict({column: total[column] + total_change[column] for column in STAT_COLUMNS},
+                                    last_x=total_change['last_x'])], index=[_TOTAL], dtype=np.float64)
+        conn.execute(sa.delete(t).where(t.c.dataset == dataset,
+                                        sa.or_(t.c.product.is_(None), t.c.product.in_(names))))
+        self._insert(conn, dataset, total['version'], totals, positions=[-1])
+        self._insert(conn, dataset, total['version'], products, positions=positions)
+        return True
+
+    def fitted(self, dataset, version):
+        """Whether ``dataset`` has stored models for ``version``, even ones without a prediction."""
+        with self.engine.connect() as conn:
+            stored = conn.execute(sa.select(forecast_table.c.version).where(
+                forecast_table.c.dataset == dataset, forecast_table.c.product.is_(None))).scalar()
+        return stored == version
+
+    def total_prediction(self, dataset, version):
+        """Next-step forecast of the whole sales series, or None if not fitted for ``version``
+        or fitted on fewer than two rows."""
+        with self.engine.connect() as conn:
+            row = conn.execute(sa.select(forecast_table.c.prediction, forecast_table.c.version).where(
+                forecast_table.c.dataset == dataset, forecast_table.c.product.is_(None))).first()
+        if row is None or row.version != version:
+            return None
+        return row.prediction
+
+    def product_trends(self, dataset, version):
+        """Per-product fits in first-appearance order, or None if not fitted for ``version``."""
+        query = sa.select(forecast_table.c.product, forecast_table.c.n, forecast_table.c.prediction,
+                          forecast_table.c.version) \
+            .where(forecast_table.c.dataset == dataset, forecast_table.c.product.is_not(None)) \
+            .order_by(forecast_table.c.position)
+        with self.engine.connect() as conn:
+            rows = conn.execute(query).all()
+        if not rows or rows[0].version != version:
+            return None
+        return pd.DataFrame({'n': [r.n for r in rows], 'prediction': [r.prediction for r in rows]},
+                            index=pd.Index([r.product for r in rows], name='key'))
+
+    def delete(self, dataset):
+        with self.engine.begin() as conn:
+            conn.execute(sa.delete(forecast_table).where(forecast_table.c.dataset == dataset))
+
+    def _insert(self, conn, dataset, version, stats, positions):
+        if stats is None or stats.empty:
+            return
+        trends = solve_trends(stats).astype({'n': np.int64})
+        trends = trends.astype(object).where(trends.notna(), None)  # NaN fits are stored as NULL
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        rows = []
+        for key, position, fit in zip(trends.index, positions, trends.to_dict('records')):
+            fit.update(dataset=dataset, version=version, position=int(position), updated_at=now,
+                       product=None if key == _TOTAL else str(key))
+            rows.append(fit)
+        conn.execute(sa.insert(forecast_table), rows)
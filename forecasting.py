@@ -0,0 +1,125 @@
+"""Linear-trend demand forecasts for many products at once.
+
+Each product's sales history (in row order) is fitted with an ordinary
+least-squares line ``y = intercept + slope * x`` where ``x`` is the row's
+position within that product, exactly like fitting one scikit-learn
+``LinearRegression`` per product. Here every product is fitted in a single
+grouped NumPy pass from closed-form sums, so the cost is O(rows) no matter
+how many products there are. The sums are sufficient statistics: fits for
+appended rows are updated by adding their sums, without revisiting history.
+"""
+import numpy as np
+import pandas as pd
+
+from parallel import Columns, map_partitions
+
+INSUFFICIENT_DATA = "Insufficient data"
+
+
+def group_positions(codes, counts):
+    """Position of every row within its group, in original row order."""
+    order = np.argsort(codes, kind='stable')
+    starts = np.cumsum(counts) - counts
+    positions = np.empty(len(codes), dtype=np.float64)
+    positions[order] = np.arange(len(codes)) - np.repeat(starts, counts)
+    return positions
+
+
+STAT_COLUMNS = ['n', 'sum_x', 'sum_y', 'sum_xy', 'sum_xx']
+
+
+def sufficient_stats(keys, y, start_positions=None):
+    """Per-key sums (n, Σx, Σy, Σxy, Σx²) of a least-squares trend fit.
+
+    ``x`` counts each key's rows from 0, or from ``start_positions[key]`` when
+    given, so stats for rows appended to an existing history can simply be
+    added to the stored ones. Keys keep their order of first appearance.
+    """
+    codes, uniques = pd.factorize(np.asarray(keys))
+    y = np.asarray(y, dtype=np.float64)
+    counts = np.bincount(codes, minlength=len(uniques))
+    x = group_positions(codes, counts)
+    if start_positions is not None:
+        offsets = pd.Series(start_positions).reindex(uniques).fillna(0).to_numpy(dtype=np.float64)
+        x += offsets[codes]
+
+    def group_sum(values):
+        return np.bincount(codes, weights=values, minlength=len(uniques))
+
+    return pd.DataFrame({
+        'n': counts.astype(np.int64),
+        'sum_x': group_sum(x),
+        'sum_y': group_sum(y),
+        'sum_xy': group_sum(x * y),
+        'sum_xx': group_sum(x * x),
+    }, index=pd.Index(uniques, name='key'))
+
+
+def merge_stats(stats, more):
+    """Add two sets of sufficient statistics, keeping first-appearance key order."""
+    if stats is None or stats.empty:
+        return more.copy()
+    index = stats.index.append(more.index.difference(stats.index, sort=False))
+    merged = stats.reindex(index, fill_value=0)[STAT_COLUMNS] + more.reindex(index, fill_value=0)[STAT_COLUMNS]
+    merged['n'] = merged['n'].astype(np.int64)
+    return merged
+
+
+def _partition_stats(columns, partition, key_column, value_column):
+    rows = columns.rows_of(partition)
+    codes = columns.arrays[key_column][rows]
+    known = codes >= 0  # Rows without a key have no trend to fit
+    return sufficient_stats(codes[known], columns.arrays[value_column][rows][known])
+
+
+def grouped_stats(df, key_column, value_column, workers=None):
+    """``sufficient_stats`` per ``key_column`` of ``df``, keys split over ``workers`` processes."""
+    columns = Columns.from_frame(df, [key_column, value_column], keys=[key_column])
+    parts = map_partitions(_partition_stats, columns, (key_column, value_column), by=key_column, workers=workers)
+    stats = pd.concat(parts).sort_index()  # Codes number the keys in order of first appearance
+    stats.index = pd.Index(columns.uniques[key_column][stats.index.to_numpy()], name='key')
+    return stats
+
+
+def solve_trends(stats):
+    """Slope, intercept and next-step prediction from sufficient statistics.
+
+    The prediction is made one step past the last ``x``: ``stats['last_x']``
+    where given (rows may have left gaps), else ``n - 1`` as for positions
+    counted from 0. Keys with fewer than two rows get NaN parameters.
+    """
+    n = stats['n'].to_numpy(dtype=np.float64)
+    last_x = n - 1
+    if 'last_x' in stats:
+        last_x = np.where(stats['last_x'].isna(), last_x, stats['last_x'].to_numpy(dtype=np.float64))
+    sum_x = stats['sum_x'].to_numpy()
+    sum_y = stats['sum_y'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sxx = stats['sum_xx'].to_numpy() - sum_x * sum_x / n
+        sxy = stats['sum_xy'].to_numpy() - sum_x * sum_y / n
+        slope = np.where(n >= 2, sxy / sxx, np.nan)
+        intercept = (sum_y - slope * sum_x) / n
+    trends = stats.copy()
+    trends['slope'] = slope
+    trends['intercept'] = intercept
+    trends['last_x'] = last_x
+    trends['prediction'] = intercept + slope * (last_x + 1)
+    return trends
+
+
+def fit_grouped_trends(keys, y):
+    """Fit one linear trend per distinct key.
+
+    Returns a DataFrame indexed by key (in order of first appearance) with the
+    sufficient statistics, ``slope``, ``intercept`` and ``prediction``.
+    """
+    return solve_trends(sufficient_stats(keys, y))
+
+
+def future_demand_from_trends(trends):
+    """``{product: forecast}`` with forecasts clipped at zero, as shown on the stock pages."""
+    return {
+        product: INSUFFICIENT_DATA if n < 2 else max(0, float(value))
+        for product, n, value in zip(trends.index, trends['n'], trends['prediction'])
+    }
+
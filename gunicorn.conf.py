@@ -0,0 +1,31 @@
+"""gunicorn settings for serving the app in production: ``gunicorn -c gunicorn.conf.py wsgi:app``.
+
+Every setting can be overridden on the command line; the main ones also from
+the environment.
+"""
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+# Process count: every web worker starts its own pool of JOB_WORKERS job processes (app.py), and
+# a job running whole-dataset analytics its own pool of ANALYTICS_WORKERS (parallel.py). Web
+# workers compute inline and never fork analytics pools. At most
+#   WEB_WORKERS * (1 + JOB_WORKERS * (1 + ANALYTICS_WORKERS))
+# processes, 4 * (1 + 2 * (1 + 2)) = 28 with the defaults; size them together.
+workers = int(os.environ.get('WEB_WORKERS', min(os.cpu_count() or 1, 4)))
+# Threaded workers. Live layout streams belong on the gevent server of gunicorn.live.conf.py; served
+# here, each holds a thread for as long as its page is open (see LIVE_MAX_STREAMS in app.py)
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 8))
+# wsgi.py (tables, prewarmed imports) runs once in the master, workers share its memory copy-on-write
+preload_app = True
+timeout = 120  # PDFs, plans and uncached pages can take a while on large datasets
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+
+
+def post_worker_init(worker):
+    # Live layout streams (see live.py) never end on their own: close them as soon as the worker
+    # starts shutting down, or it would wait out graceful_timeout (and its threads after that)
+    from app import live_shelves
+    live_shelves.close_when(lambda: not worker.alive)
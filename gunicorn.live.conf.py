@@ -0,0 +1,39 @@
+"""gunicorn settings for the live layout streams: ``gunicorn -c gunicorn.live.conf.py wsgi:app``.
+
+Runs next to the main server (gunicorn.conf.py), whose gthread workers spend
+a thread on every open stream. Here gevent workers hold each stream as a
+socket and a greenlet, so one process serves thousands of viewers, and a
+delta is read and encoded once for all of them (see live.py). The proxy in
+front sends the stream URLs here and everything else to the main server,
+e.g. with nginx:
+
+    location ~ ^/api/shelves/\\d+/live$ {
+        proxy_pass http://127.0.0.1:8001;
+        proxy_buffering off;
+        proxy_read_timeout 1h;
+    }
+
+Every setting can be overridden on the command line; the main ones also from
+the environment.
+"""
+import os
+
+bind = os.environ.get('LIVE_BIND', '0.0.0.0:8001')
+# One process by default: every process runs its own feeds, which read each delta once
+workers = int(os.environ.get('LIVE_WORKERS', 1))
+worker_class = 'gevent'
+worker_connections = int(os.environ.get('LIVE_CONNECTIONS', 2000))
+# Streams per process, a few connections are left for other requests. Set before the app is
+# imported, in the workers: gevent has to patch the standard library first, so nothing is preloaded
+os.environ.setdefault('LIVE_MAX_STREAMS', str(max(1, worker_connections - 50)))
+os.environ.setdefault('PREWARM', '0')  # No charts or reports are rendered here
+preload_app = False
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+
+
+def post_worker_init(worker):
+    # Close the streams as soon as the worker starts shutting down, see gunicorn.conf.py
+    from app import live_shelves
+    live_shelves.close_when(lambda: not worker.alive)
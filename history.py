@@ -0,0 +1,430 @@
+"""Inventory history: every snapshot's per-SKU stock and sales, keyed by time.
+
+An upload is one snapshot of the warehouse. Each of its rows is recorded as
+an observation of its SKU (``Product_ID``, or ``Product Name`` in files
+without IDs) at the row's ``Last_Stock_Update``, or at the snapshot's time
+for rows without a readable date. All versions of a named dataset (see
+catalog.py) share one history, stored in its own folder:
+
+* ``skus.npz``: the SKU keys, their products and when each was last observed;
+* ``observations/<YYYY-MM>/<snapshot>.npz``: the observations a snapshot
+  added for that month. Files are only ever added, never rewritten;
+* ``daily/<YYYY-MM>.npz`` and ``weekly/<YYYY-MM>.npz``: per product and day
+  or week (weeks start on Monday and are filed under the month they start
+  in), the observation count, the sales made and the change of stock;
+* ``daily-levels.npz`` and ``weekly-levels.npz``: the change of stock per
+  product and month of those files;
+* ``history.json``: snapshot and observation counts, which version caches.
+
+The history is append-only: a row is new only if it is later than the last
+observation of its SKU, so uploading the same file again, or a new version
+in which most rows didn't change, records just the rows that moved on.
+Deltas reach the history the same way, once the files are compacted.
+
+``Total Sales Volume`` is a running total and ``Quantity Available`` a level,
+so the rollups record how each observation changed them from the previous
+one of its SKU: the sales made since (nothing is known for a SKU's first
+observation) and the stock moved. Changes are sums, so a snapshot is merged
+into the rollups by adding its own per-period totals to the months it
+touches. A period's stock is the level before the first month a query reads
+(from the monthly changes) plus the changes up to it, which carries each
+SKU's last level forward through periods it wasn't observed in; range
+queries read only the months they cover however long the history grows.
+"""
+import json
+import os
+import shutil
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from ingest import DATE_FORMATS
+from instrumentation import span
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent appends to one history aren't locked against each other
+    fcntl = None
+
+KEY_COLUMNS = ['Product_ID', 'Product Name']  # The first one present identifies a SKU
+PRODUCT_COLUMN = 'Product Name'
+TIME_COLUMN = 'Last_Stock_Update'
+QUANTITY_COLUMN = 'Quantity Available'
+SALES_COLUMN = 'Total Sales Volume'
+HISTORY_COLUMNS = ['Product_ID', PRODUCT_COLUMN, TIME_COLUMN, QUANTITY_COLUMN, SALES_COLUMN]
+
+ROLLUPS = {'daily': 1, 'weekly': 7}  # Days per period
+ROLLUP_COLUMNS = ['observations', 'sales', 'quantity']
+ROLLUP_VERSION = 2  # Older rollups summed the running totals and levels themselves, they are rebuilt
+_NEVER = np.datetime64('NaT', 's')
+
+
+def history_folder(root, owner_id, name):
+    """Folder of the history of an owner's dataset ``name`` (created on the first append)."""
+    return os.path.join(root, str(owner_id), name)
+
+
+def _encode(values, ids):
+    # Ids of ``values`` in the growing dictionary ``ids`` (value -> id), missing values as ''
+    codes, uniques = pd.factorize(values)
+    lookup = np.array([ids.setdefault(str(value), len(ids)) for value in uniques], dtype=np.int32)
+    encoded = np.full(len(codes), ids.setdefault('', len(ids)) if (codes < 0).any() else 0, dtype=np.int32)
+    encoded[codes >= 0] = lookup[codes[codes >= 0]]
+    return encoded
+
+
+def _times(values, observed_at):
+    # Row times from the date column, parsing each distinct value once; unreadable dates become observed_at
+    codes, uniques = pd.factorize(values)
+    times = np.full(len(codes), observed_at)
+    best = None
+    for date_format in DATE_FORMATS[TIME_COLUMN]:
+        parsed = pd.to_datetime(uniques, format=date_format, errors='coerce')
+        if best is None or parsed.notna().sum() > best.notna().sum():
+            best = parsed
+    if best is not None and len(best):
+        parsed = best.to_numpy().astype('datetime64[s]')
+        known = codes >= 0
+        times[known] = parsed[codes[known]]
+        times[np.isnat(times)] = observed_at
+    return times
+
+
+def _changes(sku_ids, times, values, last, initial=np.nan):
+    """Each observation's value minus the last known one of its SKU, and the last known values after them.
+
+    ``last`` holds each SKU's last known value before these observations,
+    NaN for none, in which case ``initial`` is subtracted. A missing value
+    changes nothing and leaves the last known one as it was.
+    """
+    order = np.lexsort((times, sku_ids))
+    skus = sku_ids[order]
+    ordered = pd.Series(values[order])
+    first = np.r_[True, skus[1:] != skus[:-1]]
+    before = ordered.groupby(skus).shift().to_numpy()
+    before[first] = last[skus[first]]
+    before = pd.Series(before).groupby(skus).ffill().to_numpy()
+    changes = np.empty(len(order))
+    changes[order] = ordered.to_numpy() - np.where(np.isnan(before), initial, before)
+    last = last.copy()
+    ends = np.r_[first[1:], True]
+    last[skus[ends]] = ordered.fillna(pd.Series(before)).to_numpy()[ends]
+    return changes, last
+
+
+def period_start(times, days):
+    """Start of the day (``days=1``) or Monday-based week (``days=7``) of each time."""
+    day = np.asarray(times).astype('datetime64[D]')
+    if days == 1:
+        return day
+    return day - (day.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+
+
+def next_period_forecast(series, days):
+    """Linear trend of ``series['sales']`` over time, extrapolated to the period after the last.
+
+    ``series`` is indexed by period start, as returned by ``History.rollup``.
+    Returns None with fewer than two periods.
+    """
+    if len(series) < 2:
+        return None
+    x = (series.index.to_numpy() - series.index[0].to_datetime64()).astype('timedelta64[D]').astype(np.float64) / days
+    slope, intercept = np.polyfit(x, series['sales'].to_numpy(dtype=np.float64), 1)
+    return float(intercept + slope * (x[-1] + 1))
+
+
+class HistoryBuilder:
+    """A snapshot's observations, collected from cleaned chunks in row order.
+
+    ``observed_at`` (naive UTC, or aware) stamps the rows without a date, now by default.
+    """
+
+    def __init__(self, observed_at=None):
+        observed_at = pd.Timestamp(observed_at) if observed_at is not None else pd.Timestamp.now('UTC')
+        self.observed_at = np.datetime64(observed_at.tz_convert(None) if observed_at.tz else observed_at, 's')
+        self.available = None  # False once a chunk lacks the SKU or sales columns
+        self._keys = {}
+        self._products = {}
+        self._chunks = []
+
+    def add(self, chunk):
+        if self.available is False:
+            return
+        key_column = next((column for column in KEY_COLUMNS if column in chunk.columns), None)
+        self.available = key_column is not None and SALES_COLUMN in chunk.columns
+        if not self.available or chunk.empty:
+            return
+        missing = pd.Series(np.nan, index=chunk.index)
+        self._chunks.append((
+            _encode(chunk[key_column], self._keys),
+            _encode(chunk[PRODUCT_COLUMN] if PRODUCT_COLUMN in chunk.columns else missing, self._products),
+            _times(chunk[TIME_COLUMN] if TIME_COLUMN in chunk.columns else missing, self.observed_at),
+            pd.to_numeric(chunk.get(QUANTITY_COLUMN, missing), errors='coerce').to_numpy(dtype=np.float64),
+            pd.to_numeric(chunk[SALES_COLUMN], errors='coerce').to_numpy(dtype=np.float64),
+        ))
+
+    def save(self, folder):
+        """Append the snapshot to the history in ``folder``; returns the number of new observations."""
+        if not self.available or not self._chunks:
+            return 0
+        skus, products, times, quantity, sales = (np.concatenate(arrays) for arrays in zip(*self._chunks))
+        return History(folder).append(np.array(list(self._keys), dtype=str), skus,
+                                      np.array(list(self._products), dtype=str), products, times, quantity, sales)
+
+
+class History:
+    def __init__(self, folder):
+        self.folder = folder
+        self.meta_path = os.path.join(folder, 'history.json')
+
+    def meta(self):
+        try:
+            with open(self.meta_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def version(self):
+        """Token that changes with every snapshot that added observations, None for an empty history."""
+        meta = self.meta()
+        return f"{meta['snapshots']}-{meta['observations']}-{meta.get('rollups', 1)}" if meta else None
+
+    def _write_meta(self, meta):
+        tmp_path = self.meta_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    @contextmanager
+    def _locked(self):
+        # One writer at a time per history
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self._path('.lock'), 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _path(self, *parts):
+        return os.path.join(self.folder, *parts)
+
+    def _save(self, path, **arrays):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    def _skus(self):
+        try:
+            with np.load(self._path('skus.npz'), allow_pickle=False) as data:
+                return {name: data[name] for name in data.files}
+        except FileNotFoundError:
+            return {'keys': np.array([], dtype=str), 'products': np.array([], dtype=str),
+                    'sku_products': np.array([], dtype=np.int32), 'last': np.array([], dtype='datetime64[s]'),
+                    'last_quantity': np.array([]), 'last_sales': np.array([])}
+
+    def products(self):
+        return self._skus()['products']
+
+    def append(self, keys, skus, product_names, products, times, quantity, sales):
+        """Record a snapshot: ``skus`` and ``products`` index ``keys`` and ``product_names``.
+
+        Only observations later than the last one of their SKU are kept.
+        Returns how many were.
+        """
+        with self._locked(), span('history', 'append', rows=len(skus)) as append:
+            meta = self._upgrade()
+            state = self._skus()
+            ids = {key: i for i, key in enumerate(state['keys'].tolist())}
+            sku_ids = np.array([ids.setdefault(key, len(ids)) for key in keys.tolist()], dtype=np.int32)[skus]
+            names = {name: i for i, name in enumerate(state['products'].tolist())}
+            product_ids = np.array([names.setdefault(name, len(names)) for name in product_names.tolist()],
+                                   dtype=np.int32)[products]
+
+            added = len(ids) - len(state['keys'])
+            last = np.concatenate([state['last'], np.full(added, _NEVER)])
+            seen = last[sku_ids]
+            new = np.isnat(seen) | (times > seen)
+            sku_ids, product_ids, times = sku_ids[new], product_ids[new], times[new]
+            quantity, sales = quantity[new], sales[new]
+            append.rows = len(sku_ids)
+            if not len(sku_ids):
+                return 0
+
+            meta = meta or {'snapshots': 0, 'observations': 0, 'rollups': ROLLUP_VERSION}
+            snapshot = meta['snapshots'] + 1
+            months = times.astype('datetime64[M]')
+            for month in np.unique(months):
+                rows = months == month
+                self._save(self._path('observations', str(month), f'{snapshot:06d}.npz'), sku=sku_ids[rows],
+                           product=product_ids[rows], time=times[rows], quantity=quantity[rows], sales=sales[rows])
+            for column in ('last_quantity', 'last_sales'):
+                state[column] = np.concatenate([state[column], np.full(added, np.nan)])
+            self._record(state, sku_ids, product_ids, times, quantity, sales)
+
+            # Latest time and product name per SKU, last observation wins
+            sku_products = np.concatenate([state['sku_products'], np.zeros(added, np.int32)])
+            order = np.lexsort((times, sku_ids))
+            ends = np.r_[sku_ids[order][1:] != sku_ids[order][:-1], True]
+            latest = order[ends]
+            last[sku_ids[latest]] = times[latest]
+            sku_products[sku_ids[latest]] = product_ids[latest]
+            self._save(self._path('skus.npz'), keys=np.array(list(ids), dtype=str),
+                       products=np.array(list(names), dtype=str), sku_products=sku_products, last=last,
+                       last_quantity=state['last_quantity'], last_sales=state['last_sales'])
+
+            self._write_meta(dict(meta, snapshots=snapshot, observations=meta['observations'] + len(sku_ids),
+                                  first=str(min(np.datetime64(meta['first']), times.min())) if meta.get('first') else str(times.min()),
+                                  last=str(max(np.datetime64(meta['last']), times.max())) if meta.get('last') else str(times.max())))
+            return len(sku_ids)
+
+    def _record(self, state, sku_ids, product_ids, times, quantity, sales):
+        # Merge observations into the rollups as changes from their SKU's previous observation
+        stock, state['last_quantity'] = _changes(sku_ids, times, quantity, state['last_quantity'], initial=0.0)
+        sold, state['last_sales'] = _changes(sku_ids, times, sales, state['last_sales'])
+        for freq, days in ROLLUPS.items():
+            self._merge_rollup(freq, period_start(times, days), product_ids, stock, sold)
+
+    def _merge_rollup(self, freq, periods, products, stock, sales):
+        new = pd.DataFrame({'period': periods, 'product': products, 'observations': 1, 'sales': sales, 'stock': stock})
+        months = periods.astype('datetime64[M]')
+        for month in np.unique(months):
+            path = self._path(freq, f'{month}.npz')
+            parts = [new[months == month]]
+            if os.path.exists(path):
+                with np.load(path, allow_pickle=False) as data:
+                    parts.append(pd.DataFrame({name: data[name] for name in data.files}))
+            merged = pd.concat(parts).groupby(['period', 'product'], sort=True).sum(min_count=1).reset_index()
+            self._save(path, **{column: merged[column].to_numpy() for column in merged.columns})
+
+        # Stock changes per month, where queries take the level before their first month from
+        path = self._path(f'{freq}-levels.npz')
+        parts = [pd.DataFrame({'month': months, 'product': products, 'stock': stock})]
+        if os.path.exists(path):
+            with np.load(path, allow_pickle=False) as data:
+                parts.append(pd.DataFrame({name: data[name] for name in data.files}))
+        merged = pd.concat(parts).groupby(['month', 'product'], sort=True).sum(min_count=1).reset_index()
+        self._save(path, **{column: merged[column].to_numpy() for column in merged.columns})
+
+    def _upgrade(self):
+        # Rollups of an older version are rebuilt from the observations, replaying the snapshots in order.
+        # Called holding the lock; returns the metadata
+        meta = self.meta()
+        if meta is None or meta.get('rollups', 1) == ROLLUP_VERSION:
+            return meta
+        snapshots = {}
+        for month in self._months('observations', None, None):
+            folder = self._path('observations', month)
+            for name in sorted(os.listdir(folder)):
+                if name.endswith('.npz') and not name.endswith('.tmp.npz'):
+                    with np.load(os.path.join(folder, name), allow_pickle=False) as data:
+                        snapshots.setdefault(name, []).append({column: data[column] for column in data.files})
+        for freq in ROLLUPS:
+            shutil.rmtree(self._path(freq), ignore_errors=True)
+            if os.path.exists(self._path(f'{freq}-levels.npz')):
+                os.remove(self._path(f'{freq}-levels.npz'))
+        state = self._skus()
+        state['last_quantity'], state['last_sales'] = np.full(len(state['keys']), np.nan), np.full(len(state['keys']), np.nan)
+        for name in sorted(snapshots):
+            columns = {column: np.concatenate([part[column] for part in snapshots[name]])
+                       for column in snapshots[name][0]}
+            self._record(state, columns['sku'], columns['product'], columns['time'], columns['quantity'],
+                         columns['sales'])
+        self._save(self._path('skus.npz'), **state)
+        meta = dict(meta, rollups=ROLLUP_VERSION)
+        self._write_meta(meta)
+        return meta
+
+    def _months(self, kind, start, end):
+        # Partition files of ``kind`` for the months from start to end (None for open ends), in order
+        try:
+            names = sorted(name[:7] for name in os.listdir(self._path(kind)) if not name.startswith('.'))
+        except FileNotFoundError:
+            return []
+        first = str(np.datetime64(start, 'M')) if start is not None else None
+        last = str(np.datetime64(end, 'M')) if end is not None else None
+        return [name for name in names if (first is None or name >= first) and (last is None or name <= last)]
+
+    def _opening(self, freq, month, product=None):
+        # Stock level at the start of ``month`` from the changes before it, and whether any level is known
+        try:
+            with np.load(self._path(f'{freq}-levels.npz'), allow_pickle=False) as data:
+                keep = data['month'] < np.datetime64(month, 'M')
+                if product is not None:
+                    keep &= data['product'] == product
+                changes = data['stock'][keep]
+        except FileNotFoundError:
+            return 0.0, False
+        known = ~np.isnan(changes)
+        return float(changes[known].sum()), bool(known.any())
+
+    def rollup(self, freq='daily', start=None, end=None, product=None):
+        """Observations, sales and stock per period from ``start`` to ``end`` (dates, inclusive).
+
+        Indexed by period start; summed over all products, or for the one
+        named ``product``. Sales are those made during the period (NaN when
+        no SKU was observed before), stock is the level at its end. Periods
+        without observations are left out.
+        """
+        meta = self.meta()
+        if meta is not None and meta.get('rollups', 1) != ROLLUP_VERSION:
+            with self._locked():
+                self._upgrade()
+        days = ROLLUPS[freq]
+        start = period_start(np.datetime64(start, 'D'), days) if start is not None else None
+        end = np.datetime64(end, 'D') if end is not None else None
+        with span('history', freq) as query:
+            months = self._months(freq, start, end)
+            parts = []
+            for month in months:
+                with np.load(self._path(freq, f'{month}.npz'), allow_pickle=False) as data:
+                    parts.append(pd.DataFrame({name: data[name] for name in data.files}))
+            df = pd.concat(parts) if parts else pd.DataFrame(
+                {'period': np.array([], dtype='datetime64[D]'), 'product': np.array([], dtype=np.int32),
+                 **{column: np.array([], dtype=np.float64) for column in ['observations', 'sales', 'stock']}})
+            product_id = None
+            if product is not None:
+                names = self.products().tolist()
+                product_id = names.index(product) if product in names else -1
+                df = df[df['product'].to_numpy() == product_id]
+            series = df.groupby('period', sort=True)[['observations', 'sales', 'stock']].sum(min_count=1)
+
+            # Levels carried forward: the one before the first month read, plus every change since
+            opening, known = self._opening(freq, months[0], product_id) if months else (0.0, False)
+            level = opening + series['stock'].fillna(0.0).cumsum()
+            series['quantity'] = level.where(known | (series['stock'].notna().cumsum() > 0))
+            keep = np.ones(len(series), dtype=bool)
+            if start is not None:
+                keep &= series.index.to_numpy() >= start
+            if end is not None:
+                keep &= series.index.to_numpy() <= end
+            series = series.loc[keep, ROLLUP_COLUMNS]
+            series['observations'] = series['observations'].fillna(0).astype(np.int64)
+            query.rows = len(series)
+        return series
+
+    def observations(self, start=None, end=None):
+        """Every recorded observation from ``start`` to ``end`` (times, inclusive), in time order."""
+        start = np.datetime64(start, 's') if start is not None else None
+        end = np.datetime64(end, 's') if end is not None else None
+        parts = []
+        for month in self._months('observations', start, end):
+            folder = self._path('observations', month)
+            for name in sorted(os.listdir(folder)):
+                if name.endswith('.npz') and not name.endswith('.tmp.npz'):
+                    with np.load(os.path.join(folder, name), allow_pickle=False) as data:
+                        parts.append({column: data[column] for column in data.files})
+        if not parts:
+            return pd.DataFrame(columns=['sku', 'product', 'time', 'quantity', 'sales'])
+        columns = {column: np.concatenate([part[column] for part in parts]) for column in parts[0]}
+        keep = np.ones(len(columns['time']), dtype=bool)
+        if start is not None:
+            keep &= columns['time'] >= start
+        if end is not None:
+            keep &= columns['time'] <= end
+        state = self._skus()
+        df = pd.DataFrame({'sku': state['keys'][columns['sku'][keep]], 'product': state['products'][columns['product'][keep]],
+                           'time': columns['time'][keep], 'quantity': columns['quantity'][keep],
+                           'sales': columns['sales'][keep]})
+        return df.sort_values('time', kind='stable', ignore_index=True)
@@ -0,0 +1,204 @@
+"""Streaming ingestion of uploaded warehouse CSVs.
+
+The upload is parsed in bounded-size chunks. Each chunk is validated against
+the expected warehouse schema, type-coerced, cleaned and appended to the
+cleaned CSV and its Parquet copy, so peak memory depends on the chunk size
+rather than on the size of the upload.
+
+The cleaned files keep plain float64 numbers and strings; ``compact_frame``
+gives frames that are kept in memory (see dataset_cache.py) compact dtypes.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from storage import ColumnarWriter, DecodingReader, detect_encoding, write_metadata
+
+DEFAULT_CHUNK_ROWS = 50000
+
+# Expected columns of a warehouse inventory export and how they are coerced
+NUMERIC = 'numeric'
+TEXT = 'text'
+WAREHOUSE_SCHEMA = {
+    'Product_ID': TEXT,  # SKUs like "SKU-1001" are IDs too, kept as written
+    'Product Name': TEXT,
+    'Category': TEXT,
+    'Shelf Number': TEXT,
+    'Quantity Available': NUMERIC,
+    'Reorder_Level': NUMERIC,
+    'Supplier_Name': TEXT,
+    'Purchase_Price': NUMERIC,
+    'Selling_Price': NUMERIC,
+    'Last_Stock_Update': TEXT,
+    'Order_Status': TEXT,
+    'Total Sales Volume': NUMERIC,
+    'Total Revenue': NUMERIC,
+    'Profit per Unit': NUMERIC,
+    'Profit Margin (%)': NUMERIC,
+    'Stock Turnover Rate': NUMERIC,
+    'Storage Space (cubic ft)': NUMERIC,
+    'Warehouse Section': TEXT,
+    'Profit_Margin (%)': NUMERIC,
+}
+
+TEXT_DTYPES = {column: str for column, kind in WAREHOUSE_SCHEMA.items() if kind == TEXT}
+
+# Compact in-memory dtypes (see compact_frame). Total Revenue stays float64: it needs more than
+# float32's 7 significant digits to keep its cents
+INT32_COLUMNS = ['Quantity Available', 'Reorder_Level', 'Total Sales Volume', 'Storage Space (cubic ft)']
+FLOAT32_COLUMNS = ['Purchase_Price', 'Selling_Price', 'Profit per Unit', 'Profit Margin (%)', 'Stock Turnover Rate',
+                   'Profit_Margin (%)']
+DATE_FORMATS = {'Last_Stock_Update': ['%m/%d/%Y', 'ISO8601']}  # Tried in turn, the first that parses every value wins
+MAX_CATEGORY_SHARE = 0.5  # Text columns with at most this share of distinct values become categoricals
+# Exports with the same column under two names: the alias is dropped when its values are the same
+COLUMN_ALIASES = {'Profit_Margin (%)': 'Profit Margin (%)'}
+
+
+class IngestError(ValueError):
+    pass
+
+
+def _column_kinds(first_chunk):
+    # Known columns follow the schema, anything else keeps the kind pandas
+    # inferred for the first chunk so every later chunk is coerced the same way
+    kinds = {}
+    for column in first_chunk.columns:
+        if column in WAREHOUSE_SCHEMA:
+            kinds[column] = WAREHOUSE_SCHEMA[column]
+        elif pd.api.types.is_bool_dtype(first_chunk[column]):
+            kinds[column] = 'bool'
+        elif pd.api.types.is_numeric_dtype(first_chunk[column]):
+            kinds[column] = NUMERIC
+        else:
+            kinds[column] = TEXT
+    return kinds
+
+
+def clean_chunk(chunk, kinds):
+    """Coerce a raw chunk to the dataset's column kinds and drop incomplete rows.
+
+    Values that can't be coerced (e.g. text in a numeric column) become
+    missing, so the row is dropped along with rows that had empty cells.
+    """
+    for column, kind in kinds.items():
+        if kind == NUMERIC:
+            if chunk[column].dtype != 'float64':
+                chunk[column] = pd.to_numeric(chunk[column], errors='coerce').astype('float64')
+        elif kind == TEXT and column not in TEXT_DTYPES:  # schema text columns are parsed as str already
+            values = chunk[column]
+            chunk[column] = values.where(values.isna(), values.astype(str))
+    return chunk.dropna()
+
+
+def _whole_numbers(values):
+    limits = np.iinfo(np.int32)
+    return (np.isfinite(values).all() and (values == np.trunc(values)).all()
+            and (len(values) == 0 or limits.min <= values.min() and values.max() <= limits.max))
+
+
+def _dates(codes, uniques, formats):
+    # Dates repeat, so each distinct value is parsed once
+    for date_format in formats:
+        parsed = pd.to_datetime(uniques, format=date_format, errors='coerce')
+        if parsed.notna().all():
+            dates = parsed.to_numpy()[codes]
+            dates[codes < 0] = np.datetime64('NaT')
+            return dates
+    return None
+
+
+def compact_frame(df, dedupe=True):
+    """``df`` with compact dtypes for the warehouse schema's columns.
+
+    Whole-number quantities become int32, prices and rates float32, dates
+    datetime64 and low-cardinality text categorical: several times smaller
+    than float64 and Python strings, and quicker to group and filter. A
+    column whose values don't fit (fractions, missing values, dates in
+    another format) keeps its dtype. With ``dedupe``, ``COLUMN_ALIASES``
+    holding the same values as their column are dropped; pass False when
+    the caller asked for the columns by name.
+    """
+    columns = {}
+    for column in df.columns:
+        values = columns[column] = df[column]
+        if column in INT32_COLUMNS and values.dtype.kind == 'f':
+            if _whole_numbers(values.to_numpy()):
+                columns[column] = values.to_numpy().astype(np.int32)
+        elif column in FLOAT32_COLUMNS and values.dtype == np.float64:
+            columns[column] = values.to_numpy().astype(np.float32)
+        elif values.dtype == object and (column in DATE_FORMATS or WAREHOUSE_SCHEMA.get(column) == TEXT):
+            codes, uniques = pd.factorize(values)
+            if column in DATE_FORMATS:
+                dates = _dates(codes, uniques, DATE_FORMATS[column])
+                if dates is not None:
+                    columns[column] = dates
+            elif len(uniques) <= len(values) * MAX_CATEGORY_SHARE:
+                # Categories in order of first appearance, as in categoricals read from Parquet
+                columns[column] = pd.Categorical.from_codes(codes, uniques)
+    df = pd.DataFrame(columns, index=df.index)  # One copy into consolidated blocks
+
+    if dedupe:
+        duplicates = [alias for alias, column in COLUMN_ALIASES.items()
+                      if alias in df.columns and column in df.columns and df[alias].equals(df[column])]
+        df = df.drop(columns=duplicates)
+    return df
+
+
+def ingest_csv(source_path, cleaned_path, chunk_rows=DEFAULT_CHUNK_ROWS, progress=None, on_chunk=None):
+    """Clean ``source_path`` into ``cleaned_path`` (plus Parquet copy and metadata).
+
+    Returns a summary dict with row counts and any expected warehouse columns
+    the upload is missing. ``progress``, if given, is called with the fraction
+    of the source file consumed so far; ``on_chunk`` with every cleaned chunk,
+    in row order, so callers can build derived data in the same pass.
+    """
+    source_encoding = detect_encoding(source_path)
+    source_size = os.path.getsize(source_path) or 1
+    tmp_csv_path = cleaned_path + '.tmp'
+    columnar = ColumnarWriter(cleaned_path)
+
+    kinds = None
+    rows_in = rows_out = 0
+    try:
+        with open(source_path, 'rb') as raw, open(tmp_csv_path, 'w', encoding='utf-8', newline='') as out:
+            # Decoded here, switching encodings if the detected one stops fitting further on.
+            # Text columns are read as strings so shelf codes like "12" never flip to numbers
+            text = DecodingReader(raw, source_encoding)
+            reader = pd.read_csv(text, chunksize=chunk_rows, dtype=TEXT_DTYPES)
+            for chunk in reader:
+                if kinds is None:
+                    kinds = _column_kinds(chunk)
+                cleaned = clean_chunk(chunk, kinds)
+                cleaned.to_csv(out, index=False, header=rows_in == 0)
+                columnar.write(cleaned)
+                if on_chunk is not None:
+                    on_chunk(cleaned)
+                rows_in += len(chunk)
+                rows_out += len(cleaned)
+                if progress is not None:
+                    progress(min(raw.tell() / source_size, 1.0))
+        if kinds is None:
+            raise IngestError("The uploaded file has no data rows.")
+    except Exception:
+        columnar.abort()
+        if os.path.exists(tmp_csv_path):
+            os.remove(tmp_csv_path)
+        raise
+
+    # The Parquet copy must not be older than the CSV (see storage.has_columnar)
+    os.replace(tmp_csv_path, cleaned_path)
+    columnar.close()
+
+    columns = list(kinds)
+    summary = {
+        'rows_in': rows_in,
+        'rows': rows_out,
+        'rows_dropped': rows_in - rows_out,
+        'columns': columns,
+        'missing_columns': [column for column in WAREHOUSE_SCHEMA if column not in kinds],
+        'encoding': 'utf-8',
+        'source_encoding': ', '.join(text.encodings),
+    }
+    write_metadata(cleaned_path, **summary)
+    return summary
@@ -0,0 +1,351 @@
+"""Timing spans for the stages of a request, process metrics and an opt-in profiler.
+
+Hot paths wrap each stage in ``span(stage, name)``: file reads, encoding
+detection, parsing, computations, chart and template rendering, PDF
+generation. A span records its duration, plus the rows and bytes it handled
+when the caller sets them, into the process's ``metrics``:
+
+    with span('parse', 'csv', nbytes=os.path.getsize(path)) as s:
+        df = pd.read_csv(path)
+        s.rows = len(df)
+
+During a request the spans are also collected for its ``Server-Timing``
+header, which browsers show next to the request in their network panel.
+
+Job workers are separate processes with metrics of their own: every process
+writes a snapshot of its metrics to a shared folder (after each job, at most
+every ``DUMP_INTERVAL`` seconds for web processes), and ``/metrics`` merges
+the snapshots of running processes into one Prometheus text exposition. The
+totals drop when a worker exits, which Prometheus treats as a counter reset.
+
+``SamplingProfiler`` records the Python stack of one thread at a fixed
+interval from a background thread, in the folded format flame graph tools
+read. Requests are profiled only when asked for by header or config, so it
+costs nothing otherwise; the newest ``PROFILE_MAX_FILES`` profiles are kept.
+"""
+import bisect
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+
+PREFIX = 'digital_twin'
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # Seconds
+DUMP_INTERVAL = 5.0
+
+_request_spans = ContextVar('request_spans', default=None)
+
+
+class Metrics:
+    """Counters and latency histograms of one process, safe to update from any thread."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.enabled = True
+        self.directory = None  # Folder of the per-process snapshots, None keeps them in memory only
+        self.reset()
+        if hasattr(os, 'register_at_fork'):
+            # A forked worker starts from zero instead of counting its parent's requests again
+            os.register_at_fork(after_in_child=self.reset)
+
+    def reset(self):
+        self._lock = threading.Lock()  # Not one a parent's thread held while forking
+        self._histograms = {}  # (name, labels) -> per-bucket counts, +Inf last, then the sum
+        self._counters = {}  # (name, labels) -> value
+        self._last_dump = 0.0
+
+    def observe(self, metric, seconds, **labels):
+        key = (metric, tuple(labels.items()))
+        with self._lock:
+            counts = self._histograms.get(key)
+            if counts is None:
+                counts = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            counts[-1] += seconds
+
+    def inc(self, metric, amount=1, **labels):
+        key = (metric, tuple(labels.items()))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            histograms = [[name, list(labels), list(counts)] for (name, labels), counts in self._histograms.items()]
+            counters = [[name, list(labels), value] for (name, labels), value in self._counters.items()]
+        return {'histograms': histograms, 'counters': counters}
+
+    def dump(self, force=False):
+        """Write this process's snapshot to ``directory``, at most every DUMP_INTERVAL seconds unless forced."""
+        now = time.monotonic()
+        if self.directory is None or (not force and now - self._last_dump < DUMP_INTERVAL):
+            return
+        self._last_dump = now
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        """This process's live metrics merged with the latest snapshots of all other processes."""
+        snapshots = [self.snapshot()]
+        if self.directory is not None and os.path.isdir(self.directory):
+            for filename in os.listdir(self.directory):
+                pid, _, extension = filename.partition('.')
+                if extension != 'json' or not pid.isdigit() or int(pid) == os.getpid():
+                    continue
+                path = os.path.join(self.directory, filename)
+                try:
+                    if not _running(int(pid)):
+                        os.remove(path)  # From a process that has exited, e.g. before a restart
+                        continue
+                    with open(path) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue  # Being replaced
+        return merge_snapshots(snapshots)
+
+
+def _running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:  # Exists, but belongs to someone else; or no signals on this platform
+        pass
+    return True
+
+
+def merge_snapshots(snapshots):
+    histograms, counters = {}, {}
+    for snapshot in snapshots:
+        for name, labels, counts in snapshot['histograms']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = histograms.setdefault(key, [0] * len(counts))
+            for i, count in enumerate(counts):
+                merged[i] += count
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+    return histograms, counters
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}' if pairs else ''
+
+
+def prometheus_text(histograms, counters, gauges=None, buckets=BUCKETS):
+    """Prometheus text exposition of merged metrics; ``gauges`` maps names to current values."""
+    lines = []
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f"# TYPE {PREFIX}_{name} histogram")
+        for (metric, labels), counts in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], counts[:-1]):
+                cumulative += count
+                lines.append(f"{PREFIX}_{name}_bucket{_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{PREFIX}_{name}_sum{_labels(labels)} {counts[-1]}")
+            lines.append(f"{PREFIX}_{name}_count{_labels(labels)} {cumulative}")
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE {PREFIX}_{name} counter")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{PREFIX}_{name}{_labels(labels)} {value}")
+    for name, value in (gauges or {}).items():
+        lines.append(f"# TYPE {PREFIX}_{name} gauge")
+        lines.append(f"{PREFIX}_{name} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+class _Span:
+    __slots__ = ('stage', 'name', 'rows', 'nbytes', '_start')
+
+    def __init__(self, stage, name, rows, nbytes):
+        self.stage, self.name, self.rows, self.nbytes = stage, name, rows, nbytes
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        seconds = time.perf_counter() - self._start
+        metrics.observe('stage_seconds', seconds, stage=self.stage, name=self.name)
+        if self.rows is not None:
+            metrics.inc('stage_rows_total', int(self.rows), stage=self.stage, name=self.name)
+        if self.nbytes is not None:
+            metrics.inc('stage_bytes_total', int(self.nbytes), stage=self.stage, name=self.name)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((self.stage, self.name, seconds))
+
+
+class _NoSpan:
+    __slots__ = ('rows', 'nbytes')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+
+def span(stage, name='', rows=None, nbytes=None):
+    """Time a stage; set ``rows``/``nbytes`` on the returned span once they're known."""
+    if not metrics.enabled:
+        return _NoSpan()
+    return _Span(stage, name, rows, nbytes)
+
+
+def server_timing(spans):
+    """``Server-Timing`` header value, one entry per stage with its total duration."""
+    totals = {}
+    for stage, name, seconds in spans:
+        key = f"{stage}-{name}" if name else stage
+        totals[key] = totals.get(key, 0.0) + seconds
+    return ', '.join(f"{key.replace(' ', '_')};dur={seconds * 1000:.1f}" for key, seconds in totals.items())
+
+
+class SamplingProfiler:
+    """Samples the Python stack of one thread every ``interval`` seconds."""
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples = Counter()  # Folded stack ("outer;...;inner") -> samples
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def write_folded(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def prune_profiles(folder, keep):
+    """Delete all but the newest ``keep`` profiles in ``folder``, whose names start with their time."""
+    names = sorted(name for name in os.listdir(folder) if name.endswith('.folded'))
+    for name in names[:max(0, len(names) - keep)]:
+        try:
+            os.remove(os.path.join(folder, name))
+        except OSError:
+            pass  # Deleted by another process
+
+
+class Instrumentation:
+    """Per-request spans, request metrics and profiling for a Flask app."""
+
+    def __init__(self, app=None, profile_allowed=None):
+        if app is not None:
+            self.init_app(app, profile_allowed)
+
+    def init_app(self, app, profile_allowed=None):
+        """``profile_allowed()`` says whether the current request may ask to be profiled by header."""
+        from flask import before_render_template, g, request, template_rendered
+
+        app.config.setdefault('INSTRUMENTATION', True)
+        app.config.setdefault('METRICS_FOLDER', None)
+        app.config.setdefault('PROFILE_HEADER', 'X-Profile')
+        app.config.setdefault('PROFILE_SAMPLE_RATE', 0.0)
+        app.config.setdefault('PROFILE_FOLDER', 'profiles')
+        app.config.setdefault('PROFILE_INTERVAL', 0.005)
+        app.config.setdefault('PROFILE_MAX_FILES', 200)
+        metrics.enabled = app.config['INSTRUMENTATION']
+        metrics.directory = app.config['METRICS_FOLDER']
+        if metrics.directory:
+            os.makedirs(metrics.directory, exist_ok=True)
+
+        def profile_requested():
+            header = app.config['PROFILE_HEADER']
+            if header and request.headers.get(header) and (profile_allowed is None or profile_allowed()):
+                return True
+            rate = app.config['PROFILE_SAMPLE_RATE']
+            return rate > 0 and random.random() < rate
+
+        @app.before_request
+        def start_request():
+            if not metrics.enabled:
+                return
+            g.request_start = time.perf_counter()
+            g.request_spans_token = _request_spans.set([])
+            if profile_requested():
+                g.profiler = SamplingProfiler(interval=app.config['PROFILE_INTERVAL']).start()
+
+        @app.after_request
+        def finish_request(response):
+            start = g.pop('request_start', None)
+            if start is None:
+                return response
+            endpoint = request.endpoint or 'unknown'
+            metrics.observe('http_request_seconds', time.perf_counter() - start,
+                            endpoint=endpoint, method=request.method, status=str(response.status_code))
+            if not response.is_streamed:
+                metrics.inc('http_response_bytes_total', response.calculate_content_length() or 0, endpoint=endpoint)
+            spans = _request_spans.get()
+            if spans:
+                response.headers['Server-Timing'] = server_timing(spans)
+            profiler = g.pop('profiler', None)
+            if profiler is not None:
+                profiler.stop()
+                os.makedirs(app.config['PROFILE_FOLDER'], exist_ok=True)
+                path = os.path.join(app.config['PROFILE_FOLDER'],
+                                    f"{datetime.now():%Y%m%d-%H%M%S-%f}-{endpoint}.folded")
+                profiler.write_folded(path)
+                prune_profiles(app.config['PROFILE_FOLDER'], app.config['PROFILE_MAX_FILES'])
+                response.headers['X-Profile-File'] = os.path.basename(path)
+                app.logger.info("Profile of %s %s written to %s", request.method, request.path, path)
+            metrics.dump()
+            return response
+
+        @app.teardown_request
+        def clear_request(_):
+            token = g.pop('request_spans_token', None)
+            if token is not None:
+                _request_spans.reset(token)
+            profiler = g.pop('profiler', None)
+            if profiler is not None:  # The request failed before after_request
+                profiler.stop()
+
+        @before_render_template.connect_via(app)
+        def start_template(sender, template, context, **extra):
+            if metrics.enabled:
+                g.template_span = span('template', template.name or '').__enter__()
+
+        @template_rendered.connect_via(app)
+        def finish_template(sender, template, context, **extra):
+            template_span = g.pop('template_span', None)
+            if template_span is not None:
+                template_span.__exit__(None, None, None)
@@ -0,0 +1,289 @@
+"""Cleaned inventory rows in the app's database, and the queries run on them.
+
+When ``INVENTORY_SQL`` is on, uploads are also loaded into the
+``inventory_item`` table as they are cleaned: one row per dataset row, keyed
+by ``(dataset_id, row)`` with the row's position in the cleaned file, and
+one typed column per warehouse field. Derived report metrics are computed
+once at load time, and ``inventory_summary`` keeps running totals per
+dataset. Report KPIs, shelf pages and searches then run as index lookups and
+range scans. A request no longer reads the dataset into the web process, and
+its cost stops growing with file size.
+
+Rows can also be changed in place (see deltas.py). Deleted rows leave their
+position empty and new rows take positions after the last one, so a row keeps
+its position, and its tile in the layout, for as long as it exists.
+
+Only SQLAlchemy core is used, so the same queries run on SQLite and on
+PostgreSQL. Results match the file-based paths (kpis.py, layout.py,
+search_index.py) and use the same row positions. The one exception is
+case-insensitive matching, which follows the database's ``lower()``:
+SQLite only folds ASCII letters.
+"""
+import numpy as np
+import pandas as pd
+import sqlalchemy as sa
+
+from kpis import EXTREMES, REQUIRED_COLUMNS, SLOW_MOVING_TURNOVER, metric_arrays
+from layout import LAYOUT_FIELDS, MAX_PAGE_SIZE
+from search_index import EXACT_FIELDS, RANGE_FIELDS, TEXT_FIELDS, SearchError
+
+# Dataset column -> table column
+TEXT_COLUMNS = {
+    'Product_ID': 'product_id',
+    'Product Name': 'product_name',
+    'Category': 'category',
+    'Shelf Number': 'shelf_number',
+    'Warehouse Section': 'section',
+    'Supplier_Name': 'supplier',
+    'Order_Status': 'status',
+}
+NUMBER_COLUMNS = {
+    'Quantity Available': 'quantity',
+    'Reorder_Level': 'reorder_level',
+    'Purchase_Price': 'purchase_price',
+    'Selling_Price': 'selling_price',
+    'Total Sales Volume': 'sales_volume',
+    'Total Revenue': 'revenue',
+    'Profit Margin (%)': 'profit_margin',
+    'Stock Turnover Rate': 'turnover',
+    'Storage Space (cubic ft)': 'storage_space',
+}
+COLUMNS = dict(TEXT_COLUMNS, **NUMBER_COLUMNS)
+
+# Mirrors the InventoryItem and InventorySummary models in app.py for worker processes
+inventory_table = sa.table(
+    'inventory_item',
+    sa.column('dataset_id'), sa.column('row'),
+    *[sa.column(name) for name in COLUMNS.values()],
+)
+summary_table = sa.table(
+    'inventory_summary',
+    sa.column('dataset_id'), sa.column('rows'), sa.column('slots'), sa.column('total_stock'),
+    sa.column('used_space'),
+)
+
+
+def _column_values(values):
+    """Plain Python values for the driver, NaN and missing values as None."""
+    values = pd.Series(values)
+    return values.astype(object).where(values.notna(), None).tolist()
+
+
+def inventory_records(chunk, dataset_id, positions):
+    """``(columns, rows)`` to insert for the rows of a cleaned chunk, at ``positions``."""
+    columns = {'dataset_id': [dataset_id] * len(chunk), 'row': list(positions)}
+    for column, name in TEXT_COLUMNS.items():
+        if column in chunk.columns:
+            columns[name] = [None if value is None else str(value) for value in _column_values(chunk[column])]
+    numbers = {column: chunk[column] for column in NUMBER_COLUMNS if column in chunk.columns}
+    if all(column in chunk.columns for column in REQUIRED_COLUMNS):
+        # Same derived metrics as the file-based report, see kpis.py
+        numbers.update(metric_arrays(chunk))
+    for column, values in numbers.items():
+        columns[NUMBER_COLUMNS[column]] = _column_values(pd.to_numeric(pd.Series(np.asarray(values)), errors='coerce'))
+    return list(columns), list(zip(*columns.values()))
+
+
+def insert_records(conn, columns, rows):
+    # Straight to the driver's executemany: per-row parameter processing would double the load time
+    compiled = sa.insert(inventory_table).compile(dialect=conn.dialect, column_keys=columns)
+    if compiled.positional:
+        order = [columns.index(key) for key in compiled.positiontup]
+        params = [tuple(row[i] for i in order) for row in rows]
+    else:
+        params = [dict(zip(columns, row)) for row in rows]
+    conn.exec_driver_sql(str(compiled), params)
+
+
+def column_total(columns, rows, name):
+    """Sum of one column of ``inventory_records`` output, missing values skipped."""
+    if name not in columns:
+        return 0.0
+    i = columns.index(name)
+    return float(sum(row[i] for row in rows if row[i] is not None and row[i] == row[i]))
+
+
+def update_summary(conn, dataset_id, rows=0, slots=0, total_stock=0.0, used_space=0.0):
+    """Add to the running totals of a dataset's rows."""
+    t = summary_table
+    conn.execute(sa.update(t).where(t.c.dataset_id == dataset_id).values(
+        rows=t.c.rows + rows, slots=t.c.slots + slots, total_stock=t.c.total_stock + total_stock,
+        used_space=t.c.used_space + used_space))
+
+
+class InventoryLoader:
+    """Loads cleaned chunks of one dataset, in row order."""
+
+    def __init__(self, engine, dataset_id):
+        self.engine = engine
+        self.dataset_id = dataset_id
+        self.rows = 0
+        self.delete()
+        with self.engine.begin() as conn:
+            conn.execute(sa.insert(summary_table).values(dataset_id=dataset_id, rows=0, slots=0, total_stock=0.0,
+                                                         used_space=0.0))
+
+    def add(self, chunk):
+        if chunk.empty:
+            return
+        columns, rows = inventory_records(chunk, self.dataset_id, range(self.rows, self.rows + len(chunk)))
+        with self.engine.begin() as conn:
+            insert_records(conn, columns, rows)
+            update_summary(conn, self.dataset_id, rows=len(rows), slots=len(rows),
+                           total_stock=column_total(columns, rows, 'quantity'),
+                           used_space=column_total(columns, rows, 'storage_space'))
+        self.rows += len(chunk)
+
+    def delete(self):
+        with self.engine.begin() as conn:
+            conn.execute(sa.delete(inventory_table).where(inventory_table.c.dataset_id == self.dataset_id))
+            conn.execute(sa.delete(summary_table).where(summary_table.c.dataset_id == self.dataset_id))
+
+
+class InventoryQueries:
+    """Report, layout and search queries on one dataset's rows.
+
+    ``columns`` are the dataset's column names (from its catalog schema);
+    fields the dataset doesn't have are reported as missing, as with the
+    file-based paths.
+    """
+
+    def __init__(self, engine, dataset_id, columns):
+        self.engine = engine
+        self.dataset_id = dataset_id
+        self.columns = set(columns)
+        self.t = inventory_table
+
+    def _select(self, *columns):
+        return sa.select(*columns).select_from(self.t).where(self.t.c.dataset_id == self.dataset_id)
+
+    def _column(self, dataset_column):
+        return self.t.c[COLUMNS[dataset_column]]
+
+    def summary(self, conn):
+        """Running totals of the dataset's rows: ``rows``, ``slots``, ``total_stock`` and ``used_space``."""
+        t = summary_table
+        return conn.execute(sa.select(t.c.rows, t.c.slots, t.c.total_stock, t.c.used_space)
+                            .where(t.c.dataset_id == self.dataset_id)).one()
+
+    def _holder(self, value, kind):
+        # First row (in row order) holding the column's extreme value: two seeks on the column's index
+        target = self._select((sa.func.max if kind == 'max' else sa.func.min)(value)).scalar_subquery().correlate(None)
+        return self._select(self.t.c.product_name).where(value == target).order_by(self.t.c.row).limit(1) \
+            .scalar_subquery().correlate(None)
+
+    def report_kpis(self):
+        """Same dict as ``kpis.ReportKPIs.result()``, or None without the required columns.
+
+        Totals come from the running summary and every extreme value from
+        index seeks, so the cost depends on the number of slow movers, not on
+        the number of rows.
+        """
+        if not all(column in self.columns for column in REQUIRED_COLUMNS):
+            return None
+        t = self.t
+        with self.engine.connect() as conn:
+            summary = self.summary(conn)
+            holders = conn.execute(sa.select(*[self._holder(self._column(column), kind)
+                                                for column, kind in EXTREMES.values()])).one()
+            slow = conn.execute(self._select(t.c.product_name).where(t.c.turnover < SLOW_MOVING_TURNOVER)
+                                .order_by(t.c.row)).scalars().all()
+
+        kpis = dict(zip(EXTREMES, holders))
+        kpis.update(total_stock=float(summary.total_stock), used_space=float(summary.used_space),
+                    slow_moving_products=slow, rows=summary.rows)
+        return kpis
+
+    def shelf_page(self, offset, limit):
+        """Same payload as ``layout.shelf_page``: one range scan over row positions.
+
+        Positions of deleted rows are returned as empty shelves (all fields None).
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        offset = max(0, offset)
+        columns = [self._column(column) for column in LAYOUT_FIELDS]
+        with self.engine.connect() as conn:
+            total = self.summary(conn).slots
+            page = conn.execute(self._select(self.t.c.row, *columns)
+                                .where(self.t.c.row >= offset, self.t.c.row < offset + limit)
+                                .order_by(self.t.c.row)).all()
+        count = max(0, min(limit, total - offset))
+        values = {field: [None] * count for field in LAYOUT_FIELDS.values()}
+        for row, *fields in page:
+            for field, value in zip(values.values(), fields):
+                field[row - offset] = value
+        return {'total': total, 'offset': offset, 'count': count, 'columns': values}
+
+    def shelves(self, positions):
+        """``{position: (shelf, product, quantity)}`` of the given positions; empty ones are left out."""
+        columns = [self._column(column) for column in LAYOUT_FIELDS]
+        positions = list(positions)
+        shelves = {}
+        with self.engine.connect() as conn:
+            for start in range(0, len(positions), 500):
+                rows = conn.execute(self._select(self.t.c.row, *columns)
+                                    .where(self.t.c.row.in_(positions[start:start + 500])))
+                shelves.update((row, tuple(fields)) for row, *fields in rows)
+        return shelves
+
+    def positions_of(self, product_ids):
+        """Positions of every row with one of the given ``Product_ID`` values.
+
+        Product IDs need not be unique: all rows of an ID are returned, by
+        position, and IDs follow the order they're given in (repeats once).
+        """
+        product_ids = list(dict.fromkeys(product_ids))
+        found = {}
+        with self.engine.connect() as conn:
+            for start in range(0, len(product_ids), 500):
+                rows = conn.execute(self._select(self.t.c.product_id, self.t.c.row).where(
+                    self.t.c.product_id.in_(product_ids[start:start + 500])).order_by(self.t.c.row))
+                for product_id, row in rows:
+                    found.setdefault(product_id, []).append(row)
+        return [row for product_id in product_ids for row in found.get(product_id, [])]
+
+    def _require(self, field, fields):
+        if field not in fields:
+            raise SearchError(f"Unknown search field: {field}")
+        if fields[field] not in self.columns:
+            raise SearchError(f"This dataset has no {fields[field]} column to search.")
+
+    def _contains(self, dataset_column, text):
+        column = self._column(dataset_column)
+        if self.engine.dialect.name == 'sqlite':
+            return column.contains(text, autoescape=True)  # SQLite's LIKE already ignores (ASCII) case
+        return column.icontains(text, autoescape=True)
+
+    def search(self, query=None, text=None, exact=None, ranges=None, limit=None):
+        """``(total, positions, shelves)`` of the rows matching every filter.
+
+        Takes the same filters as ``SearchIndex.search``. Positions are sorted,
+        and at most ``limit`` of them are returned with their shelf numbers.
+        """
+        conditions = []
+        if query:
+            conditions.append(sa.or_(*[self._contains(column, query) for column in TEXT_FIELDS.values()
+                                       if column in self.columns] or [sa.false()]))
+        for field, value in (text or {}).items():
+            self._require(field, TEXT_FIELDS)
+            conditions.append(self._contains(TEXT_FIELDS[field], value))
+        for field, values in (exact or {}).items():
+            self._require(field, EXACT_FIELDS)
+            wanted = [value.strip().lower() for value in values]
+            conditions.append(sa.func.lower(self._column(EXACT_FIELDS[field])).in_(wanted))  # Indexed expression
+        for field, (low, high) in (ranges or {}).items():
+            self._require(field, RANGE_FIELDS)
+            column = self._column(RANGE_FIELDS[field])
+            if low is not None:
+                conditions.append(column >= low)
+            if high is not None:
+                conditions.append(column <= high)
+
+        t = self.t
+        matches = self._select(t.c.row, t.c.shelf_number).where(*conditions).order_by(t.c.row)
+        if limit is not None:
+            matches = matches.limit(limit)  # Stops the scan in row order after ``limit`` matches
+        with self.engine.connect() as conn:
+            total = conn.execute(self._select(sa.func.count()).where(*conditions)).scalar_one()
+            matches = conn.execute(matches).all()
+        return total, [row[0] for row in matches], [row[1] for row in matches]
@@ -0,0 +1,252 @@
+"""Background jobs for heavy work (upload cleaning, chart rendering, exports).
+
+Web routes only enqueue a job and poll its status. Job state lives in the
+``job`` table of the app database, so any process that can reach the database
+can run or report on a job. Work is addressed by a dotted function path
+(``"tasks:ingest_upload"``) plus JSON-friendly arguments rather than by a
+pickled callable, which keeps the door open for a backend that ships jobs to
+workers on other machines; today there are two backends:
+
+* ``LocalProcessBackend`` runs jobs on a local process pool (the default).
+  Its processes are started by a fork server, not forked from the web
+  process: a gthread worker's other threads may hold locks (logging,
+  database pools, open live streams) that a forked child would inherit held.
+* ``InlineBackend`` runs them synchronously in the calling thread, which is
+  handy for tests and debugging (``JOBS_EAGER = True``).
+
+The process holding a queued or running job records a heartbeat on it.
+Jobs whose process exited or restarted go silent, and ``JobQueue.sweep``
+fails them; routes that reuse a waiting or running job instead of starting
+another would otherwise wait on them forever.
+"""
+import importlib
+import inspect
+import json
+import multiprocessing
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import sqlalchemy as sa
+
+from instrumentation import metrics, span
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+
+HEARTBEAT_INTERVAL = 10  # Seconds between heartbeats of queued and running jobs
+STALE_AFTER = 120  # Seconds without one before a job counts as orphaned
+ORPHANED = "The job's worker exited or restarted before it finished, please try again."
+
+# Lightweight handle on the job table for worker processes, which don't load the Flask app
+job_table = sa.table(
+    'job',
+    sa.column('id'), sa.column('status'), sa.column('progress'), sa.column('result'),
+    sa.column('error'), sa.column('created_at'), sa.column('started_at'), sa.column('finished_at'),
+    sa.column('heartbeat_at'),
+)
+
+# Job processes start from a fork server with these imported, or are spawned where there is none
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+PRELOAD_MODULES = ['jobs', 'tasks']
+
+_engines = {}
+
+
+def engine_for(db_uri):
+    # One engine per worker process and database
+    if db_uri not in _engines:
+        _engines[db_uri] = sa.create_engine(db_uri, connect_args={'timeout': 30} if db_uri.startswith('sqlite') else {})
+    return _engines[db_uri]
+
+
+def init_worker(metrics_enabled, metrics_directory):
+    """Job process setup: database connections of its own and the web process's metrics settings."""
+    for engine in _engines.values():
+        engine.dispose(close=False)  # Pooled connections of the process this one was forked from
+    _engines.clear()
+    metrics.enabled = metrics_enabled
+    metrics.directory = metrics_directory
+
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _update_job(db_uri, job_id, **values):
+    with engine_for(db_uri).begin() as conn:
+        conn.execute(sa.update(job_table).where(job_table.c.id == job_id).values(**values))
+
+
+def resolve(func_path):
+    module_name, _, func_name = func_path.partition(':')
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def run_job(db_uri, job_id, func_path, args, kwargs):
+    """Worker entry point: run one job and record its outcome in the database."""
+    _update_job(db_uri, job_id, status=RUNNING, started_at=_now(), heartbeat_at=_now())
+    last_report = [0.0]
+
+    def progress(fraction):
+        # Throttle progress writes, polling clients don't need more than ~2/s
+        now = time.monotonic()
+        if now - last_report[0] >= 0.5:
+            last_report[0] = now
+            _update_job(db_uri, job_id, progress=float(fraction))
+
+    try:
+        func = resolve(func_path)
+        parameters = inspect.signature(func).parameters
+        if 'progress' in parameters:
+            kwargs = dict(kwargs, progress=progress)
+        if 'db_uri' in parameters:  # Tasks that write their own results to the database
+            kwargs = dict(kwargs, db_uri=db_uri)
+        with span('job', func_path):
+            result = func(*args, **kwargs)
+        _update_job(db_uri, job_id, status=FINISHED, progress=1.0, finished_at=_now(),
+                    result=json.dumps(result, default=str))
+    except Exception as e:
+        traceback.print_exc()
+        _update_job(db_uri, job_id, status=FAILED, finished_at=_now(), error=str(e) or e.__class__.__name__)
+    finally:
+        metrics.dump(force=True)  # Worker metrics reach /metrics through their snapshot
+
+
+class Heartbeat:
+    """Marks the jobs this process holds as alive every ``interval`` seconds, from a background thread."""
+
+    def __init__(self, interval=HEARTBEAT_INTERVAL):
+        self.interval = interval
+        self.jobs = {}  # job id -> db_uri
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def add(self, db_uri, job_id):
+        with self._lock:
+            self.jobs[job_id] = db_uri
+            if self._thread is None:  # Started on first use, like the pool
+                self._thread = threading.Thread(target=self._run, name='job-heartbeat', daemon=True)
+                self._thread.start()
+
+    def discard(self, job_id):
+        with self._lock:
+            self.jobs.pop(job_id, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                jobs = dict(self.jobs)
+            by_database = {}
+            for job_id, db_uri in jobs.items():
+                by_database.setdefault(db_uri, []).append(job_id)
+            for db_uri, job_ids in by_database.items():
+                try:
+                    with engine_for(db_uri).begin() as conn:
+                        conn.execute(sa.update(job_table).where(job_table.c.id.in_(job_ids),
+                                                                job_table.c.status.in_([QUEUED, RUNNING]))
+                                     .values(heartbeat_at=_now()))
+                except sa.exc.SQLAlchemyError:
+                    pass  # Tried again on the next beat
+
+
+class InlineBackend:
+    def __init__(self, heartbeat_interval=HEARTBEAT_INTERVAL):
+        self.heartbeat = Heartbeat(heartbeat_interval)
+
+    def submit(self, db_uri, job_id, func_path, args, kwargs):
+        self.heartbeat.add(db_uri, job_id)
+        try:
+            run_job(db_uri, job_id, func_path, args, kwargs)
+        finally:
+            self.heartbeat.discard(job_id)
+
+
+class LocalProcessBackend:
+    def __init__(self, max_workers=None, heartbeat_interval=HEARTBEAT_INTERVAL):
+        self.max_workers = max_workers
+        self.heartbeat = Heartbeat(heartbeat_interval)
+        self._pool = None
+
+    def submit(self, db_uri, job_id, func_path, args, kwargs):
+        # The pool is created on first use so importing the app never starts processes
+        if self._pool is None:
+            context = multiprocessing.get_context(START_METHOD)
+            if START_METHOD == 'forkserver':
+                context.set_forkserver_preload(PRELOAD_MODULES)
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context,
+                                             initializer=init_worker, initargs=(metrics.enabled, metrics.directory))
+        # Beats for the job from here while it waits and runs: a pool dies with the web process
+        self.heartbeat.add(db_uri, job_id)
+        future = self._pool.submit(run_job, db_uri, job_id, func_path, args, kwargs)
+        future.add_done_callback(lambda f: self._check(f, db_uri, job_id))
+
+    def _check(self, future, db_uri, job_id):
+        self.heartbeat.discard(job_id)
+        # run_job records its own failures; this only catches a crashed worker process
+        if future.exception() is not None:
+            _update_job(db_uri, job_id, status=FAILED, finished_at=_now(), error=str(future.exception()))
+
+    def shutdown(self, wait=False):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+
+
+class JobQueue:
+    def __init__(self, app=None, db=None, model=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app, db, model)
+
+    def init_app(self, app, db, model):
+        self.db = db
+        self.model = model
+        app.config.setdefault('JOB_WORKERS', None)  # None = one per CPU
+        app.config.setdefault('JOBS_EAGER', False)
+        app.config.setdefault('JOB_HEARTBEAT_INTERVAL', HEARTBEAT_INTERVAL)
+        app.config.setdefault('JOB_STALE_AFTER', STALE_AFTER)
+        self.stale_after = timedelta(seconds=app.config['JOB_STALE_AFTER'])
+        if app.config['JOBS_EAGER']:
+            self.backend = InlineBackend(app.config['JOB_HEARTBEAT_INTERVAL'])
+        else:
+            self.backend = LocalProcessBackend(app.config['JOB_WORKERS'], app.config['JOB_HEARTBEAT_INTERVAL'])
+
+    def enqueue(self, kind, func_path, *args, user_id=None, result_url=None, **kwargs):
+        """Record a queued job and hand it to the backend. Returns the job id."""
+        now = _now()
+        job = self.model(id=uuid.uuid4().hex, kind=kind, status=QUEUED, progress=0.0,
+                         user_id=user_id, result_url=result_url, created_at=now, heartbeat_at=now)
+        self.db.session.add(job)
+        self.db.session.commit()
+        job_id = job.id
+        db_uri = self.db.engine.url.render_as_string(hide_password=False)
+        self.backend.submit(db_uri, job_id, func_path, list(args), kwargs)
+        return job_id
+
+    def get(self, job_id):
+        job = self.db.session.get(self.model, job_id)
+        if job is not None:
+            self.db.session.refresh(job)  # Workers update the row behind the session's back
+        return job
+
+    def sweep(self):
+        """Fail queued and running jobs without a heartbeat for ``JOB_STALE_AFTER``; returns them."""
+        t = job_table
+        silent = sa.and_(t.c.status.in_([QUEUED, RUNNING]),
+                         sa.func.coalesce(t.c.heartbeat_at, t.c.created_at) < _now() - self.stale_after)
+        with self.db.engine.begin() as conn:
+            job_ids = conn.execute(sa.select(t.c.id).where(silent)).scalars().all()
+            if job_ids:
+                # Still silent when updated: a job may have finished in between
+                conn.execute(sa.update(t).where(t.c.id.in_(job_ids), silent)
+                             .values(status=FAILED, finished_at=_now(), error=ORPHANED))
+        if not job_ids:
+            return []
+        return [job for job in (self.get(job_id) for job_id in job_ids) if job.error == ORPHANED]
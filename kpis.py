@@ -0,0 +1,167 @@
+"""Report KPIs, computed in one pass and stored per dataset version.
+
+Every metric on the report page is folded into a ``ReportKPIs`` accumulator
+chunk by chunk: per chunk the extreme-value lookups for all metric columns
+are one ``argmax``/``argmin`` over a stacked array, the totals one ``sum``,
+and derived columns are computed only for the chunk at hand. Uploads feed the
+accumulator while they are cleaned; datasets from before that are scanned
+once on first use. The result is saved as ``cleaned_<name>.kpis.json`` with
+the dataset version it describes, so report views never touch the rows.
+"""
+import json
+import os
+
+import numpy as np
+
+from parallel import Columns, map_partitions
+from reports import SOURCE_COLUMNS
+from storage import dataset_columns, dataset_version, kpis_path, read_dataset
+
+# Raw columns the report can't do without; the derived ones are computed from these
+REQUIRED_COLUMNS = ['Product Name', 'Purchase_Price', 'Selling_Price', 'Total Sales Volume',
+                    'Total Revenue', 'Quantity Available']
+
+# KPI -> (metric column, 'max' or 'min'): the product with the extreme value
+EXTREMES = {
+    'most_stocked_product': ('Quantity Available', 'max'),
+    'most_valuable_product': ('Total Revenue', 'max'),
+    'least_valuable_product': ('Total Revenue', 'min'),
+    'most_profitable_product': ('Profit Margin (%)', 'max'),
+    'least_profitable_product': ('Profit Margin (%)', 'min'),
+    'best_selling_product': ('Total Sales Volume', 'max'),
+    'worst_selling_product': ('Total Sales Volume', 'min'),
+}
+METRIC_COLUMNS = list(dict.fromkeys(column for column, _ in EXTREMES.values()))
+SLOW_MOVING_TURNOVER = 1  # Products turning over less than once are slow movers
+
+
+def metric_arrays(chunk):
+    """Metric columns of ``chunk`` as float arrays, derived ones computed when missing."""
+    def column(name):
+        return chunk[name].to_numpy(dtype=np.float64)
+
+    values = {name: column(name) for name in REQUIRED_COLUMNS[1:]}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if 'Profit Margin (%)' in chunk.columns:
+            values['Profit Margin (%)'] = column('Profit Margin (%)')
+        else:
+            values['Profit Margin (%)'] = (values['Selling_Price'] - values['Purchase_Price']) / values['Selling_Price'] * 100
+        if 'Stock Turnover Rate' in chunk.columns:
+            values['Stock Turnover Rate'] = column('Stock Turnover Rate')
+        else:
+            values['Stock Turnover Rate'] = values['Total Sales Volume'] / values['Quantity Available']
+    return values
+
+
+class ReportKPIs:
+    def __init__(self):
+        self.available = None  # False once a chunk lacks a required column
+        self.rows = 0
+        self.total_stock = 0.0
+        self.used_space = 0.0
+        self.slow_moving_products = []
+        self._extremes = {}  # (column, 'max'/'min') -> (value, product)
+
+    def add(self, chunk):
+        if self.available is False:
+            return
+        self.available = all(column in chunk.columns for column in REQUIRED_COLUMNS)
+        if not self.available or chunk.empty:
+            return
+        names = chunk['Product Name'].to_numpy()
+        values = metric_arrays(chunk)
+
+        # One reduction per direction over all metric columns, NaNs never win
+        stacked = np.vstack([values[column] for column in METRIC_COLUMNS])
+        valid = ~np.isnan(stacked)
+        argmax = np.where(valid, stacked, -np.inf).argmax(axis=1)
+        argmin = np.where(valid, stacked, np.inf).argmin(axis=1)
+        for row, column in enumerate(METRIC_COLUMNS):
+            if not valid[row].any():
+                continue
+            for kind, position in (('max', argmax[row]), ('min', argmin[row])):
+                value = stacked[row, position]
+                best = self._extremes.get((column, kind))
+                # Strict comparison keeps the first occurrence, like idxmax/idxmin
+                if best is None or (value > best[0] if kind == 'max' else value < best[0]):
+                    self._extremes[(column, kind)] = (float(value), str(names[position]))
+
+        self.total_stock += float(np.nansum(values['Quantity Available']))
+        if 'Storage Space (cubic ft)' in chunk.columns:
+            self.used_space += float(np.nansum(chunk['Storage Space (cubic ft)'].to_numpy(dtype=np.float64)))
+        self.slow_moving_products.extend(names[values['Stock Turnover Rate'] < SLOW_MOVING_TURNOVER].tolist())
+        self.rows += len(chunk)
+
+    def merge(self, other):
+        """Fold in the KPIs of the rows after ours, as if they had been added here."""
+        if other.available is None:
+            return self
+        if self.available is None or other.available is False:
+            self.available = other.available
+        if not self.available:
+            return self
+        for (column, kind), (value, product) in other._extremes.items():
+            best = self._extremes.get((column, kind))
+            if best is None or (value > best[0] if kind == 'max' else value < best[0]):
+                self._extremes[(column, kind)] = (value, product)
+        self.total_stock += other.total_stock
+        self.used_space += other.used_space
+        self.slow_moving_products.extend(other.slow_moving_products)
+        self.rows += other.rows
+        return self
+
+    def result(self):
+        """The report's KPIs as a JSON-friendly dict, or None without the required columns."""
+        if not self.available:
+            return None
+        kpis = {name: self._extremes.get(key, (None, None))[1] for name, key in EXTREMES.items()}
+        kpis.update(total_stock=self.total_stock, used_space=self.used_space,
+                    slow_moving_products=self.slow_moving_products, rows=self.rows)
+        return kpis
+
+
+def _partition_kpis(columns, partition):
+    accumulator = ReportKPIs()
+    accumulator.add(columns.frame(columns.rows_of(partition)))
+    return accumulator
+
+
+def compute_kpis(df, workers=None):
+    """KPIs of a whole dataset, row ranges folded on ``workers`` processes (see parallel.py)."""
+    accumulator = ReportKPIs()
+    for part in map_partitions(_partition_kpis, Columns.from_frame(df), workers=workers):
+        accumulator.merge(part)
+    return accumulator.result()
+
+
+def warehouse_density(kpis, total_capacity):
+    """Free space and status message for a warehouse of ``total_capacity`` cubic feet."""
+    available_space = total_capacity - kpis['used_space']
+    message = "Warehouse has sufficient space." if available_space > 0 else "Warning: Warehouse is almost full."
+    return available_space, message
+
+
+def save_kpis(csv_path, kpis):
+    path = kpis_path(csv_path)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': dataset_version(csv_path), 'kpis': kpis}, f)
+    os.replace(tmp_path, path)
+
+
+def load_kpis(csv_path, workers=None):
+    """KPIs of the current dataset version, computed (and saved) on first use."""
+    try:
+        with open(kpis_path(csv_path), encoding='utf-8') as f:
+            stored = json.load(f)
+        if stored.get('version') == dataset_version(csv_path):
+            return stored['kpis']
+    except (OSError, ValueError):
+        pass
+    columns = [column for column in SOURCE_COLUMNS if column in dataset_columns(csv_path)]
+    kpis = compute_kpis(read_dataset(csv_path, columns), workers)
+    try:
+        save_kpis(csv_path, kpis)
+    except OSError:
+        pass
+    return kpis
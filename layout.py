@@ -0,0 +1,61 @@
+"""Shelf data for the 2D layout pages, served as JSON pages.
+
+The layout pages draw shelves on a canvas and fetch only the pages covering
+the visible part of the layout. Pages are columnar — one array per field
+instead of one object per shelf — which keeps the payload small and
+compresses well.
+"""
+import gzip
+import json
+
+LAYOUT_COLUMNS = ['Shelf Number', 'Product Name', 'Quantity Available']
+# Short JSON field names for the layout columns
+LAYOUT_FIELDS = {'Shelf Number': 'shelf', 'Product Name': 'product', 'Quantity Available': 'quantity'}
+
+PAGE_SIZE = 500  # Shelves per page when the client doesn't ask for a size
+MAX_PAGE_SIZE = 5000
+MAX_SEARCH_MATCHES = 10000  # Positions returned per search, the total is always reported
+GZIP_MIN_BYTES = 1024  # Smaller bodies aren't worth compressing
+# Stock classes of the layout tiles, as static/js/shelf_canvas.js colours them
+LOW_STOCK = 10
+MIDDLE_STOCK = 20
+
+
+def _plain(values):
+    # NumPy scalars aren't JSON serialisable, NaN isn't valid JSON
+    return [None if value != value else value for value in values.tolist()]
+
+
+def stock_level(quantity):
+    """``'low'``, ``'middle'`` or ``'sufficient'``; None for a shelf without a quantity."""
+    if quantity is None or quantity != quantity:
+        return None
+    if quantity < LOW_STOCK:
+        return 'low'
+    if quantity < MIDDLE_STOCK:
+        return 'middle'
+    return 'sufficient'
+
+
+def shelf_page(df, offset, limit):
+    """Shelves ``offset``..``offset + limit`` of ``df`` as columnar arrays."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    offset = max(0, offset)
+    page = df.iloc[offset:offset + limit]
+    return {
+        'total': len(df),
+        'offset': offset,
+        'count': len(page),
+        'columns': {field: _plain(page[column].to_numpy()) for column, field in LAYOUT_FIELDS.items()},
+    }
+
+
+def json_body(payload, accept_encoding=''):
+    """Encode ``payload`` as compact JSON, gzipped when the client accepts it.
+
+    Returns ``(body, content_encoding)`` with ``content_encoding`` None for a plain body.
+    """
+    body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    if len(body) >= GZIP_MIN_BYTES and 'gzip' in accept_encoding.lower():
+        return gzip.compress(body, compresslevel=5), 'gzip'
+    return body, None
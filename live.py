@@ -0,0 +1,268 @@
+"""Live shelf updates for the 2D layout pages, pushed as server-sent events.
+
+Stock changes reach a dataset through deltas (see deltas.py), which log the
+row positions they touch. Each serving process runs one feed thread per
+dataset that someone is viewing: it polls the dataset's revision, and when
+that moves it reads the changed shelves once from the inventory table and
+publishes them as one event, encoded once and shared by every viewer.
+However many viewers there are, each change is read and serialized once per
+process, and viewers never read the dataset themselves.
+
+Everything that changed between two polls goes out as one event, so bursts
+of changes to the same shelves are coalesced, and streams send at most one
+event per ``batch_interval``. A viewer that falls behind (a slow connection)
+never blocks the feed or other viewers: the events it missed are sent as one,
+with the latest state of each position, and once they hold more than
+``max_pending`` positions it is sent a ``resync`` event and refetches the
+pages it shows instead.
+
+Streams are meant to be served by the dedicated gevent server of
+gunicorn.live.conf.py, where an open stream costs a socket and a greenlet
+and one process holds thousands of them. The app's own gthread workers
+(gunicorn.conf.py) can serve them too, but there every stream holds one of
+the worker's threads: a process takes at most ``max_streams`` streams,
+leaving the rest of its threads for page requests, and further viewers are
+refused and retry later.
+"""
+import json
+import threading
+import time
+
+import sqlalchemy as sa
+
+from catalog import dataset_table
+from deltas import delta_table
+from inventory_db import InventoryQueries, summary_table
+from layout import LAYOUT_COLUMNS, stock_level
+
+POLL_INTERVAL = 0.5  # Seconds between revision checks of a viewed dataset
+BATCH_INTERVAL = 0.25  # Minimum seconds between two events of one stream
+KEEPALIVE_INTERVAL = 15  # Seconds of silence before a comment line, which also detects closed streams
+MAX_PENDING = 5000  # Changed positions a viewer may have waiting before it has to resync
+MAX_STREAMS = 4  # Open streams per process (LIVE_MAX_STREAMS in app.py)
+RETRY_INTERVAL = 30  # Seconds a refused viewer waits before trying again
+
+
+def _event_text(name, payload):
+    return f"event: {name}\nid: {payload['revision']}\ndata: {json.dumps(payload, separators=(',', ':'))}\n\n"
+
+
+class ShelfEvent:
+    """One event for a dataset's viewers, encoded once and sent to all of them.
+
+    ``changes`` maps positions to ``(shelf, product, quantity)``, None for an
+    emptied position. Without ``changes`` it is a ``resync`` event.
+    """
+
+    def __init__(self, revision, total, changes=None):
+        self.revision = revision
+        self.total = total
+        self.changes = changes
+        self.resync = changes is None
+        if self.resync:
+            self.text = _event_text('resync', {'revision': revision, 'total': total})
+            return
+        positions = sorted(changes)
+        shelves = [changes[position] or (None, None, None) for position in positions]
+        shelf, product, quantity = (list(values) for values in zip(*shelves)) if shelves else ([], [], [])
+        self.text = _event_text('shelves', {
+            'revision': revision,
+            'total': total,
+            'positions': positions,
+            'columns': {'shelf': shelf, 'product': product, 'quantity': quantity,
+                        'level': [stock_level(value) for value in quantity]},
+        })
+
+
+class Viewer:
+    """One open stream: the feed's events it hasn't sent yet."""
+
+    def __init__(self, feed, max_pending):
+        self.feed = feed
+        self.max_pending = max_pending
+        self.condition = threading.Condition()
+        self.pending = []  # ShelfEvents, shared with the feed's other viewers
+        self.queued = 0  # Changed positions in them
+        self.closed = False
+
+    def push(self, event):
+        # Called by the feed thread; never waits for the client
+        with self.condition:
+            resyncing = self.pending and self.pending[0].resync
+            if event.resync or resyncing or self.queued + len(event.changes) > self.max_pending:
+                self.pending = [event if event.resync else ShelfEvent(event.revision, event.total)]
+                self.queued = 0
+            else:
+                self.pending.append(event)
+                self.queued += len(event.changes)
+            self.condition.notify()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+    def next_event(self, timeout):
+        """Text of the next event, or None after ``timeout`` seconds without changes."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.pending or self.closed, timeout)
+            if self.closed or not self.pending:
+                return None
+            pending, self.pending, self.queued = self.pending, [], 0
+        if len(pending) == 1:
+            return pending[0].text
+        # Fell behind by a few events: one event with the latest state of each position
+        changes = {}
+        for event in pending:
+            changes.update(event.changes)
+        return ShelfEvent(pending[-1].revision, pending[-1].total, changes).text
+
+
+class ShelfFeed:
+    """Changed shelves of one dataset, read once and shared by its viewers."""
+
+    def __init__(self, live, engine, dataset_id, revision):
+        self.live = live
+        self.engine = engine
+        self.dataset_id = dataset_id
+        self.revision = revision
+        self.total = None  # Positions in the layout, as of the last change read
+        self.viewers = set()
+        self.wake = threading.Event()
+        self.queries = InventoryQueries(engine, dataset_id, LAYOUT_COLUMNS)
+        self.thread = threading.Thread(target=self._run, name=f'shelf-feed-{dataset_id}', daemon=True)
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.live.poll_interval)
+            self.wake.clear()
+            with self.live.lock:
+                if not self.viewers:
+                    # Last viewer left: stop, the next one starts a new feed
+                    del self.live.feeds[self.dataset_id]
+                    return
+            try:
+                event = self._read()
+            except sa.exc.SQLAlchemyError:
+                continue  # Tried again on the next poll
+            if event is None:
+                continue
+            with self.live.lock:
+                # Viewers that subscribe from now on start at the new revision
+                self.revision, self.total = event.revision, event.total
+                viewers = list(self.viewers)
+            for viewer in viewers:
+                viewer.push(event)
+
+    def _read(self):
+        with self.engine.connect() as conn:
+            revision = conn.execute(sa.select(dataset_table.c.revision)
+                                    .where(dataset_table.c.id == self.dataset_id)).scalar()
+            if revision is None or revision == self.revision:
+                return None
+            logged = conn.execute(
+                sa.select(delta_table.c.revision, delta_table.c.positions)
+                .where(delta_table.c.dataset_id == self.dataset_id, delta_table.c.revision > self.revision,
+                       delta_table.c.revision <= revision)
+                .order_by(delta_table.c.revision)).all()
+            total = conn.execute(sa.select(summary_table.c.slots)
+                                 .where(summary_table.c.dataset_id == self.dataset_id)).scalar()
+        previous = self.revision
+        # Deltas that were compacted away before we saw them: their positions are unknown
+        if [row.revision for row in logged] != list(range(previous + 1, revision + 1)) \
+                or any(row.positions is None for row in logged):
+            return ShelfEvent(revision, total)
+        positions = sorted({position for row in logged for position in json.loads(row.positions)})
+        shelves = self.queries.shelves(positions)
+        return ShelfEvent(revision, total, {position: shelves.get(position) for position in positions})
+
+
+class LiveShelves:
+    """Feeds of the datasets viewed in this process, started and stopped with their viewers."""
+
+    def __init__(self, poll_interval=POLL_INTERVAL, max_pending=MAX_PENDING, max_streams=MAX_STREAMS):
+        self.poll_interval = poll_interval
+        self.max_pending = max_pending
+        self.max_streams = max_streams
+        self.lock = threading.Lock()
+        self.feeds = {}
+        self.streams = 0
+
+    def subscribe(self, engine, dataset_id, revision, since=None):
+        """A new viewer of ``dataset_id``, currently at ``revision``.
+
+        ``since`` is the revision the client's data is from; a viewer whose
+        data is older than the feed's starts with a ``resync`` event. Returns
+        None when this process already has ``max_streams`` open streams.
+        """
+        with self.lock:
+            if self.streams >= self.max_streams:
+                return None
+            self.streams += 1
+            feed = self.feeds.get(dataset_id)
+            if feed is None:
+                feed = self.feeds[dataset_id] = ShelfFeed(self, engine, dataset_id, revision)
+                feed.thread.start()
+            viewer = Viewer(feed, self.max_pending)
+            feed.viewers.add(viewer)
+            current, total = feed.revision, feed.total
+        if since is not None and since < current:
+            viewer.push(ShelfEvent(current, total))
+        return viewer
+
+    def unsubscribe(self, viewer):
+        # Once per viewer, however often it is called
+        with self.lock:
+            if viewer in viewer.feed.viewers:
+                viewer.feed.viewers.discard(viewer)
+                self.streams -= 1
+
+    def notify(self, dataset_id):
+        """Check ``dataset_id`` now rather than at the next poll, after a delta applied in this process."""
+        with self.lock:
+            feed = self.feeds.get(dataset_id)
+        if feed is not None:
+            feed.wake.set()
+
+    def close(self):
+        """End every open stream and refuse new ones, when the process is shutting down."""
+        with self.lock:
+            self.max_streams = 0
+            viewers = [viewer for feed in self.feeds.values() for viewer in feed.viewers]
+        for viewer in viewers:
+            viewer.close()
+
+    def close_when(self, stopped, interval=0.5):
+        """Call ``close`` from a watcher thread as soon as ``stopped()`` is true.
+
+        For gunicorn workers (see the server configs): streams never end on
+        their own, and would hold up a graceful shutdown until its timeout.
+        """
+        def watch():
+            while not stopped():
+                time.sleep(interval)
+            self.close()
+
+        threading.Thread(target=watch, name='close-live-streams', daemon=True).start()
+
+    def stats(self):
+        with self.lock:
+            return {dataset_id: len(feed.viewers) for dataset_id, feed in self.feeds.items()}
+
+
+def event_stream(live, viewer, batch_interval=BATCH_INTERVAL, keepalive=KEEPALIVE_INTERVAL):
+    """Server-sent event lines for one viewer, until the client goes away."""
+    try:
+        yield f'retry: {int(keepalive * 1000)}\n\n'
+        while True:
+            event = viewer.next_event(keepalive)
+            if viewer.closed:
+                return
+            if event is None:
+                yield ': keepalive\n\n'
+                continue
+            yield event
+            # Changes that arrive meanwhile go out together in the next event
+            time.sleep(batch_interval)
+    finally:
+        live.unsubscribe(viewer)
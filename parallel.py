@@ -0,0 +1,181 @@
+"""Partitioned analytics on a pool of worker processes.
+
+Analytics over a whole dataset (per-product trend fits, report KPIs, the
+correlation heatmap) split their rows into partitions, compute a partial result
+per partition in a worker process and merge the partials. The columns they
+need are copied once into shared memory (``SharedColumns``); workers attach
+to those buffers by name instead of each receiving a pickled copy of the
+rows. Text columns travel as int32 codes plus their distinct values.
+
+Partitions are either contiguous row ranges, for results that merge in row
+order, or groups of keys (``code % partitions`` of a text column such as
+``Product Name`` or ``Warehouse Section``), so every product or section is
+handled by exactly one worker and partials merge by concatenation. Datasets
+under ``MIN_PARALLEL_ROWS`` rows run in the calling process, where starting
+workers would cost more than it saves.
+
+Pools are forked from the calling process, so they are only meant for
+background job processes, which run one job at a time on a single thread.
+Web requests pass ``workers=1`` and compute in their own thread.
+"""
+import multiprocessing.util
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+MIN_PARALLEL_ROWS = 200000
+# Pool size for workers=None. Every process that runs analytics keeps its own pool, so
+# the default stays small however many CPUs there are (see gunicorn.conf.py)
+DEFAULT_WORKERS = 2
+
+_pools = {}
+
+
+def worker_count(workers=None):
+    """``workers`` processes: up to DEFAULT_WORKERS for None, all CPUs for a negative count."""
+    if workers is None:
+        return min(DEFAULT_WORKERS, os.cpu_count() or 1)
+    if workers < 0:
+        return os.cpu_count() or 1
+    return max(1, workers)
+
+
+def _pool(workers):
+    # One pool per process and size, started on first use and kept for later calls
+    key = (os.getpid(), workers)  # Forked children (job workers) start their own
+    if key not in _pools:
+        pool = _pools[key] = ProcessPoolExecutor(workers)
+        # Stopped before a multiprocessing child waits for its own children on exit, and
+        # before the pool's queues are closed (their finalizers use priority 10)
+        multiprocessing.util.Finalize(pool, pool.shutdown, exitpriority=100)
+    return _pools[key]
+
+
+class Columns:
+    """Columns of a DataFrame as NumPy arrays, text columns as codes into ``uniques``."""
+
+    def __init__(self, arrays, uniques, rows):
+        self.arrays = arrays
+        self.uniques = uniques
+        self.rows = rows
+
+    @classmethod
+    def from_frame(cls, df, columns=None, keys=()):
+        """``columns`` of ``df`` (all by default); ``keys`` are coded even when numeric."""
+        arrays, uniques = {}, {}
+        for column in df.columns if columns is None else columns:
+            values = df[column]
+            if column not in keys and pd.api.types.is_numeric_dtype(values) \
+                    and not isinstance(values.dtype, pd.CategoricalDtype):
+                arrays[column] = values.to_numpy(dtype=np.float64, na_value=np.nan)
+            else:
+                codes, distinct = pd.factorize(values)  # Missing values get code -1
+                arrays[column] = codes.astype(np.int32)
+                uniques[column] = np.asarray(distinct, dtype=object)
+        return cls(arrays, uniques, len(df))
+
+    def rows_of(self, partition):
+        """Row positions (or a slice) of a partition from ``row_ranges`` or ``key_groups``."""
+        if partition[0] == 'range':
+            return slice(partition[1], partition[2])
+        _, column, partitions, part = partition
+        return np.flatnonzero(self.arrays[column] % partitions == part)
+
+    def decode(self, column, codes):
+        return np.where(codes >= 0, self.uniques[column][codes], np.nan)
+
+    def frame(self, rows=slice(None)):
+        """A DataFrame of ``rows`` with text columns decoded."""
+        data = {}
+        for column, array in self.arrays.items():
+            values = array[rows]
+            data[column] = self.decode(column, values) if column in self.uniques else values
+        return pd.DataFrame(data)
+
+    def close(self):
+        pass
+
+
+class SharedColumns(Columns):
+    """``Columns`` whose arrays live in shared memory; pickled as the names of the buffers."""
+
+    def __init__(self, columns):
+        self._blocks = {}
+        self._owner = True
+        arrays = {}
+        try:
+            for column, array in columns.arrays.items():
+                block = self._blocks[column] = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+                arrays[column] = np.ndarray(array.shape, array.dtype, buffer=block.buf)
+                arrays[column][:] = array
+        except Exception:
+            self.close()
+            raise
+        super().__init__(arrays, columns.uniques, columns.rows)
+
+    def __getstate__(self):
+        layout = {column: (self._blocks[column].name, array.dtype.str, array.shape)
+                  for column, array in self.arrays.items()}
+        return {'layout': layout, 'uniques': self.uniques, 'rows': self.rows}
+
+    def __setstate__(self, state):
+        self._blocks, self._owner, self.arrays = {}, False, {}
+        for column, (name, dtype, shape) in state['layout'].items():
+            block = self._blocks[column] = shared_memory.SharedMemory(name=name)
+            self.arrays[column] = np.ndarray(shape, dtype, buffer=block.buf)
+        self.uniques, self.rows = state['uniques'], state['rows']
+
+    def close(self):
+        # Views must go before their buffers can be closed
+        self.arrays = {}
+        for block in self._blocks.values():
+            block.close()
+            if self._owner:
+                block.unlink()
+        self._blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def row_ranges(rows, partitions):
+    bounds = np.linspace(0, rows, partitions + 1).astype(np.int64)
+    return [('range', int(start), int(stop)) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+
+def key_groups(column, partitions):
+    return [('keys', column, partitions, part) for part in range(partitions)]
+
+
+def _run(func, columns, partition, args):
+    try:
+        return func(columns, partition, *args)
+    finally:
+        columns.close()
+
+
+def map_partitions(func, columns, args=(), by=None, workers=None):
+    """Partials ``func(columns, partition, *args)``, one per partition, in partition order.
+
+    Rows are partitioned by ranges, or by the key groups of text column
+    ``by``, one partition per worker. ``func`` must be a module-level
+    function and must not return views of the columns it was given.
+    """
+    workers = worker_count(workers) if columns.rows >= MIN_PARALLEL_ROWS else 1
+    partitions = key_groups(by, workers) if by is not None else row_ranges(columns.rows, workers)
+    if len(partitions) <= 1:
+        return [func(columns, partition, *args) for partition in partitions or [('range', 0, 0)]]
+    with SharedColumns(columns) as shared:
+        try:
+            return list(_pool(workers).map(_run, repeat(func), repeat(shared), partitions, repeat(args)))
+        except BrokenProcessPool:
+            _pools.pop((os.getpid(), workers), None)  # A worker died, the next call starts a new pool
+            raise
@@ -0,0 +1,147 @@
+"""PDF version of the warehouse report, rendered in-process.
+
+The PDF is laid out with matplotlib's PDF backend from the stored report KPIs
+(see kpis.py) and the cached trend chart (see chart_cache.py), so producing
+one needs neither the dataset rows nor an HTML renderer. Rendered reports
+are cached per dataset version in the PDF folder.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.image as mpimg
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
+
+from instrumentation import span
+
+# Bump when the PDF layout changes so cached reports are re-rendered
+PDF_REVISION = 1
+
+PAGE_SIZE = (8.27, 11.69)  # A4 portrait, inches
+LINES_PER_PAGE = 48
+MAX_LISTED_PRODUCTS = 2000  # Slow movers listed in full up to this many
+
+# The PDF's built-in Helvetica: nothing to lay out glyph by glyph or embed, which makes
+# text pages several times faster to write. It only covers Latin-1 text.
+CORE_FONT_RC = {
+    'pdf.use14corefonts': True,
+    'font.family': 'sans-serif',
+    'font.sans-serif': ['Helvetica'],
+}
+# Line styles with the core font (Helvetica's regular face is "medium") and with the default one
+CORE_FONT_STYLES = {'heading': {'weight': 'bold'}, 'regular': {'weight': 'medium'},
+                    'note': {'weight': 'medium', 'style': 'italic'}}
+DEFAULT_STYLES = {'heading': {'weight': 'bold'}, 'regular': {}, 'note': {'style': 'italic'}}
+
+KPI_LABELS = [
+    ('most_stocked_product', 'Most Stocked Product'),
+    ('total_stock', 'Total Stock Available'),
+    ('most_valuable_product', 'Most Valuable Product (Revenue)'),
+    ('least_valuable_product', 'Least Valuable Product (Revenue)'),
+    ('most_profitable_product', 'Most Profitable Product (Margin)'),
+    ('least_profitable_product', 'Least Profitable Product (Margin)'),
+    ('best_selling_product', 'Best Selling Product'),
+    ('worst_selling_product', 'Worst Selling Product'),
+]
+
+
+def report_pdf_path(pdf_folder, filename, version):
+    digest = hashlib.sha256(f'{PDF_REVISION}:{version}'.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(pdf_folder, f'report_{filename}.{digest}.pdf')
+
+
+def _text_page(pdf, title, lines, styles):
+    fig = plt.figure(figsize=PAGE_SIZE)
+    fig.text(0.08, 0.94, title, fontsize=16, weight='bold')
+    line_height = 0.8 / LINES_PER_PAGE
+    # One text block per run of equally styled lines, far cheaper to lay out than a block per line
+    i = 0
+    while i < len(lines):
+        j = i
+        while j < len(lines) and lines[j][1] == lines[i][1]:
+            j += 1
+        fig.text(0.08, 0.90 - i * line_height, '\n'.join(text for text, _ in lines[i:j]),
+                 fontsize=10, va='top', linespacing=line_height * PAGE_SIZE[1] * 72 / 10,  # In font sizes
+                 **styles[lines[i][1]])
+        i = j
+    pdf.savefig(fig)
+    plt.close(fig)
+
+
+def _latin1(texts):
+    try:
+        for text in texts:
+            text.encode('latin-1')
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def render_report_pdf(kpis, out, title, chart_path=None):
+    """Write the report for ``kpis`` to ``out`` (a path or binary file)."""
+    lines = []
+    for key, label in KPI_LABELS:
+        lines.append((label, 'heading'))
+        lines.append((f"    {kpis[key]}", 'regular'))
+    slow = kpis['slow_moving_products']
+    lines.append((f"Slow-Moving Products ({len(slow)})", 'heading'))
+
+    listed = [(f"    {product}", 'regular') for product in slow[:MAX_LISTED_PRODUCTS]]
+    if len(slow) > MAX_LISTED_PRODUCTS:
+        listed.append((f"    ... and {len(slow) - MAX_LISTED_PRODUCTS} more", 'note'))
+    lines += listed or [("    None", 'regular')]
+
+    # Anything outside Latin-1 needs the default embedded font
+    core_font = _latin1([title] + [text for text, _ in lines])
+    styles = CORE_FONT_STYLES if core_font else DEFAULT_STYLES
+    with plt.rc_context(CORE_FONT_RC if core_font else {}), PdfPages(out, metadata={'Title': title, 'Creator': 'TwinWare'}) as pdf:
+        for start in range(0, len(lines), LINES_PER_PAGE):
+            _text_page(pdf, title if start == 0 else f"{title} (continued)", lines[start:start + LINES_PER_PAGE],
+                       styles)
+
+        if chart_path is not None:
+            fig = plt.figure(figsize=PAGE_SIZE)
+            fig.text(0.08, 0.94, 'Sales Trend', fontsize=16, weight='bold')
+            ax = fig.add_axes([0.05, 0.3, 0.9, 0.6])
+            ax.imshow(mpimg.imread(chart_path))
+            ax.axis('off')
+            pdf.savefig(fig)
+            plt.close(fig)
+    return out
+
+
+def cached_report_pdf(pdf_folder, filename, version, kpis_loader, chart_loader=None):
+    """Path of the report PDF for this dataset version, rendering it if missing.
+
+    ``kpis_loader()`` returns the KPIs and ``chart_loader()`` the trend chart
+    path (or None); both are only called when the PDF has to be rendered.
+    Reports of older versions of the same dataset are removed.
+    """
+    path = report_pdf_path(pdf_folder, filename, version)
+    if os.path.exists(path):
+        return path
+
+    fd, tmp_path = tempfile.mkstemp(suffix='.pdf.tmp', dir=pdf_folder)
+    os.close(fd)
+    try:
+        kpis, chart_path = kpis_loader(), chart_loader() if chart_loader else None
+        with span('pdf') as render:
+            render_report_pdf(kpis, tmp_path, f"TwinWare Warehouse Report: {filename}", chart_path)
+            render.nbytes = os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    stale = re.compile(re.escape(f'report_{filename}.') + r'[0-9a-f]{16}\.pdf')
+    for entry in os.scandir(pdf_folder):
+        if stale.fullmatch(entry.name) and entry.path != path:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+    return path
@@ -0,0 +1,151 @@
+"""Replenishment planning: what to order, from which supplier, and by when.
+
+Every SKU (``Product_ID``, or ``Product Name`` in files without IDs) gets a
+daily demand rate: its own sales volume over ``period_days``, scaled by its
+product's demand forecast (see forecast_registry.py) relative to the
+product's average. Then, for all SKUs in one vectorized pass:
+
+* days of cover is stock on hand over daily demand, which gives the
+  projected stockout date;
+* the reorder point is the demand over the supplier lead time, and never
+  less than ``Reorder_Level``. SKUs at or below it are ordered up to a
+  further ``review_days`` of demand;
+* once a supplier gets an order, its other SKUs that would run out before
+  the next review are topped up on the same purchase order, so each
+  supplier is ordered from once per review period;
+* with a warehouse capacity, the order volume (from ``Storage Space (cubic
+  ft)`` per unit on hand) is capped at the free space, filling the SKUs
+  closest to a stockout first. What doesn't fit is reported as deferred.
+
+Order lines are grouped into one purchase order per ``Supplier_Name``.
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+REQUIRED_COLUMNS = ['Product Name', 'Quantity Available', 'Reorder_Level', 'Total Sales Volume']
+LEAD_DAYS = 7  # Days between placing an order and stocking it
+REVIEW_DAYS = 14  # Days between two orders to the same supplier
+# Days of sales a row's Total Sales Volume stands for: a year, as Stock Turnover Rate (sales over stock) is annual
+DEMAND_PERIOD_DAYS = 365
+MAX_COVER_DAYS = 36500  # No stockout date beyond this
+
+# Optional columns, and how several rows of one SKU combine
+_SKU_COLUMNS = {
+    'Product Name': 'first',
+    'Supplier_Name': 'first',
+    'Quantity Available': 'sum',
+    'Reorder_Level': 'sum',
+    'Total Sales Volume': 'sum',
+    'Storage Space (cubic ft)': 'sum',
+    'Purchase_Price': 'first',
+}
+PLAN_COLUMNS = ['Product_ID', 'Product Name', 'Supplier_Name', 'Quantity Available', 'Reorder_Level',
+                'Daily Demand', 'Days of Cover', 'Stockout Date', 'Reorder Point', 'Order Quantity',
+                'Deferred Quantity', 'Order Volume (cubic ft)', 'Order Cost']
+
+
+def _skus(df):
+    key = 'Product_ID' if 'Product_ID' in df.columns else 'Product Name'
+    aggregations = {column: how for column, how in _SKU_COLUMNS.items() if column in df.columns and column != key}
+    if df[key].is_unique:  # One row per SKU, as in uploaded inventories
+        return df[[key] + list(aggregations)].reset_index(drop=True)
+    return df.groupby(key, sort=False, dropna=False, observed=True).agg(aggregations).reset_index()
+
+
+def _column(skus, name, default=np.nan):
+    if name not in skus.columns:
+        return np.full(len(skus), default, dtype=np.float64)
+    return pd.to_numeric(skus[name], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def plan_replenishment(df, trends=None, capacity=None, today=None, lead_days=LEAD_DAYS, review_days=REVIEW_DAYS,
+                       period_days=DEMAND_PERIOD_DAYS):
+    """Order lines for the SKUs of ``df`` that need stock, and their purchase orders.
+
+    ``trends`` holds per-product forecasts (``n`` and ``prediction`` indexed
+    by product name, see ``ForecastRegistry.product_trends``); without them
+    demand follows past sales. ``capacity`` is the warehouse's storage in
+    cubic feet, None for no limit. Returns ``(lines, orders)``: lines with
+    ``PLAN_COLUMNS``, most urgent first, and one row per supplier.
+    """
+    today = pd.Timestamp(today or date.today())
+    skus = _skus(df)
+    quantity = np.nan_to_num(_column(skus, 'Quantity Available'))
+    reorder_level = np.nan_to_num(_column(skus, 'Reorder_Level'))
+    sales = np.nan_to_num(_column(skus, 'Total Sales Volume'))
+
+    # The product's forecast for its next row, relative to its average row, scales each SKU's own rate
+    factor = np.ones(len(skus))
+    if trends is not None and not trends.empty:
+        average = df.groupby('Product Name', sort=False, observed=True)['Total Sales Volume'].mean()
+        forecast = trends['prediction'].where(trends['n'] >= 2).clip(lower=0)
+        ratio = (forecast / average.reindex(forecast.index)).replace([np.inf, -np.inf], np.nan)
+        factor = skus['Product Name'].map(ratio).to_numpy(dtype=np.float64, na_value=np.nan)
+        factor = np.where(np.isnan(factor), 1.0, factor)
+    daily = sales * factor / period_days
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cover = np.where(daily > 0, quantity / daily, np.inf)
+    reorder_point = np.maximum(reorder_level, daily * lead_days)
+    due = quantity <= reorder_point
+    if 'Supplier_Name' in skus.columns:
+        supplier_due = pd.Series(due).groupby(skus['Supplier_Name'].to_numpy(), dropna=False).transform('any')
+        supplier_due = supplier_due.to_numpy(dtype=bool)
+    else:
+        supplier_due = np.full(len(skus), due.any())
+    ordered = due | (supplier_due & (cover < lead_days + review_days))
+    order_up_to = reorder_point + daily * review_days
+    wanted = np.where(ordered, np.ceil(np.maximum(order_up_to - quantity, 0)), 0)
+
+    # Space a unit takes, from the space the stock on hand takes; the median where that's unknown
+    storage = _column(skus, 'Storage Space (cubic ft)')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        unit_space = np.where(quantity > 0, storage / quantity, np.nan)
+    known = ~np.isnan(unit_space)
+    unit_space = np.where(known, unit_space, np.median(unit_space[known]) if known.any() else 0.0)
+
+    order = wanted
+    if capacity is not None:
+        free = max(float(capacity) - float(np.nansum(storage)), 0.0)
+        urgency = np.argsort(cover, kind='stable')
+        volume = (wanted * unit_space)[urgency]
+        # Space left for each SKU after the more urgent ones before it
+        fits = np.clip(free - (np.cumsum(volume) - volume), 0, volume)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            allowed = np.where(unit_space[urgency] > 0, np.floor(fits / unit_space[urgency] + 1e-9), wanted[urgency])
+        order = np.empty_like(wanted)
+        order[urgency] = np.minimum(allowed, wanted[urgency])
+
+    days = np.where(cover < MAX_COVER_DAYS, np.floor(cover), np.nan)
+    stockout = np.datetime64(today.date(), 'D') + days.astype('timedelta64[D]')  # NaN days are NaT
+    lines = pd.DataFrame({
+        'Product_ID': skus['Product_ID'] if 'Product_ID' in skus.columns else None,
+        'Product Name': skus['Product Name'],
+        'Supplier_Name': skus['Supplier_Name'] if 'Supplier_Name' in skus.columns else None,
+        'Quantity Available': quantity,
+        'Reorder_Level': reorder_level,
+        'Daily Demand': daily,
+        'Days of Cover': np.where(np.isinf(cover), np.nan, cover),
+        'Stockout Date': stockout.astype('datetime64[ns]'),
+        'Reorder Point': reorder_point,
+        'Order Quantity': order,
+        'Deferred Quantity': wanted - order,
+        'Order Volume (cubic ft)': order * unit_space,
+        'Order Cost': order * np.nan_to_num(_column(skus, 'Purchase_Price')),
+    })[PLAN_COLUMNS]
+    lines = lines[wanted > 0].round({'Daily Demand': 3, 'Days of Cover': 1, 'Reorder Point': 1,
+                                      'Order Volume (cubic ft)': 2, 'Order Cost': 2})
+    lines = lines.sort_values(['Stockout Date', 'Days of Cover'], kind='stable', na_position='last')
+
+    ordered_lines = lines.assign(Ordered=lines['Order Quantity'] > 0)
+    orders = ordered_lines.groupby('Supplier_Name', sort=False, dropna=False, observed=True).agg(
+        Lines=('Ordered', 'sum'),
+        Units=('Order Quantity', 'sum'),
+        Volume=('Order Volume (cubic ft)', 'sum'),
+        Cost=('Order Cost', 'sum'),
+        Deferred=('Deferred Quantity', 'sum'),
+        First_Stockout=('Stockout Date', 'min'),
+    ).reset_index().sort_values('First_Stockout', kind='stable', na_position='last')
+    return lines.reset_index(drop=True), orders.reset_index(drop=True)
@@ -0,0 +1,20 @@
+"""Warehouse report calculations shared by the report page, exports and PDFs."""
+
+REPORT_COLUMNS = [
+    'Product Name', 'Purchase_Price', 'Selling_Price', 'Total Sales Volume', 'Total Revenue',
+    'Profit per Unit', 'Profit Margin (%)', 'Stock Turnover Rate', 'Quantity Available',
+]
+
+# Columns the report reads; derived ones are computed when the file lacks them
+SOURCE_COLUMNS = REPORT_COLUMNS + ['Storage Space (cubic ft)']
+
+
+def add_derived_columns(df):
+    """Add the report's derived columns to ``df`` in place when missing."""
+    if 'Profit per Unit' not in df.columns:
+        df['Profit per Unit'] = df['Selling_Price'] - df['Purchase_Price']
+    if 'Profit Margin (%)' not in df.columns:
+        df['Profit Margin (%)'] = ((df['Selling_Price'] - df['Purchase_Price']) / df['Selling_Price']) * 100
+    if 'Stock Turnover Rate' not in df.columns:
+        df['Stock Turnover Rate'] = df['Total Sales Volume'] / df['Quantity Available']
+    return df
@@ -0,0 +1,240 @@
+"""Inventory search index, built while a dataset is ingested.
+
+Every indexed text column is dictionary-encoded: each distinct value gets an
+id and a posting list of the rows holding it (stored CSR-style, rows grouped
+by value id). Substring search over ``Product Name``, ``Category`` and
+``Supplier_Name`` goes through a trigram index over the distinct values, so
+only values sharing the query's trigrams are ever compared. Categorical
+columns (shelf, section, order status) match whole values. Numeric columns
+keep their row ids sorted by value and answer range queries with a binary
+search.
+
+Each filter yields a sorted array of row positions; combined filters are
+intersected through a boolean mask, so a query costs time proportional to
+the matching rows rather than to the dataset. The index is saved next to the
+dataset as ``cleaned_<name>.index.npz`` together with the dataset version it
+was built from.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from storage import dataset_columns, dataset_version, read_dataset, search_index_path
+
+# Query parameter -> column
+TEXT_FIELDS = {'product': 'Product Name', 'category': 'Category', 'supplier': 'Supplier_Name'}
+EXACT_FIELDS = {'shelf': 'Shelf Number', 'section': 'Warehouse Section', 'status': 'Order_Status'}
+RANGE_FIELDS = {'quantity': 'Quantity Available', 'reorder_level': 'Reorder_Level',
+                'price': 'Selling_Price', 'sales': 'Total Sales Volume'}
+DICTIONARY_FIELDS = dict(TEXT_FIELDS, **EXACT_FIELDS)
+INDEXED_COLUMNS = list(DICTIONARY_FIELDS.values()) + list(RANGE_FIELDS.values())
+
+NGRAM = 3
+
+
+class SearchError(ValueError):
+    pass
+
+
+def _trigrams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+def _csr(keys, count):
+    """Positions grouped by key (ascending within each key) and per-key offsets."""
+    valid = np.flatnonzero(keys >= 0)
+    order = np.argsort(keys[valid], kind='stable')
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys[valid], minlength=count), out=offsets[1:])
+    return valid[order], offsets
+
+
+class SearchIndexBuilder:
+    """Accumulates index data from cleaned chunks, in row order."""
+
+    def __init__(self):
+        self.rows = 0
+        self._value_ids = {}  # field -> {value: id}
+        self._codes = {}  # field -> [per-chunk value-id arrays]
+        self._numbers = {}  # field -> [per-chunk float arrays]
+
+    def add(self, chunk):
+        for field, column in DICTIONARY_FIELDS.items():
+            if column not in chunk.columns:
+                continue
+            ids = self._value_ids.setdefault(field, {})
+            codes, uniques = pd.factorize(chunk[column])
+            lookup = np.array([ids.setdefault(str(value), len(ids)) for value in uniques], dtype=np.int32)
+            value_ids = np.full(len(codes), -1, dtype=np.int32)  # -1 = missing value
+            value_ids[codes >= 0] = lookup[codes[codes >= 0]]
+            self._codes.setdefault(field, []).append(value_ids)
+        for field, column in RANGE_FIELDS.items():
+            if column in chunk.columns:
+                values = pd.to_numeric(chunk[column], errors='coerce').to_numpy(dtype=np.float64)
+                self._numbers.setdefault(field, []).append(values)
+        self.rows += len(chunk)
+
+    def build(self):
+        arrays = {'rows': np.array(self.rows, dtype=np.int64)}
+        for field, ids in self._value_ids.items():
+            values = np.array(list(ids), dtype=str)
+            codes = np.concatenate(self._codes[field])
+            arrays[f'{field}.values'] = values
+            arrays[f'{field}.rows'], arrays[f'{field}.offsets'] = _csr(codes, len(values))
+            if field in TEXT_FIELDS:
+                grams, value_ids = [], []
+                for value_id, value in enumerate(np.char.lower(values) if len(values) else values):
+                    for gram in _trigrams(str(value)):
+                        grams.append(gram)
+                        value_ids.append(value_id)
+                gram_codes, gram_names = pd.factorize(pd.Series(grams, dtype=object), sort=True)
+                arrays[f'{field}.grams'] = np.array(gram_names, dtype=str)
+                postings, arrays[f'{field}.gram_offsets'] = _csr(gram_codes, len(gram_names))
+                arrays[f'{field}.gram_values'] = np.asarray(value_ids, dtype=np.int32)[postings]
+        for field, chunks in self._numbers.items():
+            values = np.concatenate(chunks)
+            order = np.argsort(values, kind='stable')  # NaN sorts last and never matches a range
+            arrays[f'{field}.order'] = order
+            arrays[f'{field}.sorted'] = values[order]
+        return SearchIndex(arrays)
+
+
+class SearchIndex:
+    def __init__(self, arrays, version=None):
+        self.arrays = arrays
+        self.version = version
+        self.rows = int(arrays['rows'])
+        self._lower = {}
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+
+    @classmethod
+    def from_frame(cls, df):
+        builder = SearchIndexBuilder()
+        builder.add(df)
+        return builder.build()
+
+    def save(self, path, version):
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, version=np.array(version), **self.arrays)
+        os.replace(tmp_path, path)
+        self.version = version
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+        return cls(arrays, version=str(arrays.pop('version')))
+
+    def has_field(self, field):
+        return f'{field}.values' in self.arrays or f'{field}.order' in self.arrays
+
+    def _values_lower(self, field):
+        if field not in self._lower:
+            self._lower[field] = np.char.lower(self.arrays[f'{field}.values'])
+        return self._lower[field]
+
+    def _rows_for_values(self, field, value_ids):
+        offsets, rows = self.arrays[f'{field}.offsets'], self.arrays[f'{field}.rows']
+        if len(value_ids) == 1:
+            return rows[offsets[value_ids[0]]:offsets[value_ids[0] + 1]]
+        return np.sort(np.concatenate([rows[offsets[i]:offsets[i + 1]] for i in value_ids] or [rows[:0]]))
+
+    def _contains(self, field, text):
+        """Ids of the distinct values of ``field`` containing ``text`` (case-insensitive)."""
+        lower = self._values_lower(field)
+        if len(text) < NGRAM:
+            return np.flatnonzero(np.char.find(lower, text) >= 0)
+        grams, offsets = self.arrays[f'{field}.grams'], self.arrays[f'{field}.gram_offsets']
+        postings = self.arrays[f'{field}.gram_values']
+        candidates = None
+        for gram in _trigrams(text):
+            i = np.searchsorted(grams, gram)
+            if i == len(grams) or grams[i] != gram:
+                return np.empty(0, dtype=np.int64)
+            ids = postings[offsets[i]:offsets[i + 1]]
+            candidates = ids if candidates is None else np.intersect1d(candidates, ids, assume_unique=True)
+        # Trigrams can all occur without the query occurring as a whole
+        return np.array([i for i in candidates if text in lower[i]], dtype=np.int64)
+
+    def text_rows(self, field, text):
+        return self._rows_for_values(field, self._contains(field, text.lower()))
+
+    def exact_rows(self, field, values):
+        lower = self._values_lower(field)
+        wanted = [value.strip().lower() for value in values]
+        return self._rows_for_values(field, np.flatnonzero(np.isin(lower, wanted)))
+
+    def range_rows(self, field, low=None, high=None):
+        sorted_values, order = self.arrays[f'{field}.sorted'], self.arrays[f'{field}.order']
+        start = 0 if low is None else np.searchsorted(sorted_values, low, side='left')
+        stop = np.searchsorted(sorted_values, np.inf if high is None else high, side='right')
+        return np.sort(order[start:stop])
+
+    def any_text_rows(self, text):
+        """Rows where any indexed text field contains ``text``."""
+        matches = [self.text_rows(field, text) for field in TEXT_FIELDS if self.has_field(field)]
+        return np.unique(np.concatenate(matches)) if matches else np.empty(0, dtype=np.int64)
+
+    def search(self, query=None, text=None, exact=None, ranges=None):
+        """Sorted row positions matching every given filter.
+
+        ``query`` is matched against all text fields, ``text`` maps text fields
+        to substrings, ``exact`` maps categorical fields to lists of accepted
+        values and ``ranges`` maps numeric fields to ``(low, high)`` bounds
+        (either may be None).
+        """
+        results = []
+        if query:
+            results.append(self.any_text_rows(query))
+        for field, value in (text or {}).items():
+            self._require(field, TEXT_FIELDS)
+            results.append(self.text_rows(field, value))
+        for field, values in (exact or {}).items():
+            self._require(field, EXACT_FIELDS)
+            results.append(self.exact_rows(field, values))
+        for field, (low, high) in (ranges or {}).items():
+            self._require(field, RANGE_FIELDS)
+            results.append(self.range_rows(field, low, high))
+        if not results:
+            return np.arange(self.rows)
+
+        # Narrow the smallest result down with a row mask per other filter
+        results.sort(key=len)
+        matches = results[0]
+        for rows in results[1:]:
+            if not len(matches):
+                break
+            mask = np.zeros(self.rows, dtype=bool)
+            mask[rows] = True
+            matches = matches[mask[matches]]
+        return matches
+
+    def _require(self, field, fields):
+        if field not in fields:
+            raise SearchError(f"Unknown search field: {field}")
+        if not self.has_field(field):
+            raise SearchError(f"This dataset has no {fields[field]} column to search.")
+
+
+def load_search_index(csv_path):
+    """The dataset's saved index, rebuilt from the dataset if it is missing or stale."""
+    path = search_index_path(csv_path)
+    version = dataset_version(csv_path)
+    try:
+        index = SearchIndex.load(path)
+        if index.version == version:
+            return index
+    except (OSError, ValueError, KeyError):
+        pass
+    # Datasets ingested before indexing existed are indexed on first search
+    columns = [column for column in INDEXED_COLUMNS if column in dataset_columns(csv_path)]
+    index = SearchIndex.from_frame(read_dataset(csv_path, columns))
+    try:
+        index.save(path, version)
+    except OSError:
+        pass  # Read-only storage: serve the in-memory index
+    return index
@@ -0,0 +1,260 @@
+// Canvas renderer for the 2D warehouse layout pages.
+// Shelves are laid out in a grid of tiles; only the tiles in view are drawn,
+// and their data is fetched page by page from the shelf data API. With
+// follow(), changed shelves are pushed by the server and patched in place.
+
+const TILE_WIDTH = 120;
+const TILE_HEIGHT = 78;
+const TILE_GAP = 10;
+const PAGE_SIZE = 500;
+const MAX_CACHED_PAGES = 40;
+const LIVE_RETRY_MS = 30000;  // After the server refused the stream (503, too many open)
+
+const STOCK_COLORS = {
+    low: { fill: "#ffcccc", stroke: "#bc2929" },
+    middle: { fill: "#fff4cc", stroke: "#e6a627" },
+    sufficient: { fill: "#ccffcc", stroke: "#40bd40" },
+    plain: { fill: "#f9f9f9", stroke: "#cccccc" },
+    highlight: { fill: "yellow", stroke: "#b8a200" },
+    anomaly: "#7b2cbf",  // Badge of shelves flagged by the anomaly scores
+};
+
+function stockLevel(quantity) {
+    if (quantity < 10) return "low";
+    if (quantity < 20) return "middle";
+    return "sufficient";
+}
+
+class ShelfCanvas {
+    // options.colorByStock: fill tiles by stock level (the search page keeps them plain)
+    constructor(viewport, shelvesUrl, options = {}) {
+        this.viewport = viewport;
+        this.shelvesUrl = shelvesUrl;
+        this.colorByStock = options.colorByStock !== false;
+        this.total = 0;
+        this.revision = null;  // Dataset revision of the first page, where live updates start
+        this.pages = new Map();  // page index -> {columns} or a pending Promise
+        this.highlighted = new Set();
+        this.flagged = new Set();
+
+        this.spacer = document.createElement("div");
+        this.canvas = document.createElement("canvas");
+        this.canvas.style.position = "absolute";
+        this.canvas.style.left = "0";
+        this.viewport.style.position = "relative";
+        this.viewport.style.overflowY = "auto";
+        this.viewport.append(this.canvas, this.spacer);
+        this.context = this.canvas.getContext("2d");
+
+        this.viewport.addEventListener("scroll", () => this.requestDraw());
+        window.addEventListener("resize", () => this.requestDraw());
+    }
+
+    async load() {
+        await this.fetchPage(0);
+        this.requestDraw();
+    }
+
+    get columns() {
+        return Math.max(1, Math.floor((this.viewport.clientWidth + TILE_GAP) / (TILE_WIDTH + TILE_GAP)));
+    }
+
+    fetchPage(page) {
+        if (this.pages.has(page)) return this.pages.get(page);
+        const url = `${this.shelvesUrl}?offset=${page * PAGE_SIZE}&limit=${PAGE_SIZE}`;
+        const pending = fetch(url, { credentials: "same-origin" })
+            .then(response => {
+                if (!response.ok) throw new Error(`Shelf data request failed (${response.status})`);
+                return response.json();
+            })
+            .then(data => {
+                // A live update made this request stale while it was under way
+                if (this.pages.get(page) !== pending) return data;
+                this.total = data.total;
+                if (this.revision === null) this.revision = data.revision;
+                this.pages.set(page, data);
+                this.evictPages(page);
+                this.requestDraw();
+                return data;
+            })
+            .catch(error => {
+                this.pages.delete(page);  // Retried on the next draw
+                console.error(error);
+            });
+        this.pages.set(page, pending);
+        return pending;
+    }
+
+    follow(liveUrl) {
+        // The browser reconnects by itself and sends the last event's revision
+        this.events = new EventSource(`${liveUrl}?since=${this.revision ?? 0}`);
+        this.events.addEventListener("shelves", event => this.applyChanges(JSON.parse(event.data)));
+        this.events.addEventListener("resync", event => this.resync(JSON.parse(event.data)));
+        this.events.onerror = () => {
+            // The browser only gives up on refused streams; those are tried again later
+            if (this.events.readyState === EventSource.CLOSED) setTimeout(() => this.follow(liveUrl), LIVE_RETRY_MS);
+        };
+    }
+
+    applyChanges(update) {
+        this.revision = update.revision;
+        if (update.total !== null) this.total = update.total;
+        update.positions.forEach((position, i) => {
+            const index = Math.floor(position / PAGE_SIZE);
+            const page = this.pages.get(index);
+            if (page instanceof Promise) this.pages.delete(index);  // Refetched with the change
+            if (!page || page instanceof Promise) return;
+            const offset = position - page.offset;
+            for (const field of ["shelf", "product", "quantity"]) {
+                const values = page.columns[field];
+                while (values.length < offset) values.push(null);  // New shelves past the end of the page
+                values[offset] = update.columns[field][i];
+            }
+        });
+        this.requestDraw();
+    }
+
+    resync(update) {
+        // Too many changes to send: the pages in view are fetched again
+        this.revision = update.revision;
+        if (update.total !== null) this.total = update.total;
+        this.pages.clear();
+        this.requestDraw();
+    }
+
+    evictPages(keep) {
+        // Map iteration follows insertion order, so the oldest pages go first
+        for (const page of this.pages.keys()) {
+            if (this.pages.size <= MAX_CACHED_PAGES) break;
+            if (page !== keep) this.pages.delete(page);
+        }
+    }
+
+    shelfAt(position) {
+        const page = this.pages.get(Math.floor(position / PAGE_SIZE));
+        if (!page || page instanceof Promise) return null;
+        const i = position - page.offset;
+        return {
+            shelf: page.columns.shelf[i],
+            product: page.columns.product[i],
+            quantity: page.columns.quantity[i],
+        };
+    }
+
+    requestDraw() {
+        if (this.drawPending) return;
+        this.drawPending = true;
+        window.requestAnimationFrame(() => {
+            this.drawPending = false;
+            this.draw();
+        });
+    }
+
+    draw() {
+        const columns = this.columns;
+        const rowHeight = TILE_HEIGHT + TILE_GAP;
+        const rows = Math.ceil(this.total / columns);
+        this.spacer.style.height = `${rows * rowHeight}px`;
+
+        const width = this.viewport.clientWidth;
+        const height = this.viewport.clientHeight;
+        const scale = window.devicePixelRatio || 1;
+        this.canvas.width = width * scale;
+        this.canvas.height = height * scale;
+        this.canvas.style.width = `${width}px`;
+        this.canvas.style.height = `${height}px`;
+        this.canvas.style.top = `${this.viewport.scrollTop}px`;
+
+        const ctx = this.context;
+        ctx.setTransform(scale, 0, 0, scale, 0, 0);
+        ctx.clearRect(0, 0, width, height);
+
+        // Center the grid like the old flex layout did
+        const left = (width - (columns * (TILE_WIDTH + TILE_GAP) - TILE_GAP)) / 2;
+        const firstRow = Math.floor(this.viewport.scrollTop / rowHeight);
+        const lastRow = Math.min(rows - 1, Math.floor((this.viewport.scrollTop + height) / rowHeight));
+        const first = firstRow * columns;
+        const last = Math.min(this.total - 1, (lastRow + 1) * columns - 1);
+
+        for (let page = Math.floor(first / PAGE_SIZE); page <= Math.floor(last / PAGE_SIZE); page++) {
+            if (!this.pages.has(page)) this.fetchPage(page);
+        }
+        for (let position = first; position <= last; position++) {
+            const x = left + (position % columns) * (TILE_WIDTH + TILE_GAP);
+            const y = Math.floor(position / columns) * rowHeight - this.viewport.scrollTop;
+            this.drawTile(ctx, x, y, position, this.shelfAt(position));
+        }
+    }
+
+    drawTile(ctx, x, y, position, item) {
+        let colors = STOCK_COLORS.plain;
+        if (this.highlighted.has(position)) {
+            colors = STOCK_COLORS.highlight;
+        } else if (item && item.quantity !== null && this.colorByStock) {
+            colors = STOCK_COLORS[stockLevel(item.quantity)];
+        }
+        ctx.fillStyle = colors.fill;
+        ctx.strokeStyle = colors.stroke;
+        ctx.beginPath();
+        ctx.roundRect(x + 0.5, y + 0.5, TILE_WIDTH - 1, TILE_HEIGHT - 1, 8);
+        ctx.fill();
+        ctx.stroke();
+        if (!item) return;  // Page still loading
+        if (item.shelf === null && item.product === null) return;  // Position of a deleted row
+        if (this.flagged.has(position)) this.drawBadge(ctx, x + TILE_WIDTH - 12, y + 12);
+
+        ctx.textAlign = "center";
+        ctx.fillStyle = "#333";
+        ctx.font = "bold 13px Poppins, sans-serif";
+        ctx.fillText(this.fit(ctx, `Shelf ${item.shelf}`), x + TILE_WIDTH / 2, y + 22);
+        ctx.fillStyle = "#555";
+        ctx.font = "11px Poppins, sans-serif";
+        ctx.fillText(this.fit(ctx, `Product: ${item.product}`), x + TILE_WIDTH / 2, y + 44);
+        ctx.fillText(this.fit(ctx, `Quantity: ${item.quantity}`), x + TILE_WIDTH / 2, y + 62);
+    }
+
+    drawBadge(ctx, x, y) {
+        ctx.fillStyle = STOCK_COLORS.anomaly;
+        ctx.beginPath();
+        ctx.arc(x, y, 7, 0, 2 * Math.PI);
+        ctx.fill();
+        ctx.fillStyle = "white";
+        ctx.font = "bold 11px Poppins, sans-serif";
+        ctx.textAlign = "center";
+        ctx.fillText("!", x, y + 4);
+    }
+
+    fit(ctx, text) {
+        const maxWidth = TILE_WIDTH - 12;
+        if (ctx.measureText(text).width <= maxWidth) return text;
+        while (text.length > 1 && ctx.measureText(text + "…").width > maxWidth) {
+            text = text.slice(0, -1);
+        }
+        return text + "…";
+    }
+
+    flag(positions) {
+        // Anomalous shelves keep their stock colour and get a badge
+        this.flagged = new Set(positions);
+        this.requestDraw();
+    }
+
+    highlight(positions) {
+        this.highlighted = new Set(positions);
+        if (positions.length) this.scrollTo(positions[0]);
+        this.requestDraw();
+    }
+
+    scrollTo(position) {
+        const row = Math.floor(position / this.columns);
+        this.viewport.scrollTop = row * (TILE_HEIGHT + TILE_GAP);
+    }
+
+    downloadPNG(filename) {
+        // Exports the shelves currently in view
+        const link = document.createElement("a");
+        link.href = this.canvas.toDataURL("image/png");
+        link.download = filename;
+        link.click();
+    }
+}
@@ -0,0 +1,289 @@
+"""On-disk layout of cleaned datasets.
+
+Alongside every ``cleaned_<name>.csv`` the upload pipeline writes
+``cleaned_<name>.parquet`` with a stored schema and dictionary-encoded string
+columns, and ``cleaned_<name>.meta.json`` with dataset metadata such as the
+file encoding. Readers load only the columns they ask for, memory-mapping the
+Parquet file, and fall back to the CSV when the Parquet copy is missing or
+stale (or when pyarrow isn't installed).
+"""
+import codecs
+import io
+import json
+import os
+
+import pandas as pd
+
+from instrumentation import span
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional, CSV remains the source of truth
+    pa = None
+    pq = None
+
+# Low-cardinality text columns stored as Arrow dictionaries
+DICTIONARY_COLUMNS = [
+    'Product Name', 'Category', 'Supplier_Name', 'Warehouse Section',
+    'Order_Status', 'Shelf Number',
+]
+
+SCHEMA_METADATA_KEY = b'digital_twin.source'
+
+# Encoding detection never looks at more than this many bytes
+ENCODING_SAMPLE_BYTES = 64 * 1024
+_DETECT_BLOCK_BYTES = 8 * 1024
+
+
+def columnar_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.parquet'
+
+
+def search_index_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.index.npz'
+
+
+def anomalies_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.anomalies.npz'
+
+
+def kpis_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.kpis.json'
+
+
+def metadata_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.meta.json'
+
+
+def read_metadata(csv_path):
+    try:
+        with open(metadata_path(csv_path), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_metadata(csv_path, **fields):
+    path = metadata_path(csv_path)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(fields, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+def detect_encoding(file_path, sample_bytes=ENCODING_SAMPLE_BYTES):
+    """Detect a file's text encoding from a bounded sample of its first bytes."""
+    with open(file_path, 'rb') as f:
+        sample = f.read(sample_bytes)
+    with span('detect_encoding', nbytes=len(sample)):
+        return _detect_encoding(sample)
+
+
+def _detect_encoding(sample, fallback='latin-1'):
+    # Fast path: ASCII/UTF-8 (by far the common case) needs no statistical detection.
+    # final=False tolerates a multi-byte character cut off at the end of the sample.
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    from chardet import UniversalDetector  # Only needed for files that aren't UTF-8
+    detector = UniversalDetector()
+    for start in range(0, len(sample), _DETECT_BLOCK_BYTES):
+        detector.feed(sample[start:start + _DETECT_BLOCK_BYTES])
+        if detector.done:
+            break
+    detector.close()
+    # latin-1 decodes any byte sequence, so reading never fails outright
+    return detector.result.get('encoding') or fallback
+
+
+class DecodingReader(io.TextIOBase):
+    """Text of a binary file in ``encoding``, switching encodings where it stops decoding.
+
+    Detection only samples the start of a file, so a file can turn out not to
+    be in the detected encoding halfway through. From the first bytes that
+    don't decode, the rest is read in the encoding detected on them, with
+    undecodable bytes replaced (cp1252 if nothing is detected).
+    ``encodings`` lists the encodings used, in order.
+    """
+
+    def __init__(self, raw, encoding):
+        self.raw = raw
+        self.encodings = [encoding]
+        # utf-8-sig drops a byte order mark, as reading the bytes with encoding='utf-8' does
+        self._decoder = codecs.getincrementaldecoder('utf-8-sig' if codecs.lookup(encoding).name == 'utf-8'
+                                                     else encoding)()
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        size = -1 if size is None else size
+        while True:
+            data = self.raw.read(size)
+            text = self._decode(data, final=not data or size < 0)
+            if text or not data:  # An empty string is the end of the file
+                return text
+
+    def _decode(self, data, final):
+        if len(self.encodings) == 1:
+            pending = self._decoder.getstate()[0]
+            try:
+                return self._decoder.decode(data, final=final)
+            except UnicodeDecodeError:
+                data = pending + data
+            # Bytes up to the first bad one are still text in the old encoding
+            try:
+                codecs.decode(data, self.encodings[0])
+                start = len(data)
+            except UnicodeDecodeError as e:
+                start = e.start
+            text = codecs.decode(data[:start], self.encodings[0])
+            data = data[start:]
+            encoding = _detect_encoding(data[:ENCODING_SAMPLE_BYTES], fallback='cp1252')
+            if codecs.lookup(encoding).name == codecs.lookup(self.encodings[0]).name:
+                encoding = 'cp1252'
+            self.encodings.append(encoding)
+            self._decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+            return text + self._decoder.decode(data, final=final)
+        return self._decoder.decode(data, final=final)
+
+
+def dataset_encoding(csv_path):
+    """Encoding recorded at upload time, detected from a sample for older files."""
+    return read_metadata(csv_path).get('encoding') or detect_encoding(csv_path)
+
+
+def dataset_version(csv_path):
+    """Token that changes whenever the cleaned file is rewritten."""
+    st = os.stat(csv_path)
+    return f"{st.st_mtime_ns}-{st.st_size}"
+
+
+def has_columnar(csv_path):
+    # Only trust the Parquet copy if it was written after the CSV
+    if pq is None:
+        return False
+    path = columnar_path(csv_path)
+    if not os.path.exists(path):
+        return False
+    return not os.path.exists(csv_path) or os.path.getmtime(path) >= os.path.getmtime(csv_path)
+
+
+def _arrow_schema(df):
+    # Fixed int32 dictionary indices, so chunks with different category counts share one schema
+    fields = []
+    for field in pa.Schema.from_pandas(df, preserve_index=False):
+        if field.name in DICTIONARY_COLUMNS and (pa.types.is_string(field.type) or pa.types.is_dictionary(field.type)):
+            field = field.with_type(pa.dictionary(pa.int32(), pa.string()))
+        fields.append(field)
+    return pa.schema(fields, metadata=pa.Schema.from_pandas(df, preserve_index=False).metadata)
+
+
+class ColumnarWriter:
+    """Incrementally writes the Parquet copy of a cleaned CSV, one chunk at a time.
+
+    The file is written under a temporary name (ending in ``tmp_suffix``) and
+    only moved into place by ``close()``, so readers never see a half-written
+    dataset. Without pyarrow every method is a no-op and ``path`` stays None.
+    """
+
+    def __init__(self, csv_path, tmp_suffix='.tmp'):
+        self.csv_path = csv_path
+        self.path = columnar_path(csv_path) if pq is not None else None
+        self._tmp_path = self.path + tmp_suffix if self.path else None
+        self._writer = None
+        self._schema = None
+
+    def write(self, df):
+        if self.path is None:
+            return
+        if self._writer is None:
+            schema = _arrow_schema(df)
+            metadata = dict(schema.metadata or {})
+            metadata[SCHEMA_METADATA_KEY] = os.path.basename(self.csv_path).encode('utf-8')
+            self._schema = schema.with_metadata(metadata)
+            self._writer = pq.ParquetWriter(self._tmp_path, self._schema,
+                                            compression='snappy', use_dictionary=True)
+        table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is None:
+            return None
+        self._writer.close()
+        self._writer = None
+        os.replace(self._tmp_path, self.path)
+        return self.path
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._tmp_path and os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+def write_columnar(df, csv_path):
+    """Write the Parquet copy of a cleaned CSV. Returns its path, or None without pyarrow."""
+    writer = ColumnarWriter(csv_path)
+    writer.write(df)
+    return writer.close()
+
+
+def dataset_columns(file_path):
+    """Column names of a dataset without loading its rows."""
+    if has_columnar(file_path):
+        return pq.read_schema(columnar_path(file_path)).names
+    if file_path.endswith('.csv'):
+        return pd.read_csv(file_path, nrows=0, encoding=dataset_encoding(file_path)).columns.tolist()
+    return pd.read_excel(file_path, nrows=0).columns.tolist()
+
+
+def iter_dataset(file_path, chunk_rows, columns=None):
+    """Yield a dataset in frames of at most ``chunk_rows`` rows, in row order.
+
+    Like ``read_dataset``, but only one chunk is in memory at a time.
+    """
+    if columns is not None:
+        available = dataset_columns(file_path)
+        columns = [column for column in columns if column in available]
+
+    if has_columnar(file_path):
+        for batch in pq.ParquetFile(columnar_path(file_path), memory_map=True).iter_batches(chunk_rows, columns=columns):
+            with span('parse', 'parquet', rows=batch.num_rows):
+                chunk = batch.to_pandas()
+            yield chunk
+    elif file_path.endswith('.csv'):
+        yield from pd.read_csv(file_path, encoding=dataset_encoding(file_path), usecols=columns, chunksize=chunk_rows)
+    else:
+        yield read_dataset(file_path, columns)
+
+
+def read_dataset(file_path, columns=None):
+    """Load a dataset, restricted to ``columns`` when given.
+
+    Requested columns that the file doesn't have are skipped, so callers can
+    keep their own "missing column" checks.
+    """
+    if columns is not None:
+        available = dataset_columns(file_path)
+        columns = [column for column in columns if column in available]
+
+    if has_columnar(file_path):
+        with span('read', 'parquet') as read:
+            table = pq.read_table(columnar_path(file_path), columns=columns, memory_map=True)
+            read.nbytes = table.nbytes
+        with span('parse', 'parquet', rows=table.num_rows):
+            return table.to_pandas()
+    with span('parse', 'csv' if file_path.endswith('.csv') else 'excel', nbytes=os.path.getsize(file_path)) as parse:
+        if file_path.endswith('.csv'):
+            chunks = pd.read_csv(file_path, encoding=dataset_encoding(file_path), usecols=columns, chunksize=10000)
+            df = pd.concat(chunks)
+        else:
+            df = pd.read_excel(file_path, usecols=columns)
+        parse.rows = len(df)
+    return df[columns] if columns is not None else df
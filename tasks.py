@@ -0,0 +1,170 @@
+"""Units of work run by the background job queue (see jobs.py).
+
+Tasks run in worker processes that don't load the Flask app, so they take
+plain paths and values and return JSON-serialisable results. A result may
+carry ``file`` (sent to the user as a download) and ``flash`` messages
+(``[message, category]`` pairs shown when the user collects the result).
+"""
+import os
+
+from instrumentation import span
+from jobs import engine_for
+from storage import iter_dataset, read_dataset, dataset_version
+
+
+def ingest_upload(source_path, cleaned_path, chunk_rows, dataset_id=None, load_inventory=False, anomaly_jobs=None,
+                  history_dir=None, observed_at=None, progress=None, db_uri=None):
+    from anomalies import load_anomalies
+    from catalog import ColumnStats, mark_failed, mark_ready
+    from history import HistoryBuilder
+    from ingest import ingest_csv
+    from forecast_registry import ForecastRegistry, ForecastStats, has_forecast_columns
+    from inventory_db import InventoryLoader
+    from kpis import ReportKPIs, save_kpis
+    from search_index import SearchIndexBuilder
+    from storage import search_index_path
+
+    # Demand forecasts, the search index, report KPIs and catalog statistics are built from the same
+    # chunks as they are cleaned
+    column_stats = ColumnStats()
+    forecast_stats = ForecastStats()
+    search_index = SearchIndexBuilder()
+    report_kpis = ReportKPIs()
+    # The upload is also a snapshot in the history of its dataset, see history.py
+    history = HistoryBuilder(observed_at) if history_dir is not None else None
+    # With INVENTORY_SQL the rows also go into the database, see inventory_db.py
+    inventory = None
+    if load_inventory and db_uri is not None and dataset_id is not None:
+        inventory = InventoryLoader(engine_for(db_uri), dataset_id)
+
+    def on_chunk(chunk):
+        column_stats.add(chunk)
+        if has_forecast_columns(chunk.columns):
+            forecast_stats.add(chunk)
+        search_index.add(chunk)
+        report_kpis.add(chunk)
+        if history is not None:
+            history.add(chunk)
+        if inventory is not None:
+            inventory.add(chunk)
+
+    try:
+        with span('ingest', 'csv', nbytes=os.path.getsize(source_path)) as ingest:
+            summary = ingest_csv(source_path, cleaned_path, chunk_rows=chunk_rows, progress=progress, on_chunk=on_chunk)
+            ingest.rows = summary['rows_in']
+        search_index.build().save(search_index_path(cleaned_path), dataset_version(cleaned_path))
+        save_kpis(cleaned_path, report_kpis.result())
+        # Needs every row before it can score any, so it runs on the written file
+        load_anomalies(cleaned_path, n_jobs=anomaly_jobs)
+        if history is not None:
+            history.save(history_dir)
+        if db_uri is not None:
+            registry = ForecastRegistry(engine_for(db_uri))
+            registry.save(os.path.basename(cleaned_path), dataset_version(cleaned_path), forecast_stats)
+            if dataset_id is not None:
+                # Catalog entry last: the dataset only becomes visible once everything above exists
+                mark_ready(engine_for(db_uri), dataset_id, summary, column_stats, sql_loaded=inventory is not None)
+    except Exception as e:
+        if inventory is not None:
+            inventory.delete()
+        if db_uri is not None and dataset_id is not None:
+            mark_failed(engine_for(db_uri), dataset_id, str(e) or e.__class__.__name__)
+        raise
+    flash = [['File successfully uploaded and cleaned', 'success']]
+    if summary['rows_dropped']:
+        flash.append([f"{summary['rows_dropped']} of {summary['rows_in']} rows had empty cells or values of the "
+                      "wrong type and were left out.", 'warning'])
+    encodings = summary['source_encoding'].split(', ')
+    if len(encodings) > 1:
+        flash.append([f"Part of the file wasn't valid {encodings[0]} and was read as {encodings[1]}, some "
+                      "characters may be wrong.", 'warning'])
+    if summary['missing_columns']:
+        flash.append(["Some warehouse features need columns this file doesn't have: "
+                      + ", ".join(summary['missing_columns']), 'warning'])
+    return dict(summary, flash=flash)
+
+
+def render_chart(dataset_path, chart_type, x_column, y_column, cache_dir, cache_max_bytes, key, options=None,
+                 workers=None):
+    from chart_cache import ChartCache
+    from charts import chart_columns, render_chart
+
+    def render(path):
+        df = read_dataset(dataset_path, chart_columns(chart_type, x_column, y_column))
+        with span('chart', chart_type, rows=len(df)):
+            render_chart(df, chart_type, x_column, y_column, path, options, workers)
+
+    ChartCache(cache_dir, cache_max_bytes).render(key, render)
+    return {'chart': key}
+
+
+def export_updated_file(dataset_path, updated_path):
+    from reports import add_derived_columns
+
+    df = add_derived_columns(read_dataset(dataset_path))
+    df.to_csv(updated_path, index=False) if updated_path.endswith('.csv') else df.to_excel(updated_path, index=False)
+    return {'file': updated_path}
+
+
+def load_inventory(cleaned_path, dataset_id, chunk_rows=50000, progress=None, db_uri=None, anomaly_jobs=None,
+                   history_dir=None):
+    """Load a dataset cleaned without INVENTORY_SQL into the inventory table.
+
+    Then applies the deltas queued for it while it wasn't loaded, and brings
+    the cleaned files up to date with them.
+    """
+    import sqlalchemy as sa
+    from catalog import dataset_table, mark_loaded
+    from deltas import apply_pending
+    from inventory_db import InventoryLoader
+
+    engine = engine_for(db_uri)
+    with engine.connect() as conn:
+        loaded, row_count = conn.execute(sa.select(dataset_table.c.sql_loaded, dataset_table.c.row_count)
+                                         .where(dataset_table.c.id == dataset_id)).one()
+    rows, flashes = None, []
+    # Already loaded: another job got there first, its rows may already have changed
+    if not loaded:
+        loader = InventoryLoader(engine, dataset_id)
+        try:
+            # One chunk in memory at a time, as while ingesting
+            for chunk in iter_dataset(cleaned_path, chunk_rows):
+                loader.add(chunk)
+                if progress is not None and row_count:
+                    progress(min(loader.rows / row_count, 1.0))
+            mark_loaded(engine, dataset_id)
+        except Exception:
+            loader.delete()
+            raise
+        rows = loader.rows
+        flashes.append(['The dataset is ready for updates.', 'success'])
+
+    applied, errors = apply_pending(engine, dataset_id, os.path.basename(cleaned_path))
+    if applied:
+        compact_dataset(dataset_id, cleaned_path, anomaly_jobs, history_dir, db_uri)
+        flashes.append([f"{len(applied)} queued update(s) applied.", 'success'])
+    flashes += [[f"A queued update was rejected: {error}", 'warning'] for error in errors]
+    return {'rows': rows, 'applied': len(applied), 'flash': flashes}
+
+
+def score_anomalies(cleaned_path, anomaly_jobs=None):
+    """Score a dataset version that has no saved anomaly scores, see anomalies.py."""
+    from anomalies import load_anomalies
+
+    anomalies = load_anomalies(cleaned_path, n_jobs=anomaly_jobs)
+    return {'flagged': None if anomalies is None else len(anomalies.flagged)}
+
+
+def compact_dataset(dataset_id, cleaned_path, anomaly_jobs=None, history_dir=None, db_uri=None):
+    from anomalies import load_anomalies
+    from deltas import compact
+    from history import HISTORY_COLUMNS, HistoryBuilder
+
+    revision = compact(engine_for(db_uri), dataset_id, cleaned_path)
+    load_anomalies(cleaned_path, n_jobs=anomaly_jobs)  # Rescores the new version, if there is one
+    if history_dir is not None:
+        # Only the rows the deltas moved on are new to the history
+        history = HistoryBuilder()
+        history.add(read_dataset(cleaned_path, HISTORY_COLUMNS))
+        history.save(history_dir)
+    return {'revision': revision}
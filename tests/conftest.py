@@ -0,0 +1,71 @@
+"""Fixtures shared by the tests: the Flask app on a scratch database."""
+import io
+import os
+import sys
+import uuid
+
+import pytest
+
+from jobs import InlineBackend
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE = os.path.join(REPO, 'uploads', 'amazon_warehouse.csv')
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """app.py, imported with its database and folders in a scratch directory."""
+    # DATABASE_URL is read and the folders (relative paths) are used from the working directory
+    # app.py is imported in
+    folder = tmp_path_factory.mktemp('app')
+    cwd, database_url = os.getcwd(), os.environ.get('DATABASE_URL')
+    os.environ['DATABASE_URL'] = f"sqlite:///{folder / 'app.db'}"
+    sys.path.insert(0, REPO)
+    os.chdir(folder)
+    try:
+        import app
+        app.init_db()
+        yield app
+    finally:
+        os.chdir(cwd)
+        if database_url is None:
+            os.environ.pop('DATABASE_URL', None)
+        else:
+            os.environ['DATABASE_URL'] = database_url
+
+
+@pytest.fixture
+def user(app_module):
+    app, db = app_module.app, app_module.db
+    with app.app_context():
+        count = app_module.User.query.count()
+        user = app_module.User(name='test', email=f'test{count}@example.com', company_name='test',
+                               warehouse_type='test', password='test', workspace_name='test')
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def client(app_module, user, monkeypatch):
+    """A test client logged in as ``user``, whose jobs run in the request."""
+    # Uploads are not loaded into the inventory table, as without INVENTORY_SQL
+    monkeypatch.setattr(app_module.job_queue, 'backend', InlineBackend())
+    monkeypatch.setitem(app_module.app.config, 'INVENTORY_SQL', False)
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user)
+    return client
+
+
+@pytest.fixture
+def upload(app_module, client):
+    """Uploads the sample CSV as a new dataset, returns its id."""
+    def upload():
+        with open(SAMPLE, 'rb') as f:
+            data = f.read()
+        name = f'{uuid.uuid4().hex}.csv'
+        client.post('/upload_csv', data={'csvFile': (io.BytesIO(data), name)}, content_type='multipart/form-data')
+        with app_module.app.app_context():
+            return app_module.Dataset.query.filter_by(name=name).one().id
+    return upload
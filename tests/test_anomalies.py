@@ -0,0 +1,44 @@
+"""Anomaly scores are fitted by jobs only (see anomalies.py).
+
+A dataset version without saved scores gets a scoring job; the request
+that notices it must not fit the forest itself.
+
+    python -m pytest tests/test_anomalies.py
+"""
+import os
+
+import pytest
+
+import anomalies
+from storage import anomalies_path
+
+
+class RecordingBackend:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, db_uri, job_id, func_path, args, kwargs):
+        self.submitted.append((func_path, args, kwargs))
+
+
+def test_missing_scores_are_left_to_a_job(app_module, client, upload, monkeypatch):
+    dataset_id = upload()
+    with app_module.app.app_context():
+        cleaned_path = app_module.db.session.get(app_module.Dataset, dataset_id).cleaned_path
+    os.remove(anomalies_path(cleaned_path))  # As for a dataset scored before this stage existed
+
+    def fit_forest(*args, **kwargs):
+        pytest.fail("The forest was fitted in the request")
+    backend = RecordingBackend()
+    url = f'/api/shelves/{dataset_id}/anomalies'
+    with monkeypatch.context() as m:
+        m.setattr(anomalies, 'fit_forest', fit_forest)
+        m.setattr(app_module.job_queue, 'backend', backend)
+        assert client.get(url).json == {'total': 0, 'positions': []}
+        assert client.get(url).json == {'total': 0, 'positions': []}
+    # One job, however many requests notice
+    assert [(func_path, args) for func_path, args, _ in backend.submitted] == [('tasks:score_anomalies', [cleaned_path])]
+
+    from tasks import score_anomalies
+    assert score_anomalies(cleaned_path)['flagged'] == 3
+    assert client.get(url).json['total'] == 3
@@ -0,0 +1,34 @@
+"""Column statistics accumulated chunk by chunk (see catalog.ColumnStats).
+
+    python -m pytest tests/test_catalog.py
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from catalog import ColumnStats, QuantileSketch, stats_frame
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      'cleaned_files', 'cleaned_amazon_warehouse.csv')
+
+
+def test_chunked_stats_match_describe():
+    stats = ColumnStats()
+    for chunk in pd.read_csv(SAMPLE, chunksize=64):
+        stats.add(chunk)
+    expected = pd.read_csv(SAMPLE).describe()
+    pd.testing.assert_frame_equal(stats_frame(stats.result()), expected, check_exact=False, rtol=1e-9)
+
+
+def test_sketch_quartiles_stay_close_once_compacted():
+    values = np.random.default_rng(0).lognormal(size=200000)
+    sketch = QuantileSketch(capacity=2000)
+    for start in range(0, len(values), 5000):
+        sketch.add(values[start:start + 5000])
+    assert len(sketch.levels) > 1
+    # Within half a percentile of the exact ones
+    q1, median, q3 = sketch.quantiles([0.25, 0.5, 0.75])
+    assert np.quantile(values, 0.245) <= q1 <= np.quantile(values, 0.255)
+    assert np.quantile(values, 0.495) <= median <= np.quantile(values, 0.505)
+    assert np.quantile(values, 0.745) <= q3 <= np.quantile(values, 0.755)
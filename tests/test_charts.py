@@ -0,0 +1,34 @@
+"""Charts of columns that can't be averaged (see charts.render_chart).
+
+Bars count the rows with a value per category for a text or categorical Y
+column; box and line charts need a numeric one and the form says so.
+
+    python -m pytest tests/test_charts.py
+"""
+import pandas as pd
+
+from chart_data import category_counts
+from charts import render_chart
+from conftest import SAMPLE
+from ingest import compact_frame
+
+
+def test_bar_chart_of_a_categorical_column_counts_rows(tmp_path):
+    df = compact_frame(pd.read_csv(SAMPLE))
+    assert isinstance(df['Supplier_Name'].dtype, pd.CategoricalDtype)
+    counts, truncated = category_counts(df, 'Category', 'Supplier_Name', 50)
+    assert not truncated
+    assert counts.to_dict() == df.dropna(subset=['Supplier_Name'])['Category'].value_counts().to_dict()
+
+    chart_path = tmp_path / 'bar.png'
+    render_chart(df, 'bar', 'Category', 'Supplier_Name', str(chart_path))
+    assert chart_path.stat().st_size
+
+
+def test_box_chart_of_a_text_column_is_refused(app_module, client, upload):
+    dataset_id = upload()
+    r = client.post(f'/visualization/{dataset_id}',
+                    data={'chart_type': 'box', 'x_column': 'Category', 'y_column': 'Supplier_Name'})
+    assert r.status_code == 302
+    with app_module.app.app_context():
+        assert app_module.Job.query.filter_by(kind='chart').count() == 0
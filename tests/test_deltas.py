@@ -0,0 +1,104 @@
+"""Row-level changes to a stored dataset (see deltas.py).
+
+Deltas posted before their dataset is in the inventory table are queued
+behind the job loading it instead of being rejected, and that job applies
+them in the order they arrived. The forecasts a delta updates in place must
+match a fresh fit of the rows it leaves.
+
+    python -m pytest tests/test_deltas.py
+"""
+import os
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+import sqlalchemy as sa
+
+from conftest import SAMPLE
+from forecast_registry import ForecastRegistry, forecast_table
+from forecasting import fit_grouped_trends, solve_trends
+from inventory_db import inventory_table
+from jobs import FAILED, FINISHED, RUNNING
+from storage import dataset_version
+
+
+def test_deltas_wait_for_the_inventory_load(app_module, client, upload, user):
+    db, Dataset, Job = app_module.db, app_module.Dataset, app_module.Job
+    dataset_id = upload()
+    with app_module.app.test_request_context():
+        assert not db.session.get(Dataset, dataset_id).sql_loaded
+        # A load that is still running: the deltas are queued behind it
+        loading = Job(id=uuid.uuid4().hex, kind='inventory', status=RUNNING, progress=0.0, user_id=user,
+                      result_url=app_module.url_for('insights', dataset_id=dataset_id),
+                      created_at=datetime.now(timezone.utc).replace(tzinfo=None),
+                      heartbeat_at=datetime.now(timezone.utc).replace(tzinfo=None))
+        db.session.add(loading)
+        db.session.commit()
+        loading_id = loading.id
+
+    url = f'/api/datasets/{dataset_id}/delta'
+    r = client.post(url, json={'upsert': [{'Product_ID': 1001, 'Quantity Available': 5}]})
+    assert r.status_code == 202
+    assert r.json['job_id'] == loading_id
+    assert r.headers['Retry-After']
+    r = client.post(url, json={'upsert': [{'Product_ID': 1001, 'Quantity Available': 7}], 'delete': [1002]})
+    assert (r.status_code, r.json['job_id']) == (202, loading_id)
+    with app_module.app.app_context():
+        assert app_module.PendingDelta.query.filter_by(dataset_id=dataset_id).count() == 2
+
+    # The load went away: the next delta starts a new one, which applies all three in order
+    with app_module.app.app_context():
+        db.session.get(Job, loading_id).status = FAILED
+        db.session.commit()
+    r = client.post(url, json={'delete': [1003]})
+    assert r.status_code == 202 and r.json['job_id'] != loading_id
+
+    with app_module.app.app_context():
+        job = db.session.get(Job, r.json['job_id'])
+        assert job.status == FINISHED, job.error
+        dataset = db.session.get(Dataset, dataset_id)
+        assert dataset.sql_loaded
+        assert (dataset.revision, dataset.files_revision, dataset.row_count) == (3, 3, 298)
+        assert app_module.PendingDelta.query.filter_by(dataset_id=dataset_id).count() == 0
+        t = inventory_table
+        with db.engine.connect() as conn:
+            quantities = dict(conn.execute(sa.select(t.c.product_id, t.c.quantity).where(
+                t.c.dataset_id == dataset_id, t.c.product_id.in_(['1001', '1002', '1003']))).all())
+        assert quantities == {'1001': 7.0}
+
+
+def test_forecasts_after_inserts_and_deletes_match_a_fresh_fit(app_module, client, upload):
+    dataset_id = upload()
+    new = pd.read_csv(SAMPLE).iloc[5].to_dict()
+    new.update({'Product_ID': 99999, 'Product Name': 'Delta Lamp', 'Total Sales Volume': 4000})
+    # Rows deleted from the middle and the end, one updated, one added
+    r = client.post(f'/api/datasets/{dataset_id}/delta',
+                    json={'delete': [1002, 1300], 'upsert': [{'Product_ID': 1003, 'Total Sales Volume': 900}, new]})
+    assert r.status_code == 202
+
+    db = app_module.db
+    with app_module.app.app_context():
+        dataset = db.session.get(app_module.Dataset, dataset_id)
+        assert dataset.revision == 1
+        name, version = os.path.basename(dataset.cleaned_path), dataset_version(dataset.cleaned_path)
+        t, f = inventory_table, forecast_table
+        with db.engine.connect() as conn:
+            rows = pd.DataFrame(conn.execute(sa.select(t.c.row, t.c.product_name, t.c.sales_volume).where(
+                t.c.dataset_id == dataset_id).order_by(t.c.row)).all(), columns=['x', 'product', 'y'])
+            total = conn.execute(sa.select(f).where(f.c.dataset == name, f.c.product.is_(None))).mappings().one()
+        products = ForecastRegistry(db.engine).product_trends(name, version)
+
+    # The whole series has each row's position as x, gaps included
+    x, y = rows['x'].to_numpy(dtype=np.float64), rows['y'].to_numpy()
+    fresh = solve_trends(pd.DataFrame({'n': [len(x)], 'sum_x': [x.sum()], 'sum_y': [y.sum()], 'sum_xy': [(x * y).sum()],
+                                       'sum_xx': [(x * x).sum()], 'last_x': [x.max()]})).iloc[0]
+    assert x.max() == 300 and len(x) == 299
+    for column in ['n', 'sum_x', 'sum_y', 'sum_xy', 'sum_xx', 'last_x', 'prediction']:
+        assert total[column] == pytest.approx(fresh[column]), column
+    # Products are fitted on their rows in order
+    fresh = fit_grouped_trends(rows['product'], y)
+    assert set(products.index) == set(fresh.index)
+    np.testing.assert_allclose(products['prediction'].to_numpy(dtype=np.float64),
+                               fresh.loc[products.index, 'prediction'].to_numpy(dtype=np.float64))
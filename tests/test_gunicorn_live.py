@@ -0,0 +1,210 @@
+"""Live layout streams under the production server setups.
+
+On the main server (gunicorn.conf.py) each open stream holds one of a
+gthread worker's threads. Beyond LIVE_MAX_STREAMS per process further
+streams must be refused with a 503 while page requests still get a thread,
+and open streams must not hold up a shutdown. The stream server
+(gunicorn.live.conf.py) must hold far more streams than there are threads,
+and send every one of them a delta's changes.
+
+    python -m pytest tests/test_gunicorn_live.py
+"""
+import http.client
+import http.cookiejar
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('gunicorn')
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+THREADS = 4  # LIVE_MAX_STREAMS is half of them on the main server
+STREAMS = 100  # Held open at once on the stream server
+USER = {'name': 'live', 'email': 'live@example.com', 'company_name': 'live', 'warehouse_type': 'live',
+        'password': 'live', 'workspace_name': 'live'}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _start(tmp_path, config, **env):
+    port = _free_port()
+    env = dict(os.environ, PYTHONPATH=REPO, DATABASE_URL=f"sqlite:///{tmp_path / 'app.db'}", WEB_THREADS=str(THREADS),
+               PREWARM='0', **{name: value.format(port=port) for name, value in env.items()})
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', os.path.join(REPO, config), 'wsgi:app'],
+                               cwd=tmp_path, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while True:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/login', timeout=5)
+            return process, port
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError("gunicorn didn't start")
+            time.sleep(0.2)
+
+
+def _stop(process):
+    if process.poll() is None:
+        process.terminate()
+        process.wait(30)
+
+
+@pytest.fixture
+def server(tmp_path):
+    process, port = _start(tmp_path, 'gunicorn.conf.py', BIND='127.0.0.1:{port}', WEB_WORKERS='1')
+    try:
+        yield process, port, tmp_path / 'app.db'
+    finally:
+        _stop(process)
+
+
+@pytest.fixture
+def stream_server(tmp_path):
+    pytest.importorskip('gevent')
+    process, port = _start(tmp_path, 'gunicorn.live.conf.py', LIVE_BIND='127.0.0.1:{port}')
+    try:
+        yield process, port, tmp_path / 'app.db'
+    finally:
+        _stop(process)
+
+
+def _sign_in(port):
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    opener.open(f'http://127.0.0.1:{port}/signup', urllib.parse.urlencode(USER).encode())
+    opener.open(f'http://127.0.0.1:{port}/login',
+                urllib.parse.urlencode({'email': USER['email'], 'password': USER['password']}).encode())
+    return '; '.join(f'{cookie.name}={cookie.value}' for cookie in jar)
+
+
+LAYOUT = [('Product_ID', 'object'), ('Shelf Number', 'object'), ('Product Name', 'object'),
+          ('Quantity Available', 'float64')]
+
+
+def _add_dataset(db_path, rows=0):
+    # A ready dataset with the layout columns; streams only read its revision until a delta arrives
+    schema = json.dumps([{'name': name, 'dtype': dtype} for name, dtype in LAYOUT])
+    with sqlite3.connect(db_path) as conn:
+        owner_id = conn.execute("SELECT id FROM user").fetchone()[0]
+        return conn.execute(
+            "INSERT INTO dataset (owner_id, name, version, status, checksum, schema, row_count, source_path, "
+            "cleaned_path, sql_loaded, revision, files_revision, created_at) "
+            "VALUES (?, 'live.csv', 1, 'ready', ?, ?, ?, '', 'live.csv', ?, 0, 0, ?)",
+            (owner_id, '0' * 64, schema, rows, int(rows > 0), datetime.now().isoformat(' '))).lastrowid
+
+
+def _get(port, path, cookie):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    connection.request('GET', path, headers={'Cookie': cookie})
+    return connection, connection.getresponse()
+
+
+def test_streams_beyond_the_cap_are_refused_and_pages_still_load(server):
+    _, port, db_path = server
+    cookie = _sign_in(port)
+    dataset_id = _add_dataset(db_path)
+    path = f'/api/shelves/{dataset_id}/live?since=0'
+
+    streams = [_get(port, path, cookie) for _ in range(THREADS // 2)]
+    try:
+        for _, response in streams:
+            assert response.status == 200
+            assert response.getheader('Content-Type').startswith('text/event-stream')
+            assert response.readline().startswith(b'retry:')
+
+        for _ in range(3):
+            connection, refused = _get(port, path, cookie)
+            assert refused.status == 503
+            assert refused.getheader('Retry-After')
+            assert 'error' in json.loads(refused.read())
+            connection.close()
+
+        # Threads the streams don't hold still serve pages
+        started = time.monotonic()
+        connection, page = _get(port, '/upload_csv', cookie)
+        assert page.status == 200
+        assert time.monotonic() - started < 5
+        connection.close()
+    finally:
+        for connection, _ in streams:
+            connection.close()
+
+
+def test_open_streams_dont_hold_up_shutdown(server):
+    process, port, db_path = server
+    cookie = _sign_in(port)
+    dataset_id = _add_dataset(db_path)
+    streams = [_get(port, f'/api/shelves/{dataset_id}/live?since=0', cookie) for _ in range(THREADS // 2)]
+    try:
+        assert all(response.status == 200 for _, response in streams)
+        process.terminate()
+        process.wait(10)  # graceful_timeout is 30 s
+    finally:
+        for connection, _ in streams:
+            connection.close()
+
+
+def _read_event(response):
+    # Name and payload of the next event, skipping comments
+    name = None
+    while True:
+        line = response.readline().decode().rstrip('\n')
+        if line.startswith('event: '):
+            name = line[7:]
+        elif line.startswith('data: '):
+            return name, json.loads(line[6:])
+
+
+def test_stream_server_holds_more_streams_than_threads_and_fans_out_deltas(stream_server):
+    sys.path.insert(0, REPO)
+    import pandas as pd
+    import sqlalchemy as sa
+    from deltas import apply_delta, parse_delta
+    from inventory_db import InventoryLoader
+
+    _, port, db_path = stream_server
+    cookie = _sign_in(port)
+    dataset_id = _add_dataset(db_path, rows=10)
+    engine = sa.create_engine(f'sqlite:///{db_path}')
+    InventoryLoader(engine, dataset_id).add(pd.DataFrame({
+        'Product_ID': [str(1001 + i) for i in range(10)], 'Shelf Number': [f'S{i}' for i in range(10)],
+        'Product Name': [f'P{i}' for i in range(10)], 'Quantity Available': [10.0] * 10}))
+
+    streams = [_get(port, f'/api/shelves/{dataset_id}/live?since=0', cookie) for _ in range(STREAMS)]
+    try:
+        for _, response in streams:
+            assert response.status == 200
+            assert response.readline().startswith(b'retry:')
+
+        # Pages are still served with every stream open
+        connection, page = _get(port, '/upload_csv', cookie)
+        assert page.status == 200
+        connection.close()
+
+        upserts, deletes = parse_delta([{'name': name, 'dtype': dtype} for name, dtype in LAYOUT],
+                                       [{'Product_ID': '1003', 'Quantity Available': 2}])
+        revision = apply_delta(engine, dataset_id, 'live.csv', [name for name, _ in LAYOUT], upserts, deletes)['revision']
+        for _, response in streams:
+            name, payload = _read_event(response)
+            assert name == 'shelves'
+            assert payload['revision'] == revision
+            assert payload['positions'] == [2]
+            assert payload['columns']['quantity'] == [2.0]
+    finally:
+        for connection, _ in streams:
+            connection.close()
+        engine.dispose()
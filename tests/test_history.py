@@ -0,0 +1,68 @@
+"""Rollups of the inventory history (see history.py).
+
+Sales volume is a running total and stock a level: a period's sales are
+what the running totals grew by, its stock the last level of every SKU,
+carried forward through periods the SKU wasn't observed in.
+
+    python -m pytest tests/test_history.py
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from history import History, HistoryBuilder
+
+SNAPSHOTS = [
+    # Product_ID, Product Name, Last_Stock_Update, Quantity Available, Total Sales Volume
+    [(1, 'Lamp', '01/06/2025', 50, 100), (2, 'Desk', '01/06/2025', 5, 10)],
+    [(1, 'Lamp', '01/09/2025', 40, 130)],  # Same week as the first one
+    [(2, 'Desk', '01/14/2025', 2, 25)],
+    [(1, 'Lamp', '02/03/2025', 35, 150)],
+]
+
+
+def _history(tmp_path):
+    folder = str(tmp_path / 'history')
+    for rows in SNAPSHOTS:
+        builder = HistoryBuilder(observed_at='2025-03-01')
+        builder.add(pd.DataFrame(rows, columns=['Product_ID', 'Product Name', 'Last_Stock_Update',
+                                                'Quantity Available', 'Total Sales Volume']))
+        builder.save(folder)
+    return History(folder)
+
+
+def _rows(series):
+    return [(str(period.date()), row.observations, None if np.isnan(row.sales) else row.sales, row.quantity)
+            for period, row in series.iterrows()]
+
+
+def test_rollups_take_sales_differences_and_carry_stock_forward(tmp_path):
+    history = _history(tmp_path)
+    assert _rows(history.rollup('weekly')) == [
+        ('2025-01-06', 3, 30.0, 45.0),  # Lamp sold 30 between its two snapshots and has 40 left, Desk 5
+        ('2025-01-13', 1, 15.0, 42.0),
+        ('2025-02-03', 1, 20.0, 37.0),
+    ]
+    assert _rows(history.rollup('daily', end='2025-01-31')) == [
+        ('2025-01-06', 2, None, 55.0),  # No sales known before a SKU's first observation
+        ('2025-01-09', 1, 30.0, 45.0),
+        ('2025-01-14', 1, 15.0, 42.0),
+    ]
+    # Reading February only, the level before it comes from the monthly changes
+    assert _rows(history.rollup('weekly', start='2025-02-01')) == [('2025-02-03', 1, 20.0, 37.0)]
+    assert _rows(history.rollup('weekly', start='2025-02-01', product='Desk')) == []
+    assert _rows(history.rollup('weekly', start='2025-01-13', product='Lamp')) == [('2025-02-03', 1, 20.0, 35.0)]
+
+
+def test_rollups_of_an_older_history_are_rebuilt(tmp_path):
+    history = _history(tmp_path)
+    expected = history.rollup('weekly')
+    with open(history.meta_path, encoding='utf-8') as f:
+        meta = json.load(f)
+    del meta['rollups']
+    with open(history.meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    (tmp_path / 'history' / 'weekly-levels.npz').unlink()
+    pd.testing.assert_frame_equal(history.rollup('weekly'), expected)
+    assert history.meta()['rollups'] == 2
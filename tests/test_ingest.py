@@ -0,0 +1,23 @@
+"""Cleaning uploads whose encoding changes after the sample it is detected from (see ingest.py).
+
+    python -m pytest tests/test_ingest.py
+"""
+import pandas as pd
+
+from conftest import SAMPLE
+from ingest import ingest_csv
+from storage import ENCODING_SAMPLE_BYTES
+
+
+def test_bytes_past_the_detection_sample_that_arent_utf8_fall_back(tmp_path):
+    with open(SAMPLE, 'rb') as f:
+        header, *rows = f.read().splitlines()
+    copies = ENCODING_SAMPLE_BYTES // sum(len(row) + 1 for row in rows) + 1
+    last = rows[1].replace(b'Hand Mixer', 'Café Mixer'.encode('cp1252'))
+    source = tmp_path / 'upload.csv'
+    source.write_bytes(b'\n'.join([header] + rows * copies + [last]) + b'\n')
+
+    summary = ingest_csv(str(source), str(tmp_path / 'cleaned.csv'), chunk_rows=100)
+    assert summary['source_encoding'].startswith('utf-8, ')
+    assert summary['rows_in'] == len(rows) * copies + 1
+    assert pd.read_csv(tmp_path / 'cleaned.csv')['Product Name'].iloc[-1] == 'Café Mixer'
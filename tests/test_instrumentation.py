@@ -0,0 +1,38 @@
+"""Who may profile requests and read /metrics (see instrumentation.py).
+
+    python -m pytest tests/test_instrumentation.py
+"""
+import os
+
+from instrumentation import prune_profiles
+
+
+def test_only_profile_users_are_profiled(app_module, client, user, monkeypatch, tmp_path):
+    monkeypatch.setitem(app_module.app.config, 'PROFILE_FOLDER', str(tmp_path))
+    r = client.get('/cache_stats', headers={'X-Profile': '1'})
+    assert r.status_code == 200 and 'X-Profile-File' not in r.headers
+
+    with app_module.app.app_context():
+        email = app_module.db.session.get(app_module.User, user).email
+    monkeypatch.setitem(app_module.app.config, 'PROFILE_USERS', {email})
+    r = client.get('/cache_stats', headers={'X-Profile': '1'})
+    assert os.listdir(tmp_path) == [r.headers['X-Profile-File']]
+
+
+def test_only_the_newest_profiles_are_kept(tmp_path):
+    for i in range(5):
+        (tmp_path / f'20261018-1200{i:02d}-000000-index.folded').write_text('index (app.py:1) 1\n')
+    prune_profiles(str(tmp_path), 2)
+    assert sorted(os.listdir(tmp_path)) == ['20261018-120003-000000-index.folded', '20261018-120004-000000-index.folded']
+
+
+def test_metrics_need_the_token_or_a_local_client(app_module, monkeypatch):
+    client = app_module.app.test_client()
+    assert client.get('/metrics').status_code == 200
+    assert client.get('/metrics', headers={'X-Forwarded-For': '203.0.113.7'}).status_code == 403
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.7'}).status_code == 403
+
+    monkeypatch.setitem(app_module.app.config, 'METRICS_TOKEN', 's3cret')
+    assert client.get('/metrics').status_code == 403
+    r = client.get('/metrics', headers={'Authorization': 'Bearer s3cret'}, environ_base={'REMOTE_ADDR': '203.0.113.7'})
+    assert r.status_code == 200 and b'# TYPE' in r.data
@@ -0,0 +1,82 @@
+"""Jobs orphaned by a worker restart or crash (see jobs.py).
+
+A queued or running job whose process went away stops beating. Once it has
+been silent for JOB_STALE_AFTER it must be failed, so the routes that reuse
+a waiting or running job of the same kind start a new one instead, and an
+upload's dataset must not stay "processing" forever.
+
+    python -m pytest tests/test_jobs.py
+"""
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from jobs import FAILED, ORPHANED, QUEUED, RUNNING, Heartbeat
+
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _dataset(app_module, user_id, status):
+    dataset = app_module.Dataset(owner_id=user_id, name=f'{uuid.uuid4().hex}.csv', version=1, status=status,
+                                 checksum='0' * 64, source_path='', cleaned_path='', created_at=_now())
+    app_module.db.session.add(dataset)
+    app_module.db.session.commit()
+    return dataset
+
+
+def _job(app_module, kind, status, dataset, heartbeat_at, user_id):
+    with app_module.app.test_request_context():
+        result_url = app_module.url_for('insights', dataset_id=dataset.id)
+    job = app_module.Job(id=uuid.uuid4().hex, kind=kind, status=status, progress=0.0, user_id=user_id,
+                         result_url=result_url, created_at=_now() - timedelta(hours=1), heartbeat_at=heartbeat_at)
+    app_module.db.session.add(job)
+    app_module.db.session.commit()
+    return job.id
+
+
+def test_orphaned_jobs_are_failed_and_stop_blocking_new_ones(app_module, user):
+    Job = app_module.Job
+    with app_module.app.test_request_context():
+        dataset = _dataset(app_module, user, 'ready')
+        orphan = _job(app_module, 'inventory', RUNNING, dataset, _now() - timedelta(hours=1), user)
+        alive = _job(app_module, 'compact', QUEUED, dataset, _now(), user)
+
+        assert app_module._dataset_job('inventory', dataset, [QUEUED, RUNNING]) is None
+        job = app_module.db.session.get(Job, orphan)
+        assert (job.status, job.error) == (FAILED, ORPHANED)
+        assert job.finished_at is not None
+        # A job that is still beating is left alone, however old it is
+        assert app_module._dataset_job('compact', dataset, [QUEUED]).id == alive
+
+
+def test_orphaned_upload_fails_its_dataset(app_module, user):
+    with app_module.app.test_request_context():
+        dataset = _dataset(app_module, user, 'processing')
+        ready = _dataset(app_module, user, 'ready')
+        _job(app_module, 'upload', QUEUED, dataset, None, user)  # Enqueued before heartbeats: created_at counts
+        _job(app_module, 'upload', RUNNING, ready, _now() - timedelta(hours=1), user)
+
+        app_module.sweep_jobs()
+        app_module.db.session.refresh(dataset)
+        app_module.db.session.refresh(ready)
+        assert (dataset.status, dataset.error) == ('failed', ORPHANED)
+        assert ready.status == 'ready'
+
+
+def test_heartbeat_keeps_held_jobs_alive(app_module, user):
+    with app_module.app.test_request_context():
+        dataset = _dataset(app_module, user, 'ready')
+        job_id = _job(app_module, 'compact', RUNNING, dataset, _now() - timedelta(hours=1), user)
+        db_uri = app_module.db.engine.url.render_as_string(hide_password=False)
+
+    heartbeat = Heartbeat(interval=0.05)
+    heartbeat.add(db_uri, job_id)
+    time.sleep(0.3)
+    heartbeat.discard(job_id)
+    with app_module.app.test_request_context():
+        app_module.sweep_jobs()
+        job = app_module.db.session.get(app_module.Job, job_id)
+        assert job.status == RUNNING
+        assert job.heartbeat_at > _now() - timedelta(seconds=5)
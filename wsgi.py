@@ -0,0 +1,30 @@
+"""Production entry point for a WSGI server, see gunicorn.conf.py.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Importing this module creates the database tables and, unless ``PREWARM=0``,
+imports the plotting, PDF and model-fitting modules that app.py otherwise
+loads on first use. Under gunicorn's ``preload_app`` both happen once in the
+master before it forks, so every worker starts with them already loaded and
+shares their memory copy-on-write instead of importing its own copy on its
+first chart or report.
+"""
+import importlib
+import os
+
+from app import app, init_db
+
+# Left out of app.py's imports to keep it quick to load (see charts.plotting)
+PREWARM_MODULES = ['pdf_report', 'sklearn.ensemble', 'joblib', 'chardet']
+
+
+def prewarm():
+    from charts import plotting
+    plotting()
+    for name in PREWARM_MODULES:
+        importlib.import_module(name)
+
+
+init_db()
+if os.environ.get('PREWARM', '1') != '0':
+    prewarm()